@@ -1,13 +1,40 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from app.models import User, Alert
-from typing import Dict, Any
+from app.models import User, Alert, UserRiskProfile
+from app import llm, risk_profiles
+from typing import Awaitable, Callable, Dict, Any, Iterable, List, Optional
+
+# The dossier lists only the most recent alerts; counts and volumes come from the
+# precomputed risk profile, so prolific users don't blow up the query or the prompt.
+ADVISOR_MAX_ALERTS = int(os.getenv("ADVISOR_MAX_ALERTS", 50))
 
 def synthesize_user_evidence(db: Session, user: User) -> Dict[str, Any]:
     """
-    Gathers all alerts and key user info into a single structured dictionary.
+    Gathers the user's recent alerts, key user info and risk profile into a single structured dictionary.
     """
-    alerts = db.query(Alert).filter(Alert.user_id == user.id).order_by(Alert.created_at.desc()).all()
-    
+    alerts = db.query(Alert).filter(Alert.user_id == user.id).order_by(Alert.created_at.desc(), Alert.id.desc()).limit(ADVISOR_MAX_ALERTS).all()
+    return _build_evidence(user, alerts, db.get(UserRiskProfile, user.id))
+
+def synthesize_users_evidence(db: Session, users: Iterable[User]) -> Dict[int, Dict[str, Any]]:
+    """Evidence for many users at once, with one alerts query and one profiles query."""
+    users = list(users)
+    user_ids = [user.id for user in users]
+    alerts_by_user = defaultdict(list)
+    profiles = {}
+    if users:
+        recency = func.row_number().over(partition_by=Alert.user_id, order_by=(Alert.created_at.desc(), Alert.id.desc())).label("recency")
+        recent = db.query(Alert.id, recency).filter(Alert.user_id.in_(user_ids)).subquery()
+        query = db.query(Alert).join(recent, recent.c.id == Alert.id).filter(recent.c.recency <= ADVISOR_MAX_ALERTS)
+        for alert in query.order_by(Alert.created_at.desc(), Alert.id.desc()):
+            alerts_by_user[alert.user_id].append(alert)
+        profiles = {profile.user_id: profile for profile in db.query(UserRiskProfile).filter(UserRiskProfile.user_id.in_(user_ids))}
+    return {user.id: _build_evidence(user, alerts_by_user[user.id], profiles.get(user.id)) for user in users}
+
+def _build_evidence(user: User, alerts: List[Alert], profile: Optional[UserRiskProfile]) -> Dict[str, Any]:
     evidence = {
         "user_profile": {
             "id": user.id,
@@ -26,9 +53,64 @@ def synthesize_user_evidence(db: Session, user: User) -> Dict[str, Any]:
         ]
     }
     
-    evidence["summary_stats"] = {
-        "total_alerts": len(alerts),
-        "alert_types": list(set(alert.alert_type for alert in alerts))
-    }
+    evidence["summary_stats"] = risk_profiles.summary_stats(profile)
+    if profile is None and alerts: # Profile not built yet; fall back to the alerts we have
+        evidence["summary_stats"].update(total_alerts=len(alerts), alert_types=sorted(set(alert.alert_type for alert in alerts)))
+
+    return evidence
+
+# --- Advisor prompts ---
+# Shared by the per-user Celery tasks and the async sweep runner.
+def build_risk_prompt(evidence: Dict[str, Any]) -> str:
+    evidence_str = json.dumps(evidence, indent=2)
+    return f"You are an expert financial crime investigator. Here is a user's dossier:\n```json\n{evidence_str}\n```\nSummarize the user's overall risk level, list the top 2-3 most severe risk factors, and recommend a next action (e.g., 'Continue Monitoring', 'Escalate for Investigation'). Be concise."
+
+def build_sar_prompt(evidence: Dict[str, Any]) -> str:
+    evidence_str = json.dumps(evidence, indent=2)
+    return f"You are a compliance officer. Draft a formal SAR narrative based on this evidence:\n```json\n{evidence_str}\n```\nUse sections for Introduction, Narrative of Suspicious Activity, and Conclusion. Be factual."
+
+ADVISOR_ACTIONS = {
+    "explain": {"prompt": build_risk_prompt, "result_key": "explanation", "no_alerts": "No open alerts; user appears low-risk.", "failure": "AI risk explanation failed"},
+    "sar": {"prompt": build_sar_prompt, "result_key": "sar_draft", "no_alerts": "No suspicious activity found. SAR not warranted.", "failure": "SAR generation failed"},
+}
+
+def run_advisor_action(action: str, evidence: Dict[str, Any], generate: Callable[[str], str]) -> Dict[str, Any]:
+    spec = ADVISOR_ACTIONS[action]
+    if not evidence.get("alerts"): return {spec["result_key"]: spec["no_alerts"]}
+    try:
+        return {spec["result_key"]: generate(spec["prompt"](evidence))}
+    except Exception as e:
+        return {"error": f"{spec['failure']}: {e}"}
+
+async def run_advisor_action_async(action: str, evidence: Dict[str, Any], generate: Callable[[str], Awaitable[str]]) -> Dict[str, Any]:
+    spec = ADVISOR_ACTIONS[action]
+    if not evidence.get("alerts"): return {spec["result_key"]: spec["no_alerts"]}
+    try:
+        return {spec["result_key"]: await generate(spec["prompt"](evidence))}
+    except Exception as e:
+        return {"error": f"{spec['failure']}: {e}"}
+
+async def run_sweep(action: str, jobs: Dict[str, int], evidence_by_user: Dict[int, Dict[str, Any]], on_result: Callable[[str, Dict[str, Any]], None], concurrency: int, requests_per_minute: float) -> List[Dict[str, Any]]:
+    """
+    Runs `action` for every {job_id: user_id} in `jobs`, with up to `concurrency`
+    LLM calls in flight and at most `requests_per_minute` live calls after an initial
+    burst of `concurrency`. `on_result(job_id, result)` is called (in a thread, it
+    usually does blocking I/O) as each job finishes.
+    """
+    model = llm.get_async_model()
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = llm.RateLimiter(requests_per_minute, burst=concurrency)
+
+    async def generate(prompt: str) -> str:
+        return await llm.generate_text_async(prompt, model, semaphore, limiter)
+
+    async def run_job(job_id: str, user_id: int) -> Dict[str, Any]:
+        evidence = evidence_by_user.get(user_id)
+        result = {"error": "User not found."} if evidence is None else await run_advisor_action_async(action, evidence, generate)
+        await asyncio.to_thread(on_result, job_id, result)
+        return result
 
-    return evidence
\ No newline at end of file
+    try:
+        return await asyncio.gather(*(run_job(job_id, user_id) for job_id, user_id in jobs.items()))
+    finally:
+        await model.aclose()
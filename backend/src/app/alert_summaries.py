@@ -0,0 +1,167 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import llm
+from app.models import Alert
+
+# --- Alert summaries ---
+# Every alert is written with a deterministic template summary, so alert creation
+# never waits on the LLM. A separate enrichment job later claims pending alerts in
+# batches, asks the LLM to summarize a whole batch in one prompt, and bulk-updates
+# `ai_summary`. Alerts the model didn't answer for keep their template summary.
+# A claim is a committed status change, so no row lock is held during the model call.
+
+SUMMARY_PENDING = "PENDING"   # Template summary, waiting for enrichment
+SUMMARY_CLAIMED = "CLAIMED"   # Taken by an enrichment run, see enrich_next_batch
+SUMMARY_ENRICHED = "ENRICHED" # LLM summary
+SUMMARY_SKIPPED = "SKIPPED"   # Enrichment gave no usable summary; template kept
+
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", 20))
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", 4))
+ENRICH_MAX_BATCHES_PER_RUN = int(os.getenv("ENRICH_MAX_BATCHES_PER_RUN", 50))
+# Claims older than this are assumed abandoned (crashed worker) and taken over.
+# Keep it well above the LLM timeout.
+ENRICH_CLAIM_TIMEOUT_SECONDS = int(os.getenv("ENRICH_CLAIM_TIMEOUT_SECONDS", 600))
+
+TEMPLATES = {
+    "KYC_FLAG": "KYC screening flagged this user: {message}.",
+    "AML_STRUCTURING_PAYMENT": "User sent multiple payments under reporting thresholds.",
+    "AML_STRUCTURING_DEPOSIT": "User received multiple deposits, suggesting use as a mule account.",
+    "ML_ANOMALY": "ML model detected a significant deviation from normal activity.",
+    "GRAPH_CYCLE": "User is part of a circular flow of similar amounts, a common laundering pattern.",
+    "GRAPH_LAYERING": "User is part of a funding, fan-out and fan-in structure typical of layering.",
+}
+
+
+def template_summary(alert_type: str, message: str) -> str:
+    template = TEMPLATES.get(alert_type, "{alert_type} alert: {message}")
+    return template.format(alert_type=alert_type, message=message)
+
+
+def build_batch_prompt(alerts: List[Alert]) -> str:
+    lines = [
+        "You are a compliance analyst. For each alert below, write a one-sentence summary of the compliance risk.",
+        'Reply with only a JSON array of objects of the form {"id": <alert id>, "summary": "<summary>"}.',
+        "",
+    ]
+    lines += [f"- id {alert.id} [{alert.alert_type}]: {alert.message}" for alert in alerts]
+    return "\n".join(lines)
+
+
+def parse_batch_response(text: str) -> Dict[int, str]:
+    """Summaries by alert ID from the model's JSON reply; tolerates code fences and stray text."""
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        items = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    summaries = {}
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get("summary"), str) and item["summary"].strip():
+            try:
+                summaries[int(item["id"])] = item["summary"].strip()
+            except (KeyError, TypeError, ValueError):
+                continue
+    return summaries
+
+
+def claim_batch(db: Session, batch_size: int = ENRICH_BATCH_SIZE):
+    """
+    Marks up to `batch_size` pending alerts (or alerts whose claim has timed out) as
+    CLAIMED and commits. Candidate rows are picked with FOR UPDATE SKIP LOCKED, so
+    concurrent enrichers never claim the same alerts. Returns (claimed_at, alerts),
+    where alerts are (id, alert_type, message) rows in id order.
+    """
+    claimed_at = datetime.now()
+    stale = claimed_at - timedelta(seconds=ENRICH_CLAIM_TIMEOUT_SECONDS)
+    claimable = (
+        select(Alert.id)
+        .where(or_(
+            Alert.summary_status == SUMMARY_PENDING,
+            and_(Alert.summary_status == SUMMARY_CLAIMED, Alert.summary_claimed_at < stale),
+        ))
+        .order_by(Alert.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    alerts = db.execute(
+        update(Alert)
+        .where(Alert.id.in_(claimable))
+        .values(summary_status=SUMMARY_CLAIMED, summary_claimed_at=claimed_at)
+        .returning(Alert.id, Alert.alert_type, Alert.message)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return claimed_at, sorted(alerts, key=lambda alert: alert.id)
+
+
+def _still_claimed(claimed_at: datetime):
+    # A claim taken over after a timeout belongs to the newer run
+    return and_(Alert.summary_status == SUMMARY_CLAIMED, Alert.summary_claimed_at == claimed_at)
+
+
+def enrich_next_batch(db: Session, batch_size: int = ENRICH_BATCH_SIZE) -> int:
+    """
+    Claims up to `batch_size` alerts, summarizes them with one LLM call and
+    bulk-updates them in a second short transaction. If the call fails the claim is
+    released; if the worker dies it is taken over after ENRICH_CLAIM_TIMEOUT_SECONDS.
+    Returns the number of alerts claimed (0 when the queue is empty).
+    """
+    claimed_at, alerts = claim_batch(db, batch_size)
+    if not alerts:
+        return 0
+
+    try:
+        summaries = parse_batch_response(llm.generate_text(build_batch_prompt(alerts)))
+    except Exception:
+        db.execute(
+            update(Alert)
+            .where(Alert.id.in_([alert.id for alert in alerts]), _still_claimed(claimed_at))
+            .values(summary_status=SUMMARY_PENDING, summary_claimed_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit() # Leave the batch pending for the next run
+        raise
+
+    db.execute(update(Alert).where(_still_claimed(claimed_at)).execution_options(synchronize_session=None), [
+        {"id": alert.id, "ai_summary": summaries[alert.id], "summary_status": SUMMARY_ENRICHED} if alert.id in summaries
+        else {"id": alert.id, "summary_status": SUMMARY_SKIPPED}
+        for alert in alerts
+    ])
+    db.commit()
+    return len(alerts)
+
+
+def drain_pending(session_factory: Callable[[], Session], concurrency: int = ENRICH_CONCURRENCY, max_batches: int = ENRICH_MAX_BATCHES_PER_RUN) -> int:
+    """
+    Enriches pending alerts with `concurrency` parallel batch calls, at most
+    `max_batches` batches in total. A failing LLM call stops that lane only.
+    Returns the number of alerts processed.
+    """
+    def lane(batches: int) -> int:
+        db = session_factory()
+        processed = 0
+        try:
+            for _ in range(batches):
+                claimed = enrich_next_batch(db)
+                if not claimed:
+                    break
+                processed += claimed
+        except Exception as e:
+            print(f"Alert enrichment lane stopped: {e}")
+        finally:
+            db.close()
+        return processed
+
+    lanes = max(1, min(concurrency, max_batches))
+    with ThreadPoolExecutor(max_workers=lanes) as pool:
+        return sum(pool.map(lane, [max_batches // lanes] * lanes))
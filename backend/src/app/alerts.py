@@ -0,0 +1,43 @@
+from typing import Iterable, List
+
+from sqlalchemy.orm import Session
+
+from app.database import dialect_insert
+from app.models import Alert
+from app.risk_profiles import record_alerts
+
+# --- Deduplicated alert writes ---
+# Every alert writer sets a dedup key and goes through upsert_alerts(): one bulk
+# INSERT ... ON CONFLICT (dedup_key) DO NOTHING, backed by the unique index on
+# alerts.dedup_key. No read-before-write, and concurrent workers reporting the same
+# finding can't both insert it.
+
+ALERT_COLUMNS = ("user_id", "alert_type", "message", "ai_summary", "status", "summary_status", "dedup_key")
+
+
+def alert_key(alert_type: str, user_id: int, *fingerprint) -> str:
+    """Dedup key for a finding: its type and user, plus whatever distinguishes repeat findings (a transaction, a criterion...)."""
+    return ":".join(str(part) for part in (alert_type, user_id, *fingerprint))
+
+
+def upsert_alerts(db: Session, alerts: Iterable[Alert]) -> List:
+    """
+    Inserts the (unsaved) alerts, skipping any whose dedup_key already exists, and folds
+    the ones actually inserted into the risk profiles. Returns the inserted rows
+    (id, user_id, alert_type, status, created_at). Does not commit.
+    """
+    rows = {}
+    for alert in alerts:
+        row = {column: getattr(alert, column) for column in ALERT_COLUMNS}
+        row["status"] = row["status"] or "OPEN"
+        row["summary_status"] = row["summary_status"] or "PENDING"
+        rows.setdefault(row["dedup_key"] or id(alert), row) # Also collapse repeats within the batch
+    if not rows:
+        return []
+    statement = (
+        dialect_insert(db, Alert).on_conflict_do_nothing(index_elements=["dedup_key"])
+        .returning(Alert.id, Alert.user_id, Alert.alert_type, Alert.status, Alert.created_at)
+    )
+    inserted = db.execute(statement, list(rows.values())).all()
+    record_alerts(db, inserted)
+    return inserted
@@ -1,7 +1,129 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, select, literal, union_all
 from app.models import Transaction, User
+from collections import defaultdict
 from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Sequence
+
+STRUCTURING_PAYMENT = "AML_STRUCTURING_PAYMENT"
+STRUCTURING_DEPOSIT = "AML_STRUCTURING_DEPOSIT"
+
+# Upper bound on the number of user IDs bound into a single IN (...) list.
+RULE_BATCH_SIZE = 5000
+
+def _structuring_message(alert_type: str, tx_count: int, total_amount: float, time_window_hours: int, window_end: Optional[datetime] = None) -> str:
+    window = f"in the last {time_window_hours} hours" if window_end is None else f"in the {time_window_hours} hours up to {window_end:%Y-%m-%d %H:%M}"
+    if alert_type == STRUCTURING_PAYMENT:
+        return (f"Structuring (Payments) Detected: User sent {tx_count} payments totaling "
+                f"₹{total_amount:,.2f} {window}.")
+    return (f"Structuring (Deposits) Detected: User received {tx_count} deposits totaling "
+            f"₹{total_amount:,.2f} {window}.")
+
+def _in_band(amount_threshold: float):
+    return and_(Transaction.amount < amount_threshold, Transaction.amount > amount_threshold * 0.8)
+
+_USER_COLUMNS = {
+    STRUCTURING_PAYMENT: Transaction.from_user_id, # The user is the SENDER
+    STRUCTURING_DEPOSIT: Transaction.to_user_id,   # The user is the RECEIVER
+}
+
+# --- BATCH ENGINE: evaluates both structuring rules for many users at once ---
+def evaluate_structuring_rules(db: Session, user_ids: Iterable[int], amount_threshold: float = 50000.0, time_window_hours: int = 48, min_transactions: int = 4, alert_types: Sequence[str] = (STRUCTURING_PAYMENT, STRUCTURING_DEPOSIT)) -> Dict[int, Dict[str, str]]:
+    """
+    Runs the payment (sender) and deposit (receiver) structuring rules for a whole set of users
+    in one grouped statement per batch of IDs, instead of one query per user and rule.
+    The window is the last `time_window_hours` of transaction event time.
+    Returns {user_id: {alert_type: message}} for the users that tripped a rule.
+    """
+    window_end_time = datetime.now()
+    window_start_time = window_end_time - timedelta(hours=time_window_hours)
+    in_window = and_(
+        Transaction.timestamp >= window_start_time,
+        Transaction.timestamp <= window_end_time,
+        _in_band(amount_threshold),
+    )
+    user_columns = _USER_COLUMNS
+
+    findings: Dict[int, Dict[str, str]] = {}
+    user_ids = list(dict.fromkeys(user_ids))
+    for offset in range(0, len(user_ids), RULE_BATCH_SIZE):
+        batch = user_ids[offset:offset + RULE_BATCH_SIZE]
+        rule_queries = [
+            select(
+                literal(alert_type).label("alert_type"),
+                user_columns[alert_type].label("user_id"),
+                func.count().label("tx_count"),
+                func.sum(Transaction.amount).label("total_amount"),
+            )
+            .where(in_window, user_columns[alert_type].in_(batch))
+            .group_by(user_columns[alert_type])
+            .having(func.count() >= min_transactions)
+            for alert_type in alert_types
+        ]
+        statement = union_all(*rule_queries) if len(rule_queries) > 1 else rule_queries[0]
+        for alert_type, user_id, tx_count, total_amount in db.execute(statement):
+            findings.setdefault(user_id, {})[alert_type] = _structuring_message(alert_type, tx_count, total_amount, time_window_hours)
+    return findings
+
+# --- BATCH ENGINE for ingested history: windows anchored on event times ---
+def evaluate_structuring_for_batch(db: Session, batch_id: str, user_ids: Iterable[int], amount_threshold: float = 50000.0, time_window_hours: int = 48, min_transactions: int = 4, alert_types: Sequence[str] = (STRUCTURING_PAYMENT, STRUCTURING_DEPOSIT)) -> Dict[int, Dict[str, str]]:
+    """
+    The structuring rules for an ingestion batch, which may span days or weeks of event
+    time. Every `time_window_hours` window that contains at least one of the batch's
+    transactions is checked, not just the window ending at the latest one, so
+    structuring anywhere in a multi-day upload is found. The in-band transactions of the
+    batch's users around the batch's time span are read in one statement per batch of
+    IDs and swept per user. Same result shape as evaluate_structuring_rules().
+    """
+    window = timedelta(hours=time_window_hours)
+    span_start, span_end = db.query(func.min(Transaction.timestamp), func.max(Transaction.timestamp)).filter(Transaction.ingestion_batch_id == batch_id).one()
+    if span_start is None:
+        return {}
+
+    findings: Dict[int, Dict[str, str]] = {}
+    user_ids = list(dict.fromkeys(user_ids))
+    for offset in range(0, len(user_ids), RULE_BATCH_SIZE):
+        batch = user_ids[offset:offset + RULE_BATCH_SIZE]
+        for alert_type in alert_types:
+            user_column = _USER_COLUMNS[alert_type]
+            rows = db.execute(
+                select(user_column, Transaction.timestamp, Transaction.amount, Transaction.ingestion_batch_id == batch_id)
+                .where(
+                    user_column.in_(batch),
+                    Transaction.timestamp >= span_start - window,
+                    Transaction.timestamp <= span_end + window,
+                    _in_band(amount_threshold),
+                )
+                .order_by(user_column, Transaction.timestamp)
+            )
+            per_user = defaultdict(list)
+            for user_id, timestamp, amount, in_batch in rows:
+                per_user[user_id].append((timestamp, amount, bool(in_batch)))
+            for user_id, events in per_user.items():
+                best = _densest_window(events, window, min_transactions)
+                if best:
+                    tx_count, total_amount, window_end = best
+                    findings.setdefault(user_id, {})[alert_type] = _structuring_message(alert_type, tx_count, total_amount, time_window_hours, window_end)
+    return findings
+
+def _densest_window(events: list, window: timedelta, min_transactions: int):
+    """
+    (count, total, end time) of the fullest [t - window, t] over the time-ordered
+    (timestamp, amount, in_batch) events that holds a batch event and at least
+    `min_transactions` events, or None.
+    """
+    best, start, amount_sum, batch_events = None, 0, 0.0, 0
+    for end, (timestamp, amount, in_batch) in enumerate(events):
+        amount_sum += amount
+        batch_events += in_batch
+        while events[start][0] < timestamp - window:
+            amount_sum -= events[start][1]
+            batch_events -= events[start][2]
+            start += 1
+        count = end - start + 1
+        if batch_events and count >= min_transactions and (best is None or count > best[0]):
+            best = (count, amount_sum, timestamp)
+    return best
 
 # --- RULE 1: Detects a user SENDING multiple small payments ---
 def check_structuring_by_payment(db: Session, user: User, amount_threshold: float = 50000.0, time_window_hours: int = 48, min_transactions: int = 4) -> str | None:
@@ -9,22 +131,8 @@ def check_structuring_by_payment(db: Session, user: User, amount_threshold: floa
     Flags a user for SENDING multiple payments just under the threshold.
     This is a strong signal of intent to structure funds.
     """
-    window_start_time = datetime.now() - timedelta(hours=time_window_hours)
-    
-    suspicious_transactions = db.query(Transaction).filter(
-        and_(
-            Transaction.from_user_id == user.id, # The user is the SENDER
-            Transaction.timestamp >= window_start_time,
-            Transaction.amount < amount_threshold,
-            Transaction.amount > amount_threshold * 0.8
-        )
-    ).all()
-
-    if len(suspicious_transactions) >= min_transactions:
-        total_amount = sum(tx.amount for tx in suspicious_transactions)
-        return (f"Structuring (Payments) Detected: User sent {len(suspicious_transactions)} payments totaling "
-                f"₹{total_amount:,.2f} in the last {time_window_hours} hours.")
-    return None
+    findings = evaluate_structuring_rules(db, [user.id], amount_threshold, time_window_hours, min_transactions, alert_types=(STRUCTURING_PAYMENT,))
+    return findings.get(user.id, {}).get(STRUCTURING_PAYMENT)
 
 # --- RULE 2: Detects a user RECEIVING multiple small deposits ---
 def check_structuring_by_deposit(db: Session, user: User, amount_threshold: float = 50000.0, time_window_hours: int = 48, min_transactions: int = 4) -> str | None:
@@ -32,19 +140,5 @@ def check_structuring_by_deposit(db: Session, user: User, amount_threshold: floa
     Flags a user for RECEIVING multiple deposits just under the threshold.
     This can be a signal that the user is a "mule" account.
     """
-    window_start_time = datetime.now() - timedelta(hours=time_window_hours)
-    
-    suspicious_transactions = db.query(Transaction).filter(
-        and_(
-            Transaction.to_user_id == user.id, # The user is the RECEIVER
-            Transaction.timestamp >= window_start_time,
-            Transaction.amount < amount_threshold,
-            Transaction.amount > amount_threshold * 0.8
-        )
-    ).all()
-
-    if len(suspicious_transactions) >= min_transactions:
-        total_amount = sum(tx.amount for tx in suspicious_transactions)
-        return (f"Structuring (Deposits) Detected: User received {len(suspicious_transactions)} deposits totaling "
-                f"₹{total_amount:,.2f} in the last {time_window_hours} hours.")
-    return None
\ No newline at end of file
+    findings = evaluate_structuring_rules(db, [user.id], amount_threshold, time_window_hours, min_transactions, alert_types=(STRUCTURING_DEPOSIT,))
+    return findings.get(user.id, {}).get(STRUCTURING_DEPOSIT)
@@ -0,0 +1,244 @@
+import csv
+import io
+import logging
+from datetime import datetime
+from typing import Dict, List, Set
+from sqlalchemy import select, text, union
+from sqlalchemy.orm import Session
+from app.models import User, Transaction
+from app.data_processor import parse_event_time
+from app.graph_store import record_edges
+from app import risk_profiles
+
+logger = logging.getLogger(__name__)
+
+# --- Bulk-load engine for transaction ingestion ---
+# On PostgreSQL a chunk of rows is streamed with COPY FROM STDIN into a temporary
+# staging table and merged into `users`/`transactions` with one set-based statement.
+# Any other database (e.g. SQLite in tests) falls back to the ORM path.
+
+# Source label for rows that don't name their originating system.
+DEFAULT_SOURCE = "csv"
+
+STAGING_TABLE_DDL = """
+    CREATE TEMP TABLE staging_transactions (
+        debit_account TEXT NOT NULL,
+        credit_account TEXT NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        currency TEXT,
+        description TEXT,
+        external_id TEXT,
+        event_time TIMESTAMPTZ
+    ) ON COMMIT DROP
+"""
+
+COPY_STAGING_SQL = """
+    COPY staging_transactions (debit_account, credit_account, amount, currency, description, external_id, event_time)
+    FROM STDIN WITH (FORMAT csv, FORCE_NULL (external_id, event_time))
+"""
+
+# New accounts are inserted with ON CONFLICT (email) DO NOTHING, so existing user rows
+# are never rewritten; existing accounts are read back by email and unioned with the
+# inserted ones, so every account in the chunk is resolved to an ID in the same
+# statement that inserts the transactions. Transactions already loaded
+# under the same (source, external_id) are skipped, which makes re-uploads idempotent.
+# The inserted transactions are folded into the aggregated `graph_edges` table and the
+# per-user risk profiles in the same statement, so both are always consistent with
+# committed transactions.
+MERGE_STAGING_SQL = """
+    WITH accounts AS (
+        SELECT name, lower(replace(name, ' ', '_')) || '@bank.com' AS email
+        FROM (
+            SELECT debit_account AS name FROM staging_transactions
+            UNION
+            SELECT credit_account FROM staging_transactions
+        ) names
+    ),
+    inserted_users AS (
+        INSERT INTO users (full_name, email, country)
+        SELECT DISTINCT ON (email) name, email, 'Unknown' FROM accounts ORDER BY email, name
+        ON CONFLICT (email) DO NOTHING
+        RETURNING id, email
+    ),
+    upserted_users AS (
+        SELECT id, email FROM inserted_users
+        UNION ALL
+        SELECT id, email FROM users WHERE email IN (SELECT email FROM accounts)
+    ),
+    inserted_transactions AS (
+        INSERT INTO transactions (from_user_id, to_user_id, amount, currency, description, timestamp, source, external_id, ingestion_batch_id)
+        SELECT sender.id, receiver.id, s.amount, s.currency, s.description, COALESCE(s.event_time, now()), :source, s.external_id, :batch_id
+        FROM staging_transactions s
+        JOIN upserted_users sender ON sender.email = lower(replace(s.debit_account, ' ', '_')) || '@bank.com'
+        JOIN upserted_users receiver ON receiver.email = lower(replace(s.credit_account, ' ', '_')) || '@bank.com'
+        ON CONFLICT (source, external_id) DO NOTHING
+        RETURNING from_user_id, to_user_id, amount, timestamp
+    ),
+    edge_deltas AS (
+        INSERT INTO graph_edges (from_user_id, to_user_id, tx_count, total_amount, first_seen, last_seen)
+        SELECT from_user_id, to_user_id, count(*), sum(amount), min(timestamp), max(timestamp)
+        FROM inserted_transactions
+        WHERE from_user_id <> to_user_id
+        GROUP BY from_user_id, to_user_id
+        ORDER BY from_user_id, to_user_id
+        ON CONFLICT (from_user_id, to_user_id) DO UPDATE SET
+            tx_count = graph_edges.tx_count + EXCLUDED.tx_count,
+            total_amount = graph_edges.total_amount + EXCLUDED.total_amount,
+            first_seen = LEAST(graph_edges.first_seen, EXCLUDED.first_seen),
+            last_seen = GREATEST(graph_edges.last_seen, EXCLUDED.last_seen)
+        RETURNING 1
+    ),
+    profile_deltas AS (
+        INSERT INTO user_risk_profiles (user_id, tx_in_count, tx_in_amount, tx_out_count, tx_out_amount, last_tx_at, window_tx_count, window_in_amount, window_out_amount)
+        SELECT user_id, sum(in_count), sum(in_amount), sum(out_count), sum(out_amount), max(timestamp),
+               count(*) FILTER (WHERE timestamp >= now() - make_interval(days => :window_days)),
+               COALESCE(sum(in_amount) FILTER (WHERE timestamp >= now() - make_interval(days => :window_days)), 0),
+               COALESCE(sum(out_amount) FILTER (WHERE timestamp >= now() - make_interval(days => :window_days)), 0)
+        FROM (
+            SELECT to_user_id AS user_id, 1 AS in_count, amount AS in_amount, 0 AS out_count, 0.0 AS out_amount, timestamp FROM inserted_transactions
+            UNION ALL
+            SELECT from_user_id, 0, 0.0, 1, amount, timestamp FROM inserted_transactions
+        ) sides
+        GROUP BY user_id
+        ORDER BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            tx_in_count = user_risk_profiles.tx_in_count + EXCLUDED.tx_in_count,
+            tx_in_amount = user_risk_profiles.tx_in_amount + EXCLUDED.tx_in_amount,
+            tx_out_count = user_risk_profiles.tx_out_count + EXCLUDED.tx_out_count,
+            tx_out_amount = user_risk_profiles.tx_out_amount + EXCLUDED.tx_out_amount,
+            last_tx_at = GREATEST(user_risk_profiles.last_tx_at, EXCLUDED.last_tx_at),
+            window_tx_count = user_risk_profiles.window_tx_count + EXCLUDED.window_tx_count,
+            window_in_amount = user_risk_profiles.window_in_amount + EXCLUDED.window_in_amount,
+            window_out_amount = user_risk_profiles.window_out_amount + EXCLUDED.window_out_amount,
+            updated_at = now()
+        RETURNING 1
+    )
+    SELECT id, email, (SELECT count(*) FROM inserted_transactions), (SELECT count(*) FROM edge_deltas), (SELECT count(*) FROM profile_deltas) FROM upserted_users
+"""
+
+
+def account_email(account: str) -> str:
+    return f"{account.lower().replace(' ', '_')}@bank.com"
+
+
+def supports_copy(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def load_chunk(db: Session, rows: List[dict], user_map: Dict[str, int], batch_id: str, source: str = DEFAULT_SOURCE) -> int:
+    """
+    Loads one chunk of CSV rows (Debit_Account, Credit_Account, Amount, Transaction_ID, Date, ...)
+    and commits it. Every inserted transaction is tagged with `batch_id`; rows whose
+    Transaction_ID was already loaded from `source` are skipped. Resolved account IDs are
+    added to `user_map`. Returns the number of transactions inserted.
+    """
+    if supports_copy(db):
+        return _load_chunk_copy(db, rows, user_map, batch_id, source)
+    return _load_chunk_orm(db, rows, user_map, batch_id, source)
+
+
+def batch_user_ids(db: Session, batch_id: str) -> Set[int]:
+    """Returns the IDs of every sender and receiver in an ingestion batch."""
+    senders = select(Transaction.from_user_id).where(Transaction.ingestion_batch_id == batch_id)
+    receivers = select(Transaction.to_user_id).where(Transaction.ingestion_batch_id == batch_id)
+    return {user_id for (user_id,) in db.execute(union(senders, receivers)) if user_id is not None}
+
+
+def _load_chunk_copy(db: Session, rows: List[dict], user_map: Dict[str, int], batch_id: str, source: str) -> int:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    chunk_accounts = set()
+    for row in rows:
+        debit_account, credit_account = row.get('Debit_Account'), row.get('Credit_Account')
+        if not debit_account or not credit_account: continue
+        event_time = parse_event_time(row.get('Date'))
+        writer.writerow([
+            debit_account, credit_account, float(row['Amount']), row.get('Currency', 'INR'), row.get('Description', 'N/A'),
+            row.get('Transaction_ID') or None, event_time.isoformat() if event_time else None
+        ])
+        chunk_accounts.update((debit_account, credit_account))
+
+    if not chunk_accounts:
+        return 0
+    emails = {account_email(account) for account in chunk_accounts}
+
+    for attempt in range(2):
+        buffer.seek(0)
+        try:
+            db.execute(text(STAGING_TABLE_DDL))
+            cursor = db.connection().connection.cursor()
+            try:
+                cursor.copy_expert(COPY_STAGING_SQL, buffer)
+            finally:
+                cursor.close()
+            # Temp tables have no statistics; without them the merge picks a poor join plan.
+            db.execute(text("ANALYZE staging_transactions"))
+
+            resolved = db.execute(text(MERGE_STAGING_SQL), {"batch_id": batch_id, "source": source, "window_days": risk_profiles.RISK_WINDOW_DAYS}).all()
+            ids_by_email = {email: user_id for user_id, email, *_ in resolved}
+            if not emails <= ids_by_email.keys():
+                # Another load committed one of these accounts after the merge's snapshot was
+                # taken: DO NOTHING skipped it and the read-back didn't see it, so its rows were
+                # not inserted. Once more from the start; the next statement sees it.
+                db.rollback()
+                if attempt == 0:
+                    continue
+                raise RuntimeError(f"Could not resolve accounts {sorted(emails - ids_by_email.keys())[:5]}")
+            risk_profiles.rescore(db, [user_id for user_id, *_ in resolved])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        break
+
+    for account in chunk_accounts:
+        user_map[account] = ids_by_email[account_email(account)]
+    return resolved[0][2] if resolved else 0
+
+
+def _load_chunk_orm(db: Session, rows: List[dict], user_map: Dict[str, int], batch_id: str, source: str) -> int:
+    chunk_accounts = {row.get('Debit_Account') for row in rows if row.get('Debit_Account')} | \
+                     {row.get('Credit_Account') for row in rows if row.get('Credit_Account')}
+    unresolved_accounts = chunk_accounts - user_map.keys()
+
+    if unresolved_accounts:
+        existing_users = db.query(User.id, User.full_name).filter(User.full_name.in_(unresolved_accounts)).all()
+        for user_id, full_name in existing_users:
+            user_map[full_name] = user_id
+        new_user_names = unresolved_accounts - user_map.keys()
+        users_to_create = [User(full_name=name, email=account_email(name), country="Unknown") for name in new_user_names]
+
+        if users_to_create:
+            db.bulk_save_objects(users_to_create)
+            db.commit()
+            logger.info("Bulk created %d new users.", len(users_to_create))
+            newly_created_users = db.query(User.id, User.full_name).filter(User.full_name.in_(new_user_names)).all()
+            for user_id, full_name in newly_created_users:
+                user_map[full_name] = user_id
+
+    chunk_external_ids = {row['Transaction_ID'] for row in rows if row.get('Transaction_ID')}
+    seen_external_ids = set()
+    if chunk_external_ids:
+        seen_external_ids = {external_id for (external_id,) in db.query(Transaction.external_id).filter(Transaction.source == source, Transaction.external_id.in_(chunk_external_ids))}
+
+    transactions_to_create = []
+    for row in rows:
+        from_user_id = user_map.get(row.get('Debit_Account'))
+        to_user_id = user_map.get(row.get('Credit_Account'))
+        if not from_user_id or not to_user_id: continue
+        external_id = row.get('Transaction_ID') or None
+        if external_id:
+            if external_id in seen_external_ids: continue
+            seen_external_ids.add(external_id)
+        transactions_to_create.append(Transaction(
+            from_user_id=from_user_id, to_user_id=to_user_id, amount=float(row['Amount']), currency=row.get('Currency', 'INR'),
+            description=row.get('Description', 'N/A'), timestamp=parse_event_time(row.get('Date')) or datetime.now(),
+            source=source, external_id=external_id, ingestion_batch_id=batch_id
+        ))
+
+    if transactions_to_create:
+        db.bulk_save_objects(transactions_to_create)
+        record_edges(db, transactions_to_create)
+        risk_profiles.record_transactions(db, transactions_to_create)
+        db.commit()
+    return len(transactions_to_create)
@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import redis
+
+# --- Shared caching helpers ---
+# Redis is the tier shared by the API and every Celery worker. It is optional:
+# when it is not configured or not reachable, callers fall back to their
+# process-local cache, and we retry the connection after REDIS_RETRY_SECONDS.
+
+REDIS_URL = os.getenv("REDIS_URL", os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0"))
+REDIS_RETRY_SECONDS = 30
+
+_redis_client = None
+_redis_failed_at = 0.0
+
+
+def get_redis() -> Optional[redis.Redis]:
+    """The process-wide Redis client, or None while Redis is unavailable."""
+    global _redis_client, _redis_failed_at
+    if _redis_client is not None:
+        return _redis_client
+    if not REDIS_URL.startswith(("redis://", "rediss://", "unix://")):
+        return None
+    if time.monotonic() - _redis_failed_at < REDIS_RETRY_SECONDS:
+        return None
+    try:
+        client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
+        client.ping()
+        _redis_client = client
+    except redis.RedisError as e:
+        print(f"Redis unavailable at {REDIS_URL}, using process-local caches: {e}")
+        _redis_failed_at = time.monotonic()
+    return _redis_client
+
+
+class LRUCache:
+    """
+    A small process-local least-recently-used map. Entries optionally expire
+    after `ttl` seconds. Safe to share between threads.
+    """
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TieredCache:
+    """
+    Process-local LRU/TTL tier in front of a Redis tier shared by every process.
+    Values go through `dumps`/`loads` (JSON by default) on their way to Redis.
+    Hit and miss counts are kept per process and, when Redis is up, aggregated
+    across processes in the `cache-stats:<name>` hash.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl: int = 24 * 3600,
+                 dumps: Callable[[Any], bytes] = lambda value: json.dumps(value).encode(),
+                 loads: Callable[[bytes], Any] = json.loads):
+        self.name = name
+        self.ttl = ttl
+        self.local = LRUCache(max_entries, ttl)
+        self.dumps, self.loads = dumps, loads
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def _count(self, outcome: str) -> None:
+        self.stats[outcome] += 1
+        client = get_redis()
+        if client is not None:
+            try:
+                client.hincrby(f"cache-stats:{self.name}", outcome, 1)
+            except redis.RedisError:
+                pass
+
+    def get(self, key: str):
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+        client = get_redis()
+        if client is not None:
+            try:
+                stored = client.get(self._key(key))
+                if stored is not None:
+                    value = self.loads(stored)
+                    self.local.set(key, value)
+                    self._count("redis_hits")
+                    return value
+            except redis.RedisError as e:
+                print(f"Cache '{self.name}' read failed: {e}")
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value) -> None:
+        self.local.set(key, value)
+        client = get_redis()
+        if client is not None:
+            try:
+                client.set(self._key(key), self.dumps(value), ex=self.ttl)
+            except redis.RedisError as e:
+                print(f"Cache '{self.name}' write failed: {e}")
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def metrics(self) -> Dict[str, Any]:
+        """This process's counters, plus the cluster-wide ones when Redis is reachable."""
+        report = {"process": dict(self.stats, local_entries=len(self.local))}
+        client = get_redis()
+        if client is not None:
+            try:
+                report["cluster"] = {field.decode(): int(count) for field, count in client.hgetall(f"cache-stats:{self.name}").items()}
+            except redis.RedisError:
+                pass
+        counts = report.get("cluster", report["process"])
+        lookups = sum(counts.get(outcome, 0) for outcome in self.stats)
+        hits = counts.get("local_hits", 0) + counts.get("redis_hits", 0)
+        report["hit_rate"] = round(hits / lookups, 4) if lookups else None
+        return report
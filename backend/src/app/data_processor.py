@@ -1,8 +1,97 @@
 import csv
 import io
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
 from sqlalchemy.orm import Session
 from app.models import User, Transaction
 
+# Uploads are spooled here by the API and picked up by the Celery worker, so
+# this directory must be shared between both containers (see docker-compose.yml).
+STAGING_DIR = Path(os.getenv("UPLOAD_STAGING_DIR", Path(__file__).resolve().parents[2] / 'uploads'))
+
+# Number of CSV rows the worker holds in memory at once.
+CSV_CHUNK_SIZE = int(os.getenv("CSV_CHUNK_SIZE", "5000"))
+UPLOAD_COPY_BUFFER = 1024 * 1024
+# Staged files older than this were left behind by a process that died mid-upload or mid-job.
+STAGING_MAX_AGE_SECONDS = int(os.getenv("UPLOAD_STAGING_MAX_AGE_SECONDS", 24 * 3600))
+
+REQUIRED_CSV_COLUMNS = {"Debit_Account", "Credit_Account", "Amount"}
+
+
+def stage_upload(source: BinaryIO, filename: str) -> Path:
+    """
+    Copies an uploaded file to the staging directory in fixed-size blocks,
+    so the API never holds the whole file in memory.
+    """
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    staged_path = STAGING_DIR / f"{uuid.uuid4().hex}_{Path(filename).name}"
+    partial_path = staged_path.with_name(staged_path.name + ".part")
+
+    try:
+        with open(partial_path, 'wb') as out:
+            shutil.copyfileobj(source, out, UPLOAD_COPY_BUFFER)
+    except BaseException: # Client disconnect, disk full...
+        discard_staged_upload(partial_path)
+        raise
+    # The worker must never see a half-written file.
+    os.replace(partial_path, staged_path)
+    return staged_path
+
+
+def read_csv_header(path: Path) -> List[str]:
+    """Reads only the header row of a staged CSV."""
+    with open(path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), [])
+
+
+def discard_staged_upload(path) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_stale_uploads(max_age_seconds: float = STAGING_MAX_AGE_SECONDS) -> None:
+    """Deletes staged (and partially staged) files nobody cleaned up, e.g. after a worker was killed."""
+    if not STAGING_DIR.exists():
+        return
+    for path in STAGING_DIR.iterdir():
+        if path.is_file() and time.time() - path.stat().st_mtime > max_age_seconds:
+            discard_staged_upload(path)
+
+
+def iter_csv_rows(path) -> Iterator[Dict[str, str]]:
+    """Lazily yields the rows of a staged CSV file, one dict at a time."""
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def iter_chunks(rows: Iterable[Dict[str, str]], chunk_size: int = CSV_CHUNK_SIZE) -> Iterator[List[Dict[str, str]]]:
+    """Groups a row stream into lists of at most `chunk_size` rows."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_event_time(value: Optional[str]) -> Optional[datetime]:
+    """Parses a CSV `Date` value (ISO 8601). Returns None when it is missing or malformed."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+
 def map_and_process_csv(db: Session, file_content: bytes) -> int:
     """
     Reads a CSV, creates users, and saves transactions to the database.
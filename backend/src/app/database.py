@@ -1,7 +1,14 @@
+import json
 import os
-from sqlalchemy import create_engine
+import socket
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from dotenv import load_dotenv
 
 load_dotenv() # This loads the .env file
@@ -11,6 +18,165 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if not SQLALCHEMY_DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable not set")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# --- Connection pool ---
+# Each process (API worker, Celery prefork child) has its own pool; size it per
+# process so that processes x (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays under the
+# server's max_connections. Behind PgBouncer in transaction mode, set
+# DB_POOL_MODE=null: PgBouncer does the pooling and a client-side pool would only
+# pin server connections. Pre-ping and recycle keep connections dropped by the
+# server, a proxy or a failover from surfacing as errors in requests and tasks.
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue") # queue | null
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+def _engine_options() -> dict:
+    if DB_POOL_MODE == "null": # Fresh connection per checkout, nothing to ping
+        return {"poolclass": NullPool}
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if not SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE)
+    return options
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+# Pool event counters for this process, see pool_metrics()
+_pool_stats = {"connects": 0, "checkouts": 0, "invalidated": 0, "peak_checked_out": 0, "checkout_seconds": 0.0}
+_pool_stats_lock = threading.Lock()
+_checkout_started = {} # id(connection record) -> checkout time
+
+@event.listens_for(engine, "connect")
+def _count_connect(dbapi_connection, connection_record):
+    with _pool_stats_lock:
+        _pool_stats["connects"] += 1
+
+@event.listens_for(engine, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    with _pool_stats_lock:
+        _checkout_started[id(connection_record)] = time.monotonic()
+        _pool_stats["checkouts"] += 1
+        _pool_stats["peak_checked_out"] = max(_pool_stats["peak_checked_out"], len(_checkout_started))
+
+@event.listens_for(engine, "checkin")
+def _count_checkin(dbapi_connection, connection_record):
+    with _pool_stats_lock:
+        checked_out_at = _checkout_started.pop(id(connection_record), None)
+        if checked_out_at is not None:
+            _pool_stats["checkout_seconds"] += time.monotonic() - checked_out_at
+
+@event.listens_for(engine, "invalidate")
+def _count_invalidate(dbapi_connection, connection_record, exception):
+    with _pool_stats_lock:
+        _pool_stats["invalidated"] += 1
+
+# --- Async engine ---
+# The hot read endpoints of the API run on the event loop through an asyncio engine
+# (asyncpg) instead of holding a threadpool thread for every query; Celery tasks and
+# the remaining endpoints keep the sync engine above. Created on first use, so worker
+# processes never load the async driver. Its pool takes the same DB_POOL_* settings,
+# per API process, on top of the sync pool.
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def _async_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(SQLALCHEMY_DATABASE_URL)
+_async_engine = None
+_async_sessionmaker = None
+_async_engine_lock = threading.Lock()
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine, _async_sessionmaker
+    with _async_engine_lock:
+        if _async_engine is None:
+            _async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options())
+            for name, listener in (("connect", _count_connect), ("checkout", _count_checkout), ("checkin", _count_checkin), ("invalidate", _count_invalidate)):
+                event.listen(_async_engine.sync_engine, name, listener)
+            _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+        return _async_engine
+
+def AsyncSessionLocal():
+    """A new AsyncSession on the async engine."""
+    if _async_sessionmaker is None:
+        get_async_engine()
+    return _async_sessionmaker()
+
+def pool_metrics() -> dict:
+    """
+    This process's pool: its configuration, current usage and counters since start.
+    `connects` close to `checkouts` means connections aren't being reused (or the pool
+    is in null mode); `peak_checked_out` near size + overflow means the pool is too small.
+    """
+    with _pool_stats_lock:
+        stats = dict(_pool_stats, checked_out_now=len(_checkout_started))
+    stats["checkout_seconds"] = round(stats["checkout_seconds"], 3)
+    stats["pool"] = {"mode": DB_POOL_MODE, "class": type(engine.pool).__name__, "status": engine.pool.status()}
+    if hasattr(engine.pool, "size"):
+        stats["pool"].update(size=engine.pool.size(), overflow=engine.pool.overflow(), checked_in=engine.pool.checkedin(), max_overflow=DB_MAX_OVERFLOW, timeout=DB_POOL_TIMEOUT)
+    if _async_engine is not None: # Counters above cover both pools
+        stats["async_pool"] = {"class": type(_async_engine.pool).__name__, "status": _async_engine.pool.status()}
+    return stats
+
+POOL_METRICS_KEY = "db-pool-stats"
+POOL_METRICS_INTERVAL_SECONDS = 10
+POOL_METRICS_STALE_SECONDS = 300
+_pool_metrics_published_at = 0.0
+
+def publish_pool_metrics(role: str) -> None:
+    """Shares this process's pool_metrics() through Redis, at most every POOL_METRICS_INTERVAL_SECONDS."""
+    global _pool_metrics_published_at
+    if time.monotonic() - _pool_metrics_published_at < POOL_METRICS_INTERVAL_SECONDS:
+        return
+    _pool_metrics_published_at = time.monotonic()
+    from app.cache import get_redis
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.hset(POOL_METRICS_KEY, f"{role}:{socket.gethostname()}:{os.getpid()}", json.dumps(dict(pool_metrics(), at=time.time())))
+    except Exception as e:
+        print(f"Could not publish pool metrics: {e}")
+
+def cluster_pool_metrics() -> dict:
+    """The latest pool_metrics() of every API and worker process that published recently."""
+    from app.cache import get_redis
+    client = get_redis()
+    if client is None:
+        return {}
+    processes, stale = {}, []
+    for field, value in client.hgetall(POOL_METRICS_KEY).items():
+        stats = json.loads(value)
+        if time.time() - stats["at"] > POOL_METRICS_STALE_SECONDS: # Process exited or went idle
+            stale.append(field)
+        else:
+            processes[field.decode()] = stats
+    if stale:
+        client.hdel(POOL_METRICS_KEY, *stale)
+    return processes
+
+def reset_after_fork() -> None:
+    """
+    Called in each forked worker process: drops the pool inherited from the parent
+    without closing its connections, which still belong to the parent, so the child
+    opens its own instead of sharing sockets.
+    """
+    engine.dispose(close=False)
+    with _pool_stats_lock:
+        _pool_stats.update(connects=0, checkouts=0, invalidated=0, peak_checked_out=0, checkout_seconds=0.0)
+        _checkout_started.clear()
+
+def dialect_insert(db, table):
+    """
+    Returns an INSERT construct for the session's dialect, so callers can use
+    .on_conflict_do_nothing()/.on_conflict_do_update() on PostgreSQL and SQLite alike.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
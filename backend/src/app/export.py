@@ -0,0 +1,163 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_, select
+
+from app import database, models
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Parquet export is optional
+    pa = pq = None
+
+# --- Streaming bulk export ---
+# Rows are read through a server-side cursor (yield_per) and written out one chunk
+# at a time, so an export of any size holds at most EXPORT_CHUNK_ROWS rows in
+# memory. The generator owns its session: the response outlives the request's
+# dependencies.
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 10_000))
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+router = APIRouter(
+    prefix="/export",
+    tags=["Export"],
+)
+
+TRANSACTION_COLUMNS = [
+    models.Transaction.id, models.Transaction.timestamp, models.Transaction.from_user_id, models.Transaction.to_user_id,
+    models.Transaction.amount, models.Transaction.currency, models.Transaction.description,
+    models.Transaction.source, models.Transaction.external_id, models.Transaction.ingested_at,
+]
+ALERT_COLUMNS = [
+    models.Alert.id, models.Alert.created_at, models.Alert.user_id, models.Alert.alert_type,
+    models.Alert.status, models.Alert.message, models.Alert.ai_summary,
+]
+
+def _arrow_type(column):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return pa.timestamp("us", tz="UTC")
+    return {int: pa.int64(), float: pa.float64()}.get(python_type, pa.string())
+
+class _ChunkSink:
+    """Write-only file object that hands back what was written since the last drain()."""
+
+    def __init__(self):
+        self._chunks, self._position, self.closed = [], 0, False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+def _stream_rows(statement) -> Iterator[list]:
+    """Lists of result rows, EXPORT_CHUNK_ROWS at a time, from a server-side cursor."""
+    db = database.SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        for partition in result.partitions():
+            yield partition
+    finally:
+        db.close()
+
+def _encode(columns, chunks: Iterator[list], export_format: str) -> Iterator[bytes]:
+    names = [column.key for column in columns]
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        for rows in chunks:
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode()
+    elif export_format == "ndjson":
+        for rows in chunks:
+            yield "".join(json.dumps({name: _json_value(value) for name, value in zip(names, row)}) + "\n" for row in rows).encode()
+    else:
+        schema = pa.schema([(name, _arrow_type(column)) for name, column in zip(names, columns)])
+        sink = _ChunkSink()
+        with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+            for rows in chunks: # One row group per chunk
+                writer.write_table(pa.Table.from_pylist([dict(zip(names, row)) for row in rows], schema=schema))
+                yield sink.drain()
+        yield sink.drain()
+
+def _export_response(name: str, columns, statement, export_format: str) -> StreamingResponse:
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{export_format}'. Expected one of: {', '.join(EXPORT_FORMATS)}.")
+    if export_format == "parquet" and pa is None:
+        raise HTTPException(status_code=501, detail="Parquet export needs pyarrow, which is not installed.")
+    media_type, extension = EXPORT_FORMATS[export_format]
+    filename = f"{name}-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{extension}"
+    return StreamingResponse(
+        _encode(columns, _stream_rows(statement), export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/transactions")
+def export_transactions(
+    format: str = "csv",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user_id: Optional[List[int]] = Query(None, description="Only transactions to or from these users"),
+):
+    """Streams transactions in id order, filtered by event time (`since` inclusive, `until` exclusive) and users."""
+    statement = select(*TRANSACTION_COLUMNS).order_by(models.Transaction.id)
+    if since is not None:
+        statement = statement.where(models.Transaction.timestamp >= since)
+    if until is not None:
+        statement = statement.where(models.Transaction.timestamp < until)
+    if user_id:
+        statement = statement.where(or_(models.Transaction.to_user_id.in_(user_id), models.Transaction.from_user_id.in_(user_id)))
+    return _export_response("transactions", TRANSACTION_COLUMNS, statement, format)
+
+@router.get("/alerts")
+def export_alerts(
+    format: str = "csv",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user_id: Optional[List[int]] = Query(None),
+    alert_type: Optional[List[str]] = Query(None),
+):
+    """Streams alerts in id order, filtered by creation time, users and alert types."""
+    statement = select(*ALERT_COLUMNS).order_by(models.Alert.id)
+    if since is not None:
+        statement = statement.where(models.Alert.created_at >= since)
+    if until is not None:
+        statement = statement.where(models.Alert.created_at < until)
+    if user_id:
+        statement = statement.where(models.Alert.user_id.in_(user_id))
+    if alert_type:
+        statement = statement.where(models.Alert.alert_type.in_(alert_type))
+    return _export_response("alerts", ALERT_COLUMNS, statement, format)
@@ -1,245 +1,98 @@
-# import networkx as nx
-# from sqlalchemy.orm import Session
-# from sqlalchemy import or_
-# from app.models import Transaction, User
-# import plotly.graph_objects as go
-# import json
-
-# def build_and_analyze_graph(db: Session, root_user_id: int, hops: int = 2) -> dict:
-#     """
-#     Builds and analyzes a "local neighborhood" graph to prevent out-of-memory errors.
-#     """
-#     print(f"Starting LOCAL graph analysis for user {root_user_id} with {hops} hops...")
-    
-#     # --- Step 1: Find the local neighborhood of users ---
-#     nodes_to_include = {root_user_id}
-#     current_layer = {root_user_id}
-
-#     for _ in range(hops):
-#         if not current_layer: break
-        
-#         # Find all users connected to the current layer of nodes
-#         query = db.query(Transaction.from_user_id, Transaction.to_user_id).filter(
-#             or_(
-#                 Transaction.from_user_id.in_(current_layer),
-#                 Transaction.to_user_id.in_(current_layer)
-#             )
-#         ).distinct()
-
-#         next_layer = set()
-#         for from_id, to_id in query:
-#             if from_id: next_layer.add(from_id)
-#             if to_id: next_layer.add(to_id)
-        
-#         new_nodes = next_layer - nodes_to_include
-#         if not new_nodes: break
-        
-#         nodes_to_include.update(new_nodes)
-#         current_layer = new_nodes
-
-#     print(f"Found {len(nodes_to_include)} users in the local neighborhood.")
-
-#     # --- Step 2: Fetch only the transactions between these users ---
-#     local_txs = db.query(Transaction).filter(
-#         Transaction.from_user_id.in_(nodes_to_include),
-#         Transaction.to_user_id.in_(nodes_to_include)
-#     ).all()
-
-#     if not local_txs:
-#         return {"error": "No P2P transactions found in the local neighborhood."}
-
-#     # --- Step 3: Build the smaller, local graph ---
-#     G = nx.DiGraph()
-#     for tx in local_txs:
-#         G.add_edge(tx.from_user_id, tx.to_user_id, weight=tx.amount)
-
-#     if not G.has_node(root_user_id):
-#         return {"error": "User not in P2P graph after filtering."}
-        
-#     print(f"Local graph built with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
-        
-#     # --- Step 4: Analysis (on the smaller graph) ---
-#     user_cycles = [c for c in nx.simple_cycles(G) if root_user_id in c]
-#     pagerank = nx.pagerank(G, weight='weight')
-#     betweenness = nx.betweenness_centrality(G, weight='weight')
-    
-#     analysis_findings = {
-#         "cycles": user_cycles,
-#         "pagerank_score": pagerank.get(root_user_id, 0),
-#         "betweenness_score": betweenness.get(root_user_id, 0),
-#     }
-
-#     # --- Step 5: Visualization (on the smaller graph) ---
-#     pos = nx.spring_layout(G, k=0.8, iterations=100, seed=42)
-    
-#     edge_annotations = []
-#     for edge in G.edges():
-#         x0, y0 = pos[edge[0]]
-#         x1, y1 = pos[edge[1]]
-#         edge_annotations.append(go.layout.Annotation(x=x1, y=y1, ax=x0, ay=y0, xref='x', yref='y', axref='x', ayref='y', showarrow=True, arrowhead=2, arrowsize=1, arrowwidth=1, arrowcolor='#666'))
-
-#     node_x, node_y, node_text, node_colors, node_sizes = [], [], [], [], []
-#     all_user_map = {u.id: u.full_name for u in db.query(User).filter(User.id.in_(nodes_to_include)).all()}
-    
-#     node_strengths = dict(G.degree(weight='weight'))
-#     min_strength = min(node_strengths.values()) if node_strengths else 1
-#     max_strength = max(node_strengths.values()) if node_strengths else 1
-
-#     for node in G.nodes():
-#         x, y = pos[node]
-#         node_x.append(x)
-#         node_y.append(y)
-#         node_text.append(f"<b>{all_user_map.get(node, f'ID: {node}')}</b><br>Influence (PageRank): {pagerank.get(node, 0):.3f}")
-
-#         strength = node_strengths.get(node, 0)
-#         size = 10 + 30 * ((strength - min_strength) / (max_strength - min_strength + 1e-6))
-#         node_sizes.append(size)
-
-#         if node == root_user_id: node_colors.append('#f48fb1')
-#         elif any(node in cycle for cycle in user_cycles): node_colors.append('#ff6f00')
-#         elif G.in_degree(node) == 0: node_colors.append('#90caf9')
-#         else: node_colors.append('#81c784')
-
-#     node_trace = go.Scatter(x=node_x, y=node_y, mode='markers', hoverinfo='text', text=node_text, marker=dict(color=node_colors, size=node_sizes, line_width=2, line_color='#FFF'))
-    
-#     # We create an edge trace separately for a cleaner graph (no lines go through markers)
-#     edge_x_coords, edge_y_coords = [], []
-#     for edge in G.edges():
-#         x0, y0 = pos[edge[0]]
-#         x1, y1 = pos[edge[1]]
-#         edge_x_coords.extend([x0, x1, None])
-#         edge_y_coords.extend([y0, y1, None])
-    
-#     edge_trace = go.Scatter(x=edge_x_coords, y=edge_y_coords, line=dict(width=0.5, color='#888'), hoverinfo='none', mode='lines')
-
-#     fig = go.Figure(data=[edge_trace, node_trace],
-#         layout=go.Layout(
-#             showlegend=False, hovermode='closest', margin=dict(b=0,l=0,r=0,t=0),
-#             annotations=edge_annotations,
-#             xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-#             yaxis=dict(showgrid=False, zeroline=False, showticklabels=False)
-#         )
-#     )
-    
-#     return {
-#         "findings": analysis_findings,
-#         "plot_data": json.loads(fig.to_json())
-#     }
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-import networkx as nx
+import hashlib
+import os
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app.models import Transaction, User
-import plotly.graph_objects as go
-import json
+from app.models import User
+from app import graph_engine, graph_store
+from app.cache import TieredCache
+
+# Bounds that keep a single analysis job's cost independent of the graph's size.
+NEIGHBOURHOOD_HOPS = 2
+MAX_NEIGHBOURHOOD_NODES = 300
+MAX_CYCLE_LENGTH = 6
+MAX_CYCLES = 25
+BETWEENNESS_SAMPLES = 64
+
+# Layouts depend only on the neighbourhood's structure, so they are cached by its content hash.
+PLOT_FORMAT = "compact-v1"
+layout_cache = TieredCache(
+    "graph-layout", max_entries=256, ttl=int(os.getenv("LAYOUT_CACHE_TTL", 24 * 3600)),
+    dumps=lambda positions: positions.tobytes(),
+    loads=lambda stored: np.frombuffer(stored, dtype=np.float32).reshape(-1, 2),
+)
+
+def _layout_key(node_user_ids: np.ndarray, src: np.ndarray, dst: np.ndarray) -> str:
+    digest = hashlib.sha256()
+    for array in (node_user_ids, src, dst):
+        digest.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+def cached_layout(node_user_ids: np.ndarray, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """Spring layout for the neighbourhood, served from the layout cache when possible."""
+    return layout_cache.get_or_compute(
+        _layout_key(node_user_ids, src, dst),
+        lambda: graph_engine.spring_layout(len(node_user_ids), src, dst).astype(np.float32),
+    )
 
-def build_and_analyze_graph(db: Session, root_user_id: int) -> dict:
+def build_and_analyze_graph(db: Session, root_user_id: int, hops: int = NEIGHBOURHOOD_HOPS) -> dict:
     """
-    Builds an EGO GRAPH - only showing the user and their direct connections.
-    This is extremely fast and memory-efficient.
+    Analyzes the multi-hop neighbourhood of a user on the compact CSR transaction graph:
+    bounded k-hop BFS, bounded-length cycles through the user, PageRank and approximate
+    betweenness. Only the bounded neighbourhood is ever turned into Python objects.
+    `plot_data` is the compact format: parallel node arrays and edges as node indices.
     """
-    print(f"Starting EGO graph analysis for user {root_user_id}...")
-    
-    # --- Step 1: Fetch ONLY direct transactions for the root user ---
-    direct_txs = db.query(Transaction).filter(
-        or_(
-            Transaction.from_user_id == root_user_id,
-            Transaction.to_user_id == root_user_id
-        )
-    ).all()
+    print(f"Starting graph analysis for user {root_user_id} with {hops} hops...")
 
-    if not direct_txs:
+    # --- Step 1: Map the shared graph snapshot ---
+    graph = graph_store.get_graph(db)
+    root = graph.index_of(root_user_id)
+    if root is None:
         return {"error": "User has no P2P transactions to graph."}
 
-    # --- Step 2: Build the small, local graph ---
-    G = nx.DiGraph()
-    for tx in direct_txs:
-        if tx.from_user_id and tx.to_user_id:
-            G.add_edge(tx.from_user_id, tx.to_user_id, weight=tx.amount)
+    # --- Step 2: Bounded neighbourhood around the user ---
+    nodes = graph.k_hop(root, hops, MAX_NEIGHBOURHOOD_NODES)
+    src, dst, weights, _ = graph.subgraph_edges(nodes)
+    print(f"Neighbourhood has {len(nodes)} nodes and {len(src)} edges (full graph: {graph.num_nodes} nodes, {graph.num_edges} edges).")
+
+    # --- Step 3: Analysis ---
+    # Cycles are searched on the full graph, so rings that leave the neighbourhood are still found.
+    user_cycles = [graph.node_ids[cycle].tolist() for cycle in graph.cycles_through(root, MAX_CYCLE_LENGTH, MAX_CYCLES)]
+    pagerank = graph_engine.pagerank(len(nodes), src, dst, weights)
+    betweenness = graph_engine.approximate_betweenness(len(nodes), src, dst, samples=BETWEENNESS_SAMPLES)
 
-    if not G.nodes:
-        return {"error": "Could not build graph from user's transactions."}
-        
-    print(f"Ego graph built with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
-        
-    # --- Step 3: Analysis (on the small graph) ---
-    # We can't find long cycles, but we can still get basic stats.
-    pagerank = nx.pagerank(G) if G.nodes else {}
-    
     analysis_findings = {
-        "cycles": [], # Ego graph is unlikely to have cycles unless it's a direct back-and-forth
-        "pagerank_score": pagerank.get(root_user_id, 0),
-        "betweenness_score": 0, # Not meaningful on an ego graph
+        "cycles": user_cycles,
+        "pagerank_score": float(pagerank[0]), # The root is always the first neighbourhood node
+        "betweenness_score": float(betweenness[0]),
     }
 
-    # --- Step 4: Visualization (This part is fine) ---
-    pos = nx.spring_layout(G)
-    
-    edge_annotations = []
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        edge_annotations.append(go.layout.Annotation(x=x1, y=y1, ax=x0, ay=y0, xref='x', yref='y', axref='x', ayref='y', showarrow=True, arrowhead=2, arrowsize=2, arrowwidth=1.5, arrowcolor='#888'))
-
-    node_x, node_y, node_text, node_colors, node_sizes = [], [], [], [], []
-    all_user_ids = list(G.nodes())
-    user_map = {u.id: u.full_name for u in db.query(User).filter(User.id.in_(all_user_ids)).all()}
-    
-    for node in G.nodes():
-        x, y = pos[node]
-        node_x.append(x)
-        node_y.append(y)
-        node_text.append(f"<b>{user_map.get(node, f'ID: {node}')}</b>")
-
-        if node == root_user_id:
-            node_colors.append('#f48fb1') # Pink
-            node_sizes.append(30)
-        else:
-            node_colors.append('#90caf9') # Blue
-            node_sizes.append(20)
-
-    node_trace = go.Scatter(x=node_x, y=node_y, mode='markers+text', text=node_text, textposition="top center", marker=dict(color=node_colors, size=node_sizes, line_width=2))
-    
-    edge_x_coords, edge_y_coords = [], []
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        edge_x_coords.extend([x0, x1, None])
-        edge_y_coords.extend([y0, y1, None])
-    
-    edge_trace = go.Scatter(x=edge_x_coords, y=edge_y_coords, line=dict(width=1, color='#888'), hoverinfo='none', mode='lines')
+    # --- Step 4: Visualization (on the bounded neighbourhood) ---
+    # A compact node/edge array payload; the frontend builds the Plotly traces itself.
+    node_user_ids = graph.node_ids[nodes]
+    positions = cached_layout(node_user_ids, src, dst)
+    user_map = {u.id: u.full_name for u in db.query(User.id, User.full_name).filter(User.id.in_(node_user_ids.tolist())).all()}
+    cycle_members = {user_id for cycle in user_cycles for user_id in cycle}
+    roles = ["root" if user_id == root_user_id else "cycle" if user_id in cycle_members else "peer" for user_id in node_user_ids.tolist()]
+
+    plot_data = {
+        "format": PLOT_FORMAT,
+        "nodes": {
+            "id": node_user_ids.tolist(),
+            "label": [user_map.get(user_id, f"ID: {user_id}") for user_id in node_user_ids.tolist()],
+            "x": np.round(positions[:, 0].astype(float), 4).tolist(),
+            "y": np.round(positions[:, 1].astype(float), 4).tolist(),
+            "role": roles,
+            "pagerank": np.round(pagerank, 4).tolist(),
+        },
+        "edges": {
+            "source": src.tolist(),
+            "target": dst.tolist(),
+            "amount": np.round(weights, 2).tolist(),
+        },
+    }
 
-    fig = go.Figure(data=[edge_trace, node_trace],
-        layout=go.Layout(
-            showlegend=False, margin=dict(b=0,l=0,r=0,t=0),
-            annotations=edge_annotations,
-            xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-            yaxis=dict(showgrid=False, zeroline=False, showticklabels=False)
-        )
-    )
-    
     return {
         "findings": analysis_findings,
-        "plot_data": json.loads(fig.to_json())
-    }
\ No newline at end of file
+        "plot_data": plot_data
+    }
@@ -0,0 +1,310 @@
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.models import GraphEdge
+
+# --- Compact in-memory transaction graph ---
+# Edges are aggregated per (sender, receiver) pair and stored in CSR form as flat
+# NumPy arrays, so millions of edges cost a few dozen bytes each and no per-edge
+# Python objects are kept around. Nodes are addressed by their position in
+# `node_ids` (sorted user IDs); every method below works on those positions.
+
+EDGE_FETCH_SIZE = 100_000
+
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """Concatenates the adjacency lists of `nodes` without a Python loop."""
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    # Position of each output slot within its own adjacency list, offset by the list's start.
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+class TransactionGraph:
+    def __init__(self, node_ids, indptr, indices, weights, counts, timestamps, in_indptr, in_indices):
+        self.node_ids = node_ids        # int64[n]  user ID of each node, sorted
+        self.indptr = indptr            # int64[n+1] out-edge offsets
+        self.indices = indices          # int64[m]  receiver of each out-edge
+        self.weights = weights          # float64[m] total amount sent along the edge
+        self.counts = counts            # int64[m]  number of transactions along the edge
+        self.timestamps = timestamps    # int64[m]  last transaction time (unix seconds)
+        self.in_indptr = in_indptr      # int64[n+1] in-edge offsets
+        self.in_indices = in_indices    # int64[m]  sender of each in-edge
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    @classmethod
+    def from_edges(cls, senders, receivers, weights, counts, timestamps) -> "TransactionGraph":
+        """Builds the CSR arrays from parallel edge arrays of user IDs."""
+        senders = np.asarray(senders, dtype=np.int64)
+        receivers = np.asarray(receivers, dtype=np.int64)
+        node_ids, positions = np.unique(np.concatenate([senders, receivers]), return_inverse=True)
+        src, dst = positions[:len(senders)], positions[len(senders):]
+        num_nodes = len(node_ids)
+
+        order = np.lexsort((dst, src))
+        src, dst = src[order], dst[order]
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+
+        in_order = np.argsort(dst, kind="stable")
+        in_indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst, minlength=num_nodes), out=in_indptr[1:])
+
+        return cls(
+            node_ids=node_ids,
+            indptr=indptr,
+            indices=dst,
+            weights=np.asarray(weights, dtype=np.float64)[order],
+            counts=np.asarray(counts, dtype=np.int64)[order],
+            timestamps=np.asarray(timestamps, dtype=np.int64)[order],
+            in_indptr=in_indptr,
+            in_indices=src[in_order],
+        )
+
+    # --- Lookups ---
+    def index_of(self, user_id: int) -> Optional[int]:
+        position = int(np.searchsorted(self.node_ids, user_id))
+        if position < self.num_nodes and self.node_ids[position] == user_id:
+            return position
+        return None
+
+    def successors(self, node: int) -> np.ndarray:
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def predecessors(self, node: int) -> np.ndarray:
+        return self.in_indices[self.in_indptr[node]:self.in_indptr[node + 1]]
+
+    # --- Traversal ---
+    def k_hop(self, root: int, hops: int, max_nodes: int) -> np.ndarray:
+        """
+        Nodes within `hops` steps of `root`, following edges in either direction.
+        The BFS stops growing once `max_nodes` have been collected; the root is always first.
+        """
+        visited = np.zeros(self.num_nodes, dtype=bool)
+        visited[root] = True
+        collected = [np.array([root], dtype=np.int64)]
+        remaining = max_nodes - 1
+        frontier = collected[0]
+
+        for _ in range(hops):
+            if remaining <= 0 or len(frontier) == 0:
+                break
+            neighbours = np.concatenate([
+                self.indices[_gather(self.indptr, self.indices, frontier)],
+                self.in_indices[_gather(self.in_indptr, self.in_indices, frontier)],
+            ])
+            neighbours = np.unique(neighbours)
+            neighbours = neighbours[~visited[neighbours]][:remaining]
+            visited[neighbours] = True
+            collected.append(neighbours)
+            remaining -= len(neighbours)
+            frontier = neighbours
+        return np.concatenate(collected)
+
+    def _distances_to(self, target: int, max_depth: int) -> np.ndarray:
+        """Hop distance from every node to `target` along edge direction (-1 if farther than max_depth)."""
+        distance = np.full(self.num_nodes, -1, dtype=np.int64)
+        distance[target] = 0
+        frontier = np.array([target], dtype=np.int64)
+        for depth in range(1, max_depth + 1):
+            senders = np.unique(self.in_indices[_gather(self.in_indptr, self.in_indices, frontier)])
+            senders = senders[distance[senders] < 0]
+            if len(senders) == 0:
+                break
+            distance[senders] = depth
+            frontier = senders
+        return distance
+
+    def cycles_through(self, root: int, max_length: int = 6, max_cycles: int = 50, max_expansions: int = 200_000) -> List[List[int]]:
+        """
+        Simple directed cycles of at most `max_length` nodes that pass through `root`,
+        shortest first. The search only steps onto nodes that can still get back to
+        `root` within the remaining budget, and gives up after `max_expansions` steps.
+        """
+        distance_back = self._distances_to(root, max_length - 1)
+        cycles: List[List[int]] = []
+        expansions = 0
+
+        # Iterative deepening: tight rings are reported before long, incidental loops.
+        for length in range(2, max_length + 1):
+            path = [root]
+            on_path = {root}
+            stack = [iter(self.successors(root).tolist())]
+            while stack and len(cycles) < max_cycles and expansions < max_expansions:
+                next_node = next(stack[-1], None)
+                if next_node is None:
+                    stack.pop()
+                    on_path.discard(path.pop())
+                    continue
+                expansions += 1
+                if next_node == root:
+                    if len(path) == length:
+                        cycles.append(list(path))
+                    continue
+                steps_left = length - len(path)
+                if next_node in on_path or distance_back[next_node] < 0 or distance_back[next_node] > steps_left:
+                    continue
+                path.append(next_node)
+                on_path.add(next_node)
+                stack.append(iter(self.successors(next_node).tolist()))
+        return cycles
+
+    # --- Subgraph analytics ---
+    def subgraph_edges(self, nodes: np.ndarray):
+        """
+        Edges of the subgraph induced by `nodes`, with endpoints given as positions
+        in `nodes`. Returns (src, dst, weights, counts).
+        """
+        local_position = np.full(self.num_nodes, -1, dtype=np.int64)
+        local_position[nodes] = np.arange(len(nodes))
+        edge_slots = _gather(self.indptr, self.indices, nodes)
+        senders = np.repeat(nodes, self.indptr[nodes + 1] - self.indptr[nodes])
+        receivers = self.indices[edge_slots]
+        inside = local_position[receivers] >= 0
+        return (
+            local_position[senders[inside]],
+            local_position[receivers[inside]],
+            self.weights[edge_slots[inside]],
+            self.counts[edge_slots[inside]],
+        )
+
+
+def pagerank(num_nodes: int, src: np.ndarray, dst: np.ndarray, weights: np.ndarray, alpha: float = 0.85, tol: float = 1.0e-8, max_iter: int = 100) -> np.ndarray:
+    """Weighted PageRank by power iteration over edge arrays. Dangling mass is spread uniformly."""
+    if num_nodes == 0:
+        return np.empty(0)
+    out_weight = np.bincount(src, weights=weights, minlength=num_nodes)
+    dangling = out_weight == 0
+    rank = np.full(num_nodes, 1.0 / num_nodes)
+    edge_share = weights / np.where(out_weight[src] > 0, out_weight[src], 1.0)
+    for _ in range(max_iter):
+        previous = rank
+        spread = np.bincount(dst, weights=previous[src] * edge_share, minlength=num_nodes)
+        rank = alpha * (spread + previous[dangling].sum() / num_nodes) + (1.0 - alpha) / num_nodes
+        if np.abs(rank - previous).sum() < num_nodes * tol:
+            break
+    return rank
+
+
+def approximate_betweenness(num_nodes: int, src: np.ndarray, dst: np.ndarray, samples: int = 64, seed: int = 42) -> np.ndarray:
+    """
+    Betweenness centrality (unweighted, directed, normalised like networkx) estimated with
+    Brandes' algorithm from `samples` randomly chosen source nodes.
+    """
+    betweenness = np.zeros(num_nodes)
+    if num_nodes < 3:
+        return betweenness
+    order = np.argsort(src, kind="stable")
+    targets = dst[order]
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+
+    rng = np.random.default_rng(seed)
+    sources = rng.choice(num_nodes, size=min(samples, num_nodes), replace=False)
+    for source in sources:
+        sigma = np.zeros(num_nodes)
+        sigma[source] = 1.0
+        distance = np.full(num_nodes, -1, dtype=np.int64)
+        distance[source] = 0
+        levels = [np.array([source], dtype=np.int64)]
+        # Forward pass: BFS level by level, counting shortest paths.
+        while True:
+            frontier = levels[-1]
+            slots = _gather(indptr, targets, frontier)
+            if len(slots) == 0:
+                break
+            parents = np.repeat(frontier, indptr[frontier + 1] - indptr[frontier])
+            children = targets[slots]
+            unseen = distance[children] < 0
+            next_level = np.unique(children[unseen])
+            if len(next_level) == 0:
+                break
+            distance[next_level] = distance[frontier[0]] + 1
+            on_shortest = distance[children] == distance[parents] + 1
+            np.add.at(sigma, children[on_shortest], sigma[parents[on_shortest]])
+            levels.append(next_level)
+        # Backward pass: accumulate dependencies from the deepest level up.
+        delta = np.zeros(num_nodes)
+        for frontier in reversed(levels[:-1]):
+            slots = _gather(indptr, targets, frontier)
+            parents = np.repeat(frontier, indptr[frontier + 1] - indptr[frontier])
+            children = targets[slots]
+            on_shortest = distance[children] == distance[parents] + 1
+            parents, children = parents[on_shortest], children[on_shortest]
+            np.add.at(delta, parents, sigma[parents] / sigma[children] * (1.0 + delta[children]))
+        delta[source] = 0.0
+        betweenness += delta
+
+    scale = num_nodes / len(sources)
+    return betweenness * scale / ((num_nodes - 1) * (num_nodes - 2))
+
+
+def spring_layout(num_nodes: int, src: np.ndarray, dst: np.ndarray, iterations: int = 50, seed: int = 42) -> np.ndarray:
+    """
+    Fruchterman-Reingold force-directed layout (the algorithm behind nx.spring_layout),
+    computed on dense NumPy arrays. Returns float64[n, 2] positions scaled to [-1, 1].
+    Meant for bounded neighbourhoods: memory grows with num_nodes squared.
+    """
+    if num_nodes == 0:
+        return np.empty((0, 2))
+    if num_nodes == 1:
+        return np.zeros((1, 2))
+    adjacency = np.zeros((num_nodes, num_nodes))
+    adjacency[src, dst] = 1.0
+    adjacency = np.maximum(adjacency, adjacency.T)
+
+    positions = np.random.default_rng(seed).random((num_nodes, 2))
+    k = np.sqrt(1.0 / num_nodes)
+    temperature = 0.1 * float(np.ptp(positions, axis=0).max())
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        delta = positions[:, None, :] - positions[None, :, :]
+        distance = np.maximum(np.linalg.norm(delta, axis=-1), 0.01)
+        # Repulsion between every pair, attraction along edges.
+        displacement = np.einsum("ijk,ij->ik", delta, k * k / distance ** 2 - adjacency * distance / k)
+        length = np.linalg.norm(displacement, axis=-1)
+        length = np.where(length < 0.01, 0.1, length)
+        step = displacement * (temperature / length)[:, None]
+        positions += step
+        temperature -= cooling
+        if np.linalg.norm(step) / num_nodes < 1.0e-4:
+            break
+
+    positions -= positions.mean(axis=0)
+    extent = np.abs(positions).max()
+    return positions / extent if extent > 0 else positions
+
+
+def load_transaction_graph(db: Session) -> TransactionGraph:
+    """
+    Builds the whole P2P transaction graph from the aggregated `graph_edges`
+    table, streamed in EDGE_FETCH_SIZE partitions.
+    """
+    statement = (
+        select(GraphEdge.from_user_id, GraphEdge.to_user_id, GraphEdge.total_amount, GraphEdge.tx_count, GraphEdge.last_seen)
+        .execution_options(yield_per=EDGE_FETCH_SIZE)
+    )
+    columns = [[], [], [], [], []]
+    for partition in db.execute(statement).partitions():
+        senders, receivers, totals, counts, last_seen = zip(*partition)
+        columns[0].append(np.array(senders, dtype=np.int64))
+        columns[1].append(np.array(receivers, dtype=np.int64))
+        columns[2].append(np.array(totals, dtype=np.float64))
+        columns[3].append(np.array(counts, dtype=np.int64))
+        columns[4].append(np.fromiter((ts.timestamp() if ts else 0 for ts in last_seen), dtype=np.int64, count=len(last_seen)))
+
+    if not columns[0]:
+        return TransactionGraph.from_edges([], [], [], [], [])
+    return TransactionGraph.from_edges(*(np.concatenate(column) for column in columns))
@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import dialect_insert
+from app.graph_engine import TransactionGraph, load_transaction_graph
+from app.models import GraphEdge
+
+# --- Materialized graph snapshot ---
+# `graph_edges` is the source of truth: it is updated in the same transaction that
+# inserts transactions. From it we periodically write a read-only snapshot of the
+# CSR arrays as .npy files. Celery workers memory-map the current snapshot, so a
+# graph job starts in milliseconds and all worker processes share the same pages.
+
+SNAPSHOT_DIR = Path(os.getenv("GRAPH_SNAPSHOT_DIR", Path(__file__).resolve().parents[2] / 'graph_snapshot'))
+MANIFEST_NAME = "current.json"
+SNAPSHOT_ARRAYS = ("node_ids", "indptr", "indices", "weights", "counts", "timestamps", "in_indptr", "in_indices")
+SNAPSHOT_LOAD_ATTEMPTS = 3
+
+# Per-process view of the snapshot, remapped whenever the manifest changes.
+_graph: Optional[TransactionGraph] = None
+_graph_version: Optional[str] = None
+
+
+def record_edges(db: Session, transactions: Iterable) -> None:
+    """
+    Folds transactions (anything with from_user_id, to_user_id, amount and timestamp)
+    into `graph_edges`. Does not commit; call it inside the inserting transaction.
+    """
+    deltas = {}
+    for tx in transactions:
+        if not tx.from_user_id or not tx.to_user_id or tx.from_user_id == tx.to_user_id:
+            continue
+        seen_at = tx.timestamp or datetime.now()
+        edge = deltas.get((tx.from_user_id, tx.to_user_id))
+        if edge is None:
+            deltas[(tx.from_user_id, tx.to_user_id)] = {"from_user_id": tx.from_user_id, "to_user_id": tx.to_user_id, "tx_count": 1, "total_amount": tx.amount, "first_seen": seen_at, "last_seen": seen_at}
+        else:
+            edge["tx_count"] += 1
+            edge["total_amount"] += tx.amount
+            edge["first_seen"] = min(edge["first_seen"], seen_at)
+            edge["last_seen"] = max(edge["last_seen"], seen_at)
+    if not deltas:
+        return
+
+    # Sorted so concurrent writers lock edge rows in the same order.
+    rows = [deltas[key] for key in sorted(deltas)]
+    least, greatest = (func.least, func.greatest) if db.get_bind().dialect.name == "postgresql" else (func.min, func.max)
+    statement = dialect_insert(db, GraphEdge).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[GraphEdge.from_user_id, GraphEdge.to_user_id],
+        set_={
+            "tx_count": GraphEdge.tx_count + statement.excluded.tx_count,
+            "total_amount": GraphEdge.total_amount + statement.excluded.total_amount,
+            "first_seen": least(GraphEdge.first_seen, statement.excluded.first_seen),
+            "last_seen": greatest(GraphEdge.last_seen, statement.excluded.last_seen),
+        },
+    )
+    db.execute(statement)
+
+
+def save_snapshot(graph: TransactionGraph, directory: Path = SNAPSHOT_DIR) -> str:
+    """
+    Writes the graph's arrays as a new snapshot version and atomically points the
+    manifest at it. The version it replaces is kept for processes that read the old
+    manifest a moment ago; older ones are removed. Processes that still map those keep
+    working because their pages stay valid until unmapped.
+    """
+    previous = read_manifest(directory)
+    version = str(time.time_ns())
+    version_dir = directory / version
+    version_dir.mkdir(parents=True, exist_ok=True)
+    for name in SNAPSHOT_ARRAYS:
+        np.save(version_dir / f"{name}.npy", np.ascontiguousarray(getattr(graph, name)))
+
+    manifest = {"version": version, "num_nodes": graph.num_nodes, "num_edges": graph.num_edges, "created_at": datetime.now().isoformat()}
+    partial_manifest = directory / f"{MANIFEST_NAME}.part"
+    partial_manifest.write_text(json.dumps(manifest))
+    os.replace(partial_manifest, directory / MANIFEST_NAME)
+
+    keep = {version, previous["version"] if previous else None}
+    for old_dir in directory.iterdir():
+        # Only version directories: other jobs keep their scratch space here (ring scans)
+        if old_dir.is_dir() and old_dir.name.isdigit() and old_dir.name not in keep:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    return version
+
+
+def read_manifest(directory: Path = SNAPSHOT_DIR) -> Optional[dict]:
+    try:
+        return json.loads((directory / MANIFEST_NAME).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def load_snapshot(directory: Path = SNAPSHOT_DIR) -> Optional[TransactionGraph]:
+    """
+    Memory-maps the current snapshot read-only. Returns None if there is none yet.
+    If the version named by the manifest was removed before it could be mapped (two
+    refreshes in quick succession), the manifest is read again.
+    """
+    global _graph, _graph_version
+    for attempt in range(SNAPSHOT_LOAD_ATTEMPTS):
+        manifest = read_manifest(directory)
+        if manifest is None:
+            return None
+        if manifest["version"] == _graph_version:
+            return _graph
+        version_dir = directory / manifest["version"]
+        try:
+            graph = TransactionGraph(**{name: np.load(version_dir / f"{name}.npy", mmap_mode='r') for name in SNAPSHOT_ARRAYS})
+        except FileNotFoundError:
+            if attempt + 1 == SNAPSHOT_LOAD_ATTEMPTS:
+                raise
+            continue
+        _graph, _graph_version = graph, manifest["version"]
+        print(f"Mapped graph snapshot {_graph_version} ({_graph.num_nodes} nodes, {_graph.num_edges} edges).")
+        return _graph
+
+
+def refresh_snapshot(db: Session, directory: Path = SNAPSHOT_DIR) -> dict:
+    """Rebuilds the snapshot from `graph_edges` and publishes it."""
+    started = time.perf_counter()
+    graph = load_transaction_graph(db)
+    version = save_snapshot(graph, directory)
+    return {"version": version, "num_nodes": graph.num_nodes, "num_edges": graph.num_edges, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def get_graph(db: Session) -> TransactionGraph:
+    """
+    The graph for analysis jobs: the mapped snapshot when one exists, otherwise
+    built straight from `graph_edges` (and published for the next job).
+    """
+    graph = load_snapshot()
+    if graph is not None:
+        return graph
+    refresh_snapshot(db)
+    return load_snapshot()
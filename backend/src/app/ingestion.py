@@ -1,7 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+import os
+import uuid
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, File, Form, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
-from app import database, models
-from app.tasks import process_uploaded_csv
+from app import database, models, data_processor, bulk_loader
+from app.tasks import process_uploaded_csv, analyze_ingested_batch
+
+# Upper bound on transactions per JSON batch; larger feeds should split or use the CSV upload.
+INGEST_MAX_BATCH = int(os.getenv("INGEST_MAX_BATCH", 10000))
+API_SOURCE = "api"
 
 router = APIRouter(
     prefix="/ingest",
@@ -14,25 +24,76 @@ def get_db():
         yield db
     finally:
         db.close()
+        database.publish_pool_metrics("api")
 
 @router.post("/upload-csv", status_code=202, response_model=dict)
-async def upload_transaction_csv(file: UploadFile = File(...)):
+async def upload_transaction_csv(file: UploadFile = File(...), source: str = Form(bulk_loader.DEFAULT_SOURCE)):
     """
-    Accepts a CSV file and starts a background job to process it.
+    Spools the uploaded CSV to the staging directory and starts a background
+    job that streams it into the database in chunks. Only the staged file's
+    path travels through the broker, never the file contents.
+    `source` names the originating system; rows whose Transaction_ID was
+    already ingested from the same source are skipped.
     """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Invalid file type.")
 
+    staged_path = None
     try:
-        file_content = await file.read()
-        file_content_str = file_content.decode('utf-8')
+        staged_path = await run_in_threadpool(data_processor.stage_upload, file.file, file.filename)
+        header = await run_in_threadpool(data_processor.read_csv_header, staged_path)
     except Exception as e:
+        if staged_path: data_processor.discard_staged_upload(staged_path)
         raise HTTPException(status_code=400, detail=f"Error reading file: {e}")
 
-    task = process_uploaded_csv.delay(file_content_str)
+    missing_columns = data_processor.REQUIRED_CSV_COLUMNS - set(header)
+    if missing_columns:
+        data_processor.discard_staged_upload(staged_path)
+        raise HTTPException(status_code=400, detail=f"CSV is missing required columns: {', '.join(sorted(missing_columns))}")
+
+    task = process_uploaded_csv.delay(str(staged_path), source)
     
     return {"message": "File upload successful. Processing has started in the background.", "job_id": task.id}
 
+class TransactionIn(BaseModel):
+    transaction_id: Optional[str] = None
+    from_account: str = Field(min_length=1)
+    to_account: str = Field(min_length=1)
+    amount: float = Field(gt=0)
+    currency: str = "INR"
+    description: str = "N/A"
+    timestamp: Optional[datetime] = None
+
+@router.post("/transactions", status_code=202, response_model=dict)
+def ingest_transactions(transactions: List[TransactionIn], source: str = API_SOURCE, db: Session = Depends(get_db)):
+    """
+    Writes a batch of transactions with the bulk loader (one COPY and one merge
+    statement on PostgreSQL) and queues a single rule/scoring task for the batch.
+    Accounts are created on first sight; transactions whose transaction_id was
+    already ingested from `source` are skipped, so retried batches are safe.
+    """
+    if not transactions:
+        raise HTTPException(status_code=400, detail="Empty batch.")
+    if len(transactions) > INGEST_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(transactions)} transactions, limit is {INGEST_MAX_BATCH}.")
+
+    rows = [
+        {
+            "Debit_Account": tx.from_account, "Credit_Account": tx.to_account, "Amount": tx.amount,
+            "Currency": tx.currency, "Description": tx.description, "Transaction_ID": tx.transaction_id,
+            "Date": tx.timestamp.isoformat() if tx.timestamp else None,
+        }
+        for tx in transactions
+    ]
+    batch_id = str(uuid.uuid4())
+    try:
+        inserted = bulk_loader.load_chunk(db, rows, {}, batch_id, source)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to ingest batch: {e}")
+
+    job_id = analyze_ingested_batch.delay(batch_id).id if inserted else None
+    return {"batch_id": batch_id, "received": len(rows), "inserted": inserted, "duplicates": len(rows) - inserted, "job_id": job_id}
+
 @router.post("/clear-all-data", status_code=200, response_model=dict)
 def clear_all_data_endpoint(db: Session = Depends(get_db)):
     """
@@ -42,7 +103,11 @@ def clear_all_data_endpoint(db: Session = Depends(get_db)):
         print("Received request to clear all data...")
         # The order is critical
         db.query(models.GraphAnalysisResult).delete()
+        db.query(models.SweepCheckpoint).delete()
         db.query(models.Alert).delete()
+        db.query(models.WatchlistMatch).delete()
+        db.query(models.UserRiskProfile).delete()
+        db.query(models.GraphEdge).delete()
         db.query(models.Transaction).delete()
         db.query(models.Watchlist).delete()
         db.query(models.User).delete()
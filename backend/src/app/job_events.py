@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Callable, Optional
+
+import redis
+import redis.asyncio as redis_async
+from fastapi.concurrency import run_in_threadpool
+
+from app.cache import REDIS_URL, get_redis
+
+# --- Job progress over Redis pub/sub ---
+# Tasks publish state transitions and progress counters on `job-events:<job_id>`
+# and keep the latest event under `job-state:<job_id>`, so a client that subscribes
+# late still starts from the current state. The API relays them to browsers as
+# Server-Sent Events. Without Redis, the stream falls back to polling server-side.
+
+JOB_STATE_TTL_SECONDS = int(os.getenv("JOB_STATE_TTL_SECONDS", 24 * 3600))
+JOB_EVENTS_KEEPALIVE_SECONDS = 15
+JOB_EVENTS_POLL_SECONDS = 1.0
+JOB_EVENTS_MAX_SECONDS = int(os.getenv("JOB_EVENTS_MAX_SECONDS", 3600)) # Clients reconnect after this
+TERMINAL_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+
+def channel(job_id: str) -> str:
+    return f"job-events:{job_id}"
+
+
+def state_key(job_id: str) -> str:
+    return f"job-state:{job_id}"
+
+
+def publish(job_id: str, status: str, **fields) -> None:
+    """Records and broadcasts a job event. Best effort: never fails the task that reports it."""
+    client = get_redis()
+    if client is None or not job_id:
+        return
+    event = json.dumps({"job_id": job_id, "status": status, "at": time.time(), **fields}, default=str)
+    try:
+        pipeline = client.pipeline()
+        pipeline.set(state_key(job_id), event, ex=JOB_STATE_TTL_SECONDS)
+        pipeline.publish(channel(job_id), event)
+        pipeline.execute()
+    except redis.RedisError as e:
+        print(f"Could not publish event for job {job_id}: {e}")
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['status'].lower()}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def _poll(job_id: str, current_state: Callable[[], dict]) -> AsyncIterator[str]:
+    last, started = None, time.monotonic()
+    while time.monotonic() - started < JOB_EVENTS_MAX_SECONDS:
+        event = dict(await run_in_threadpool(current_state), job_id=job_id)
+        if event != last:
+            yield format_sse(event)
+            last = event
+        if event["status"] in TERMINAL_STATES:
+            return
+        await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+
+
+async def _connect() -> Optional[redis_async.Redis]:
+    if get_redis() is None: # Shares the sync client's availability check and retry backoff
+        return None
+    client = redis_async.Redis.from_url(REDIS_URL, socket_connect_timeout=1)
+    try:
+        await client.ping()
+        return client
+    except redis.RedisError:
+        await client.aclose()
+        return None
+
+
+async def stream(job_id: str, current_state: Callable[[], dict]) -> AsyncIterator[str]:
+    """
+    SSE lines for `job_id`: its current state, then each published event, until the job
+    reaches a terminal state. `current_state()` gives the state when nothing was
+    published (older jobs, expired state) and drives the polling fallback.
+    """
+    client = await _connect()
+    if client is None:
+        async for message in _poll(job_id, current_state):
+            yield message
+        return
+
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(channel(job_id)) # Before reading the snapshot, so nothing falls in between
+        stored = await client.get(state_key(job_id))
+        event = json.loads(stored) if stored else dict(await run_in_threadpool(current_state), job_id=job_id)
+        yield format_sse(event)
+
+        started = time.monotonic()
+        while event["status"] not in TERMINAL_STATES and time.monotonic() - started < JOB_EVENTS_MAX_SECONDS:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=JOB_EVENTS_KEEPALIVE_SECONDS)
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            event = json.loads(message["data"])
+            yield format_sse(event)
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
@@ -0,0 +1,150 @@
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Tuple
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import screening
+from app.alert_summaries import template_summary
+from app.alerts import alert_key, upsert_alerts
+from app.models import Alert, SweepCheckpoint, User
+
+# --- KYC screening ---
+# A user is flagged for living in a high-risk country and/or resembling a watchlist
+# entry. Each flag carries a dedup key built from the criteria it met, so re-running
+# the check (or the whole sweep) never duplicates an alert, while a new criterion
+# (another country, another watchlist entry) still raises a fresh one.
+
+KYC_FLAG = "KYC_FLAG"
+HIGH_RISK_COUNTRIES = [country.strip() for country in os.getenv("HIGH_RISK_COUNTRIES", "Iran,North Korea,Syria,Yemen").split(",")]
+KYC_SWEEP = "kyc"
+KYC_SWEEP_CHUNK_SIZE = int(os.getenv("KYC_SWEEP_CHUNK_SIZE", 5000))
+# A running sweep holds a lease on its checkpoint, renewed with every chunk; a run
+# that stops renewing (dead worker) loses it after this long. Must exceed one chunk.
+KYC_SWEEP_LEASE_SECONDS = int(os.getenv("KYC_SWEEP_LEASE_SECONDS", 300))
+
+
+class SweepInProgress(Exception):
+    """Another run holds the sweep's lease."""
+
+
+def evaluate_users(index: screening.ScreeningIndex, users: Iterable[Tuple[int, str, str]]) -> Dict[int, Tuple[str, str]]:
+    """{user_id: (dedup_key, message)} for the (id, full_name, country) rows that meet a KYC criterion."""
+    findings = {}
+    for user_id, full_name, country in users:
+        reasons, criteria = [], []
+        if country in HIGH_RISK_COUNTRIES:
+            reasons.append(f"from high-risk country: {country}")
+            criteria.append(f"country={country}")
+        best = index.match(full_name, limit=1, min_score=screening.SCREENING_MATCH_THRESHOLD)
+        if best:
+            reasons.append(f"matches watchlist entry '{best[0]['name']}' (score {best[0]['score']:.2f})")
+            criteria.append(f"watchlist={best[0]['watchlist_id']}")
+        if reasons:
+            findings[user_id] = (alert_key(KYC_FLAG, user_id, "|".join(criteria)), "; ".join(reasons))
+    return findings
+
+
+def insert_alerts(db: Session, findings: Dict[int, Tuple[str, str]]) -> int:
+    """Inserts a KYC_FLAG alert per finding unless its dedup key exists. Returns the number inserted. Does not commit."""
+    # The template summary is replaced later by the batched enrichment job.
+    return len(upsert_alerts(db, [
+        Alert(user_id=user_id, alert_type=KYC_FLAG, message=message, ai_summary=template_summary(KYC_FLAG, message), status="OPEN", dedup_key=dedup_key)
+        for user_id, (dedup_key, message) in findings.items()
+    ]))
+
+
+def _lease_deadline() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=KYC_SWEEP_LEASE_SECONDS)
+
+
+def _renew_lease(db: Session, owner: str) -> None:
+    """Extends `owner`'s lease in the current transaction (locking the checkpoint row until commit)."""
+    renewed = db.execute(
+        update(SweepCheckpoint)
+        .where(SweepCheckpoint.name == KYC_SWEEP, SweepCheckpoint.lease_owner == owner)
+        .values(lease_expires_at=_lease_deadline())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not renewed:
+        raise SweepInProgress("KYC sweep lease was taken over by another run")
+
+
+def sweep(db: Session, job_id: str = None, restart: bool = False, report: Callable[[dict], None] = lambda progress: None) -> dict:
+    """
+    Checks every user in id order, KYC_SWEEP_CHUNK_SIZE at a time. Each chunk's alerts
+    and the checkpoint advance in one transaction, so a sweep interrupted by a worker
+    restart resumes after the last committed chunk instead of starting over.
+    Only the run holding the checkpoint's lease advances it: raises SweepInProgress
+    while another run (e.g. the same message redelivered by the broker) holds it.
+    """
+    # A redelivered message keeps its task id, so every run gets its own lease token
+    owner = f"{job_id}:{uuid.uuid4().hex}"
+    checkpoint = db.get(SweepCheckpoint, KYC_SWEEP)
+    if checkpoint is None:
+        db.add(SweepCheckpoint(name=KYC_SWEEP, status="COMPLETE"))
+        try:
+            db.commit()
+        except IntegrityError: # Created by a concurrent run
+            db.rollback()
+        checkpoint = db.get(SweepCheckpoint, KYC_SWEEP)
+    elif job_id and not restart and checkpoint.job_id == job_id and checkpoint.status == "COMPLETE":
+        return progress(checkpoint) # This message was already processed to the end
+
+    acquired = db.execute(
+        update(SweepCheckpoint)
+        .where(
+            SweepCheckpoint.name == KYC_SWEEP,
+            or_(SweepCheckpoint.lease_owner.is_(None), SweepCheckpoint.lease_expires_at < datetime.now(timezone.utc)),
+        )
+        .values(lease_owner=owner, lease_expires_at=_lease_deadline())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not acquired:
+        db.rollback()
+        raise SweepInProgress(f"KYC sweep is already running (job {checkpoint.job_id})")
+    db.refresh(checkpoint)
+
+    if restart or checkpoint.status != "RUNNING":
+        checkpoint.last_user_id, checkpoint.users_checked, checkpoint.alerts_created = 0, 0, 0
+        checkpoint.started_at, checkpoint.completed_at = datetime.now(timezone.utc), None
+    elif checkpoint.last_user_id:
+        print(f"Resuming KYC sweep after user {checkpoint.last_user_id} ({checkpoint.users_checked} users already checked).")
+    checkpoint.status, checkpoint.job_id = "RUNNING", job_id
+    db.commit()
+
+    index = screening.get_index(db)
+    while True:
+        _renew_lease(db, owner)
+        users = db.execute(
+            select(User.id, User.full_name, User.country)
+            .where(User.id > checkpoint.last_user_id)
+            .order_by(User.id)
+            .limit(KYC_SWEEP_CHUNK_SIZE)
+        ).all()
+        if not users:
+            break
+        checkpoint.alerts_created += insert_alerts(db, evaluate_users(index, users))
+        checkpoint.users_checked += len(users)
+        checkpoint.last_user_id = users[-1].id
+        db.commit()
+        report(progress(checkpoint))
+
+    checkpoint.status, checkpoint.completed_at = "COMPLETE", datetime.now(timezone.utc)
+    checkpoint.lease_owner, checkpoint.lease_expires_at = None, None
+    db.commit()
+    return progress(checkpoint)
+
+
+def progress(checkpoint: SweepCheckpoint) -> dict:
+    return {
+        "status": checkpoint.status,
+        "last_user_id": checkpoint.last_user_id,
+        "users_checked": checkpoint.users_checked,
+        "alerts_created": checkpoint.alerts_created,
+        "started_at": checkpoint.started_at.isoformat() if checkpoint.started_at else None,
+        "completed_at": checkpoint.completed_at.isoformat() if checkpoint.completed_at else None,
+    }
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+import google.generativeai as genai
+import httpx
+
+from app.cache import TieredCache
+
+# --- LLM access with a shared response cache ---
+# Many prompts repeat verbatim (the same KYC reason combinations, the same graph
+# findings, dossiers that haven't changed), so responses are cached under a hash of
+# the model name and the whitespace-normalized prompt. Only non-empty responses are
+# cached; failures are always retried on the next call.
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini") # "gemini", or "stub" for offline runs
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+# REST endpoint used by the async client; point it at a local fake server for testing.
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+LLM_MAX_RETRIES = 3
+
+# Upper bound on live model calls per process (cache hits are not counted).
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 60))
+LLM_BURST = int(os.getenv("LLM_BURST", 5))
+
+response_cache = TieredCache(
+    "llm-response",
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", 2048)),
+    ttl=int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600)),
+)
+
+
+class GeminiModel:
+    def __init__(self, model_name: str):
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        self.name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str) -> str:
+        response = self._model.generate_content(prompt)
+        return response.text.strip() if response.text else ""
+
+
+class StubModel:
+    """Deterministic offline stand-in: echoes a digest of the prompt instantly."""
+    name = "stub"
+
+    def generate(self, prompt: str) -> str:
+        return f"[stub response {hashlib.sha256(prompt.encode()).hexdigest()[:12]}] {normalize_prompt(prompt)[:200]}"
+
+
+class RateLimiter:
+    """Token bucket: allows bursts of `burst` calls, refilled at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.interval = 60.0 / rate_per_minute
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Takes a token and returns 0, or returns how long to wait for the next one."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) / self.interval)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) * self.interval
+
+    def acquire(self) -> None:
+        while (wait := self._take()) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        while (wait := self._take()) > 0:
+            await asyncio.sleep(wait)
+
+
+rate_limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_BURST)
+
+_model = None
+
+def get_model():
+    global _model
+    if _model is None:
+        _model = StubModel() if LLM_BACKEND == "stub" else GeminiModel(GEMINI_MODEL)
+    return _model
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split())
+
+
+def prompt_key(prompt: str, model_name: str) -> str:
+    return hashlib.sha256(f"{model_name}\n{normalize_prompt(prompt)}".encode()).hexdigest()
+
+
+def generate_text(prompt: str) -> str:
+    """
+    The model's response to `prompt`, from the cache when an equivalent prompt was
+    answered before. Returns "" when the model produced no text; raises on API errors.
+    """
+    model = get_model()
+    key = prompt_key(prompt, model.name)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+    rate_limiter.acquire()
+    text = model.generate(prompt)
+    if text:
+        response_cache.set(key, text)
+    return text
+
+
+# --- Async access, for fanning out many prompts from one worker slot ---
+class AsyncGeminiClient:
+    """Minimal async client for the Gemini generateContent REST endpoint."""
+
+    def __init__(self, model_name: str = GEMINI_MODEL, api_base: str = GEMINI_API_BASE):
+        self.name = model_name
+        self._url = f"{api_base.rstrip('/')}/v1beta/models/{model_name}:generateContent"
+        self._http = httpx.AsyncClient(timeout=LLM_TIMEOUT_SECONDS, params={"key": os.getenv("GEMINI_API_KEY", "")})
+
+    async def generate(self, prompt: str) -> str:
+        for attempt in range(LLM_MAX_RETRIES):
+            response = await self._http.post(self._url, json={"contents": [{"parts": [{"text": prompt}]}]})
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt + 1 < LLM_MAX_RETRIES:
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+            response.raise_for_status()
+            candidates = response.json().get("candidates") or []
+            parts = candidates[0].get("content", {}).get("parts", []) if candidates else []
+            return "".join(part.get("text", "") for part in parts).strip()
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+class AsyncStubModel(StubModel):
+    async def generate(self, prompt: str) -> str:
+        return StubModel.generate(self, prompt)
+
+    async def aclose(self) -> None:
+        pass
+
+
+def get_async_model():
+    """A new async model client; call aclose() when done with it."""
+    return AsyncStubModel() if LLM_BACKEND == "stub" else AsyncGeminiClient()
+
+
+async def generate_text_async(prompt: str, model, semaphore: asyncio.Semaphore, limiter: RateLimiter = rate_limiter) -> str:
+    """
+    Async counterpart of generate_text: same cache, at most `semaphore` calls in flight
+    and live calls drawn from `limiter` (default: the process-wide one). A token is
+    taken before a slot, so calls waiting on the rate limit don't hold slots. The
+    cache's Redis round trips run in a thread to keep the event loop free.
+    """
+    key = prompt_key(prompt, model.name)
+    cached = await asyncio.to_thread(response_cache.get, key)
+    if cached is not None:
+        return cached
+    await limiter.acquire_async()
+    async with semaphore:
+        text = await model.generate(prompt)
+    if text:
+        await asyncio.to_thread(response_cache.set, key, text)
+    return text
@@ -1,16 +1,26 @@
 from fastapi import FastAPI, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
-from app import models, database, ingestion, advisor
+import uuid
+from app import models, database, ingestion, advisor, graph_store, graph_analysis, llm, risk_profiles, pagination, export, job_events, rule_scheduler, screening, kyc
 from celery_worker import celery_app
 
 
 app = FastAPI(title="AI-Powered Regulatory Compliance Simulator")
 
+MAX_SWEEP_USERS = 1000
+EXTERNAL_USER_EMAIL = "external@system.com"
+
 app.include_router(ingestion.router)
+app.include_router(export.router)
 
 # Middleware for CORS
 origins = ["http://localhost:3000", "http://localhost:5173"]
@@ -21,6 +31,7 @@ app.add_middleware(
     allow_methods=["*"], 
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # --- Pydantic Schemas (Correctly Formatted) ---
 class TransactionCreate(BaseModel):
@@ -33,9 +44,15 @@ class TransactionSchema(BaseModel):
     currency: str
     timestamp: datetime
     description: str
+    from_user_id: Optional[int] = None
+    to_user_id: Optional[int] = None
     class Config:
         from_attributes = True
 
+class TransactionPageSchema(BaseModel):
+    items: List[TransactionSchema]
+    next_cursor: Optional[str] = None
+
 class UserSchema(BaseModel):
     id: int
     full_name: str
@@ -45,6 +62,40 @@ class UserSchema(BaseModel):
     class Config:
         from_attributes = True
 
+class UserListSchema(UserSchema):
+    risk_score: float = 0.0
+    total_alerts: int = 0
+    open_alerts: int = 0
+
+class UserPageSchema(BaseModel):
+    items: List[UserListSchema]
+    next_cursor: Optional[str] = None
+    total_estimate: Optional[int] = None
+
+class RiskProfileSchema(BaseModel):
+    user_id: int
+    total_alerts: int
+    open_alerts: int
+    kyc_flag_alerts: int
+    structuring_payment_alerts: int
+    structuring_deposit_alerts: int
+    ml_anomaly_alerts: int
+    graph_cycle_alerts: int
+    graph_layering_alerts: int
+    last_alert_at: Optional[datetime] = None
+    tx_in_count: int
+    tx_in_amount: float
+    tx_out_count: int
+    tx_out_amount: float
+    last_tx_at: Optional[datetime] = None
+    window_tx_count: int
+    window_in_amount: float
+    window_out_amount: float
+    risk_score: float
+    updated_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
 class AlertSchema(BaseModel):
     id: int
     alert_type: str
@@ -55,11 +106,21 @@ class AlertSchema(BaseModel):
     class Config:
         from_attributes = True
 
-class UserDetailSchema(UserSchema):
-    transactions: List[TransactionSchema] = []
+class WatchlistMatchSchema(BaseModel):
+    watchlist_id: int
+    matched_name: str
+    score: float
+    screened_at: Optional[datetime] = None
     class Config:
         from_attributes = True
 
+class AdvisorSweepRequest(BaseModel):
+    action: str
+    user_ids: List[int]
+
+class UserDetailSchema(UserSchema):
+    risk_profile: Optional[RiskProfileSchema] = None
+
 # --- Dependency ---
 def get_db():
     db = database.SessionLocal()
@@ -67,49 +128,215 @@ def get_db():
         yield db
     finally: 
         db.close()
+        database.publish_pool_metrics("api")
+
+# For the hot read endpoints: async def handlers on the async engine, so a request
+# waiting on Postgres doesn't hold one of the threadpool's threads.
+async def get_async_db():
+    async with database.AsyncSessionLocal() as db:
+        yield db
 
 # --- API Endpoints ---
 @app.get("/api/v1/health")
 def health_check(): 
     return {"status": "ok"}
 
-@app.get("/api/v1/users", response_model=List[UserSchema])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.User).order_by(models.User.id).offset(skip).limit(limit).all()
+def _user_list_rows(query):
+    """Users joined to their risk profiles, flattened for UserListSchema."""
+    rows = []
+    for user, profile in query:
+        row = UserSchema.model_validate(user).model_dump()
+        if profile is not None:
+            row.update(risk_score=profile.risk_score, total_alerts=profile.total_alerts, open_alerts=profile.open_alerts)
+        rows.append(row)
+    return rows
+
+# Sort keys for the user listing: (sort column, id column, descending). Each one is
+# backed by a composite index, so keyset pages never scan past earlier pages.
+USER_SORTS = {
+    "id": (models.User.id, models.User.id, False),
+    "risk": (models.UserRiskProfile.risk_score, models.UserRiskProfile.user_id, True),
+    "alerts": (models.UserRiskProfile.total_alerts, models.UserRiskProfile.user_id, True),
+}
+
+@app.get("/api/v1/users", response_model=UserPageSchema)
+async def read_users(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    country: Optional[str] = None,
+    has_open_alerts: bool = False,
+    q: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    One page of users, with an opaque `next_cursor` for the following page. `sort=risk`
+    and `sort=alerts` list users by their risk profile (highest first) and so skip
+    users with no recorded activity. `q` is a case-insensitive name prefix.
+    """
+    if sort not in USER_SORTS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort '{sort}'. Expected one of: {', '.join(USER_SORTS)}.")
+    limit = max(1, min(limit, pagination.MAX_PAGE_SIZE))
+    sort_column, id_column, descending = USER_SORTS[sort]
+
+    profile_join = models.UserRiskProfile.user_id == models.User.id
+    query = select(models.User, models.UserRiskProfile)
+    query = query.outerjoin(models.UserRiskProfile, profile_join) if sort == "id" and not has_open_alerts else query.join(models.UserRiskProfile, profile_join)
+    if country:
+        query = query.where(models.User.country == country)
+    if has_open_alerts:
+        query = query.where(models.UserRiskProfile.open_alerts > 0)
+    if q:
+        query = query.where(func.lower(models.User.full_name).startswith(q.lower(), autoescape=True))
+    total_estimate = await pagination.estimate_count_async(db, query)
+
+    position = pagination.decode_cursor(cursor, sort)
+    if position is not None:
+        keyset, last = tuple_(sort_column, id_column), tuple_(*position)
+        query = query.where(keyset < last if descending else keyset > last)
+    order = (sort_column.desc(), id_column.desc()) if descending else (sort_column, id_column)
+    rows = (await db.execute(query.order_by(*order).limit(limit + 1))).all()
+
+    items = _user_list_rows(rows[:limit])
+    next_cursor = None
+    if len(rows) > limit:
+        user, profile = rows[limit - 1]
+        last_key = user.id if sort == "id" else getattr(profile, sort_column.key)
+        next_cursor = pagination.encode_cursor(sort, [last_key, user.id])
+    return {"items": items, "next_cursor": next_cursor, "total_estimate": total_estimate}
+
+@app.get("/api/v1/risk/top", response_model=List[UserListSchema])
+def read_top_risk_users(limit: int = 50, db: Session = Depends(get_db)):
+    """Highest-risk users first, straight off the risk_score index."""
+    query = db.query(models.User, models.UserRiskProfile).join(models.UserRiskProfile, models.UserRiskProfile.user_id == models.User.id)
+    return _user_list_rows(query.order_by(models.UserRiskProfile.risk_score.desc(), models.UserRiskProfile.user_id.desc()).limit(min(limit, pagination.MAX_PAGE_SIZE)))
 
 @app.get("/api/v1/users/{user_id}", response_model=UserDetailSchema)
-def read_user_details(user_id: int, db: Session = Depends(get_db)):
+async def read_user_details(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    """The user with their precomputed aggregates: one primary-key join, however old the account."""
+    row = (await db.execute(
+        select(models.User, models.UserRiskProfile)
+        .outerjoin(models.UserRiskProfile, models.UserRiskProfile.user_id == models.User.id)
+        .where(models.User.id == user_id)
+    )).first()
+    if not row: raise HTTPException(status_code=404, detail="User not found")
+    user, profile = row
+    return UserDetailSchema(**UserSchema.model_validate(user).model_dump(), risk_profile=profile)
+
+@app.get("/api/v1/users/{user_id}/risk-profile", response_model=RiskProfileSchema)
+def read_user_risk_profile(user_id: int, db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user: raise HTTPException(status_code=404, detail="User not found")
-    return user
+    profile = db.get(models.UserRiskProfile, user_id)
+    return profile or RiskProfileSchema(user_id=user_id, **{column: 0 for column in risk_profiles.COUNTER_COLUMNS}, risk_score=0.0)
+
+TRANSACTION_DIRECTIONS = {
+    "in": [models.Transaction.to_user_id],
+    "out": [models.Transaction.from_user_id],
+    "both": [models.Transaction.to_user_id, models.Transaction.from_user_id],
+}
 
-@app.get("/api/v1/users/{user_id}/transactions", response_model=List[TransactionSchema])
-def read_user_transactions(user_id: int, db: Session = Depends(get_db)):
+@app.get("/api/v1/users/{user_id}/transactions", response_model=TransactionPageSchema)
+def read_user_transactions(
+    user_id: int,
+    direction: str = "in",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    The user's transactions, newest first, one page at a time. `direction` is "in",
+    "out" or "both"; `since`/`until` bound the event time. Each direction is read in
+    (party, timestamp, id) index order, and "both" merges the two ordered reads.
+    """
+    if direction not in TRANSACTION_DIRECTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown direction '{direction}'. Expected one of: {', '.join(TRANSACTION_DIRECTIONS)}.")
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user: raise HTTPException(status_code=404, detail="User not found")
-    return db.query(models.Transaction).filter(models.Transaction.to_user_id == user_id).order_by(models.Transaction.timestamp.desc()).all()
+    limit = max(1, min(limit, pagination.MAX_PAGE_SIZE))
+    sort = f"timestamp-{direction}"
+    position = pagination.decode_cursor(cursor, sort)
+
+    tx = models.Transaction
+    keyset = tuple_(tx.timestamp, tx.id)
+    rows = {}
+    for party_column in TRANSACTION_DIRECTIONS[direction]:
+        query = db.query(tx).filter(party_column == user_id)
+        if since is not None:
+            query = query.filter(tx.timestamp >= since)
+        if until is not None:
+            query = query.filter(tx.timestamp < until)
+        if position is not None:
+            query = query.filter(keyset < tuple_(datetime.fromisoformat(position[0]), position[1]))
+        rows.update((row.id, row) for row in query.order_by(tx.timestamp.desc(), tx.id.desc()).limit(limit + 1))
+
+    page = sorted(rows.values(), key=lambda row: (row.timestamp, row.id), reverse=True)[:limit + 1]
+    next_cursor = None
+    if len(page) > limit:
+        last = page[limit - 1]
+        next_cursor = pagination.encode_cursor(sort, [last.timestamp.isoformat(), last.id])
+    return {"items": page[:limit], "next_cursor": next_cursor}
 
 @app.get("/api/v1/users/{user_id}/alerts", response_model=List[AlertSchema])
-def get_user_alerts_endpoint(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user: raise HTTPException(status_code=404, detail=f"User {user_id} not found.")
-    return db.query(models.Alert).filter(models.Alert.user_id == user_id).order_by(models.Alert.created_at.desc()).all()
+async def get_user_alerts_endpoint(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    user_exists = await db.scalar(select(models.User.id).where(models.User.id == user_id))
+    if user_exists is None: raise HTTPException(status_code=404, detail=f"User {user_id} not found.")
+    return (await db.scalars(select(models.Alert).where(models.Alert.user_id == user_id).order_by(models.Alert.created_at.desc()))).all()
 
 @app.post("/api/v1/users/{user_id}/transactions", status_code=201, response_model=TransactionSchema)
 def create_transaction_for_user_endpoint(user_id: int, transaction: TransactionCreate, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user: raise HTTPException(status_code=404, detail="User not found")
-    external_user = db.query(models.User).filter(models.User.email == "external@system.com").first()
-    if not external_user: raise HTTPException(status_code=500, detail="External System user not found. Please run the seeder.")
-    db_transaction = models.Transaction(amount=transaction.amount, description=transaction.description, to_user_id=user_id, from_user_id=external_user.id)
+    # The account and the external counterparty, in one round trip
+    found = dict(db.query(models.User.email, models.User.id).filter(or_(models.User.id == user_id, models.User.email == EXTERNAL_USER_EMAIL)).all())
+    if user_id not in found.values(): raise HTTPException(status_code=404, detail="User not found")
+    external_user_id = found.get(EXTERNAL_USER_EMAIL)
+    if not external_user_id: raise HTTPException(status_code=500, detail="External System user not found. Please run the seeder.")
+    batch_id = str(uuid.uuid4())
+    db_transaction = models.Transaction(amount=transaction.amount, description=transaction.description, to_user_id=user_id, from_user_id=external_user_id, source="manual", ingestion_batch_id=batch_id)
     db.add(db_transaction)
+    db.flush()
+    graph_store.record_edges(db, [db_transaction])
+    risk_profiles.record_transactions(db, [db_transaction])
     db.commit()
     db.refresh(db_transaction)
-    celery_app.send_task("app.tasks.analyze_transaction_patterns", args=[user_id])
-    celery_app.send_task("app.tasks.score_transaction_anomaly", args=[db_transaction.id])
+    # Rules are coalesced per user by the periodic dirty-user drain; only the scoring
+    # of this transaction runs now. Without Redis, fall back to the full batch pass.
+    if rule_scheduler.mark_dirty([user_id]):
+        celery_app.send_task("app.tasks.score_transaction_anomaly", args=[db_transaction.id])
+    else:
+        celery_app.send_task("app.tasks.analyze_ingested_batch", args=[batch_id])
     return db_transaction
 
 # --- ON-DEMAND & ADVISOR ENDPOINTS ---
+@app.get("/api/v1/users/{user_id}/watchlist-matches", response_model=List[WatchlistMatchSchema])
+def get_user_watchlist_matches(user_id: int, db: Session = Depends(get_db)):
+    """Watchlist entries resembling the user's name, as of the last screening run."""
+    return db.query(models.WatchlistMatch).filter(models.WatchlistMatch.user_id == user_id).order_by(models.WatchlistMatch.score.desc()).all()
+
+@app.get("/api/v1/screening/search", response_model=List[dict])
+def screen_name_endpoint(name: str, limit: int = screening.SCREENING_MAX_MATCHES, db: Session = Depends(get_db)):
+    """Screens an arbitrary name against the watchlist index, e.g. before onboarding a customer."""
+    return screening.get_index(db).match(name, limit=min(limit, 50))
+
+@app.post("/api/v1/screening/run", status_code=202, response_model=dict)
+def trigger_screening_endpoint():
+    """Rescreens every user against the watchlist, e.g. after a sanctions list update."""
+    task = celery_app.send_task("app.tasks.screen_all_users")
+    return {"job_id": task.id}
+
+@app.post("/api/v1/kyc/sweep", status_code=202, response_model=dict)
+def trigger_kyc_sweep_endpoint(restart: bool = False):
+    """Rechecks every user's KYC criteria in one job; resumes an interrupted sweep unless `restart`."""
+    task = celery_app.send_task("app.tasks.kyc_sweep", args=[restart])
+    return {"job_id": task.id}
+
+@app.get("/api/v1/kyc/sweep", response_model=dict)
+def get_kyc_sweep_status(db: Session = Depends(get_db)):
+    checkpoint = db.get(models.SweepCheckpoint, kyc.KYC_SWEEP)
+    if not checkpoint: raise HTTPException(status_code=404, detail="No KYC sweep has run yet.")
+    return dict(kyc.progress(checkpoint), job_id=checkpoint.job_id)
+
 @app.post("/api/v1/users/{user_id}/run-kyc-check", status_code=202, response_model=dict)
 def trigger_kyc_check_endpoint(user_id: int):
     task = celery_app.send_task("app.tasks.run_kyc_check", args=[user_id])
@@ -130,28 +357,42 @@ def trigger_generate_sar_endpoint(user_id: int):
     task = celery_app.send_task("app.tasks.generate_sar_task", args=[user_id])
     return {"job_id": task.id}
 
-@app.get("/api/v1/results/{job_id}", response_model=dict)
-def get_task_result(job_id: str, db: Session = Depends(get_db)):
-    # 1. Try GraphAnalysisResult first
-    graph_result = db.query(models.GraphAnalysisResult).filter(models.GraphAnalysisResult.job_id == job_id).first()
-    if graph_result:
-        if graph_result.status not in ["COMPLETED", "FAILED"]:
-            return {"status": graph_result.status}
-        return {
-            "status": "SUCCESS",
-            "result_type": "graph",
-            "result": {
-                "plot_data": graph_result.plot_data,
-                "ai_explanation": graph_result.ai_explanation,
-            }
+@app.post("/api/v1/advisor/sweep", status_code=202, response_model=dict)
+def trigger_advisor_sweep_endpoint(sweep: AdvisorSweepRequest):
+    """
+    Queues one advisor action for many users as a single async job. Each user gets
+    their own job ID, whose result is served by /api/v1/results/{job_id}.
+    """
+    if sweep.action not in advisor.ADVISOR_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown advisor action '{sweep.action}'.")
+    if not sweep.user_ids or len(sweep.user_ids) > MAX_SWEEP_USERS:
+        raise HTTPException(status_code=400, detail=f"Provide between 1 and {MAX_SWEEP_USERS} user IDs.")
+    jobs = {str(uuid.uuid4()): user_id for user_id in dict.fromkeys(sweep.user_ids)}
+    task = celery_app.send_task("app.tasks.advisor_sweep", args=[sweep.action, jobs])
+    return {"sweep_job_id": task.id, "jobs": [{"user_id": user_id, "job_id": job_id} for job_id, user_id in jobs.items()]}
+
+def _graph_job_state(graph_result: models.GraphAnalysisResult) -> dict:
+    if graph_result.status not in ["COMPLETED", "FAILED"]:
+        return {"status": graph_result.status}
+    return {
+        "status": "SUCCESS",
+        "result_type": "graph",
+        "result": {
+            "plot_data": graph_result.plot_data,
+            "ai_explanation": graph_result.ai_explanation,
         }
+    }
 
-    # 2. Fallback: Check Celery result backend
+def _celery_job_state(job_id: str) -> dict:
+    # Blocking result-backend lookup; async callers run it in the threadpool
     task_result = celery_app.AsyncResult(job_id)
 
     if task_result.status == "PENDING":
         return {"status": "PENDING", "result_type": "generic"}
 
+    if task_result.status == "PROGRESS":
+        return {"status": "PROGRESS", "result_type": "generic", "progress": task_result.info}
+
     if task_result.ready():
         return {
             "status": task_result.state,
@@ -160,3 +401,57 @@ def get_task_result(job_id: str, db: Session = Depends(get_db)):
         }
 
     return {"status": "UNKNOWN", "result_type": "generic"}
+
+def _job_state(job_id: str, db: Session) -> dict:
+    """Sync twin of get_task_result(), for callers already off the event loop."""
+    graph_result = db.query(models.GraphAnalysisResult).filter(models.GraphAnalysisResult.job_id == job_id).first()
+    return _graph_job_state(graph_result) if graph_result else _celery_job_state(job_id)
+
+@app.get("/api/v1/results/{job_id}", response_model=dict)
+async def get_task_result(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    # 1. Try GraphAnalysisResult first
+    graph_result = await db.scalar(select(models.GraphAnalysisResult).where(models.GraphAnalysisResult.job_id == job_id).limit(1))
+    if graph_result:
+        return _graph_job_state(graph_result)
+
+    # 2. Fallback: Check Celery result backend
+    return await run_in_threadpool(_celery_job_state, job_id)
+
+@app.get("/api/v1/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Server-Sent Events for a job: state transitions and progress counters as the
+    task publishes them, ending at SUCCESS/FAILURE. Fetch the result itself from
+    /api/v1/results/{job_id} once the stream ends.
+    """
+    def current_state():
+        db = database.SessionLocal()
+        try:
+            state = _job_state(job_id, db)
+        finally:
+            db.close()
+        return {key: value for key, value in state.items() if key != "result"}
+
+    return StreamingResponse(
+        job_events.stream(job_id, current_state),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/v1/metrics/rules", response_model=dict)
+def get_rule_scheduler_metrics():
+    """How many rule evaluations live transactions requested vs. how many the coalescing drain actually ran."""
+    return rule_scheduler.metrics()
+
+@app.get("/api/v1/metrics/db", response_model=dict)
+def get_db_pool_metrics():
+    """Connection pool usage of this API process and of every process that reported recently."""
+    return {"this_process": database.pool_metrics(), "processes": database.cluster_pool_metrics()}
+
+@app.get("/api/v1/metrics/cache", response_model=dict)
+def get_cache_metrics():
+    """Hit/miss counters for the LLM response cache and the graph layout cache."""
+    return {
+        "llm_responses": llm.response_cache.metrics(),
+        "graph_layouts": graph_analysis.layout_cache.metrics(),
+    }
@@ -1,3 +1,4 @@
+import os
 import joblib
 import numpy as np
 from tensorflow.keras.models import load_model
@@ -16,6 +17,11 @@ ISO_FOREST = None
 AUTOENCODER = None
 MODELS_LOADED = False
 
+# Number of amounts pushed through the models per call when scoring in bulk.
+SCORING_BATCH_SIZE = int(os.getenv("SCORING_BATCH_SIZE", "8192"))
+ISO_FOREST_THRESHOLD = -0.05
+AUTOENCODER_THRESHOLD = 0.2
+
 def load_models_lazily():
     """
     Loads all ML models into global variables if they haven't been loaded yet.
@@ -54,34 +60,49 @@ def load_models_lazily():
         return False
 
 
-def score_transaction(amount: float) -> dict:
+def score_transactions(amounts: np.ndarray, batch_size: int = SCORING_BATCH_SIZE) -> dict:
     """
-    Scores a single transaction amount for its anomalousness.
+    Scores an array of transaction amounts in batches of `batch_size`.
+    Returns columnar results: a dict of NumPy arrays aligned with `amounts`.
     """
-    # First, ensure the models are loaded. This will only run the loading logic once.
+    amounts = np.asarray(amounts, dtype=np.float64).reshape(-1)
+    iso_scores = np.zeros(len(amounts))
+    reconstruction_errors = np.zeros(len(amounts))
+
+    # If models failed to load for any reason, every transaction is non-anomalous.
     if not load_models_lazily():
-        # If models failed to load for any reason, return a non-anomalous result.
-        return {"anomaly": False, "iso_forest_score": 0, "autoencoder_error": 0}
+        return {"anomaly": np.zeros(len(amounts), dtype=bool), "iso_forest_score": iso_scores, "autoencoder_error": reconstruction_errors}
 
-    # Prepare the feature vector for prediction
-    # It must be a 2D array, so we wrap the single amount in two sets of square brackets.
-    features = np.array([[amount]])
-    scaled_features = SCALER.transform(features)
+    for start in range(0, len(amounts), batch_size):
+        end = start + batch_size
+        # The models expect a 2D (n_samples, 1) feature matrix.
+        scaled_features = SCALER.transform(amounts[start:end].reshape(-1, 1))
 
-    # 1. Get score from the Isolation Forest model
-    # It returns a score where negative values are more anomalous.
-    iso_score = ISO_FOREST.decision_function(scaled_features)[0]
-    
-    # 2. Get reconstruction error from the Autoencoder model
-    reconstruction = AUTOENCODER.predict(scaled_features, verbose=0)
-    reconstruction_error = np.mean(np.square(scaled_features - reconstruction))
+        # 1. Isolation Forest: negative values are more anomalous.
+        iso_scores[start:end] = ISO_FOREST.decision_function(scaled_features)
+
+        # 2. Autoencoder reconstruction error, one Keras call per batch instead of per row.
+        reconstruction = AUTOENCODER.predict(scaled_features, batch_size=batch_size, verbose=0)
+        reconstruction_errors[start:end] = np.mean(np.square(scaled_features - reconstruction), axis=1)
 
-    # 3. Apply business logic to determine if it's an anomaly
+    # 3. Apply business logic to determine which ones are anomalies.
     # These thresholds are a key part of "tuning" the model.
-    is_anomaly = iso_score < -0.05 or reconstruction_error > 0.2
+    is_anomaly = (iso_scores < ISO_FOREST_THRESHOLD) | (reconstruction_errors > AUTOENCODER_THRESHOLD)
 
     return {
         "anomaly": is_anomaly,
-        "iso_forest_score": float(iso_score),
-        "autoencoder_error": float(reconstruction_error)
-    }
\ No newline at end of file
+        "iso_forest_score": iso_scores,
+        "autoencoder_error": reconstruction_errors
+    }
+
+
+def score_transaction(amount: float) -> dict:
+    """
+    Scores a single transaction amount for its anomalousness.
+    """
+    scores = score_transactions(np.array([amount]))
+    return {
+        "anomaly": bool(scores["anomaly"][0]),
+        "iso_forest_score": float(scores["iso_forest_score"][0]),
+        "autoencoder_error": float(scores["autoencoder_error"][0])
+    }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSONB
@@ -6,6 +6,12 @@ from app.database import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset pages filtered by country, in id order
+        Index("ix_users_country_id", "country", "id"),
+        # Case-insensitive name-prefix search (LIKE 'abc%' needs pattern ops outside the C locale)
+        Index("ix_users_full_name_lower", func.lower(text("full_name")).label("full_name_lower"), postgresql_ops={"full_name_lower": "text_pattern_ops"}),
+    )
     id = Column(Integer, primary_key=True)
     full_name = Column(String, index=True) # Index for searching by name
     email = Column(String, unique=True, index=True) # Unique and indexed for fast lookups
@@ -22,28 +28,98 @@ class User(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Makes re-uploads and retried ingestion jobs idempotent. Rows without an
+        # external ID (NULL) never conflict with each other.
+        Index("uq_transactions_source_external_id", "source", "external_id", unique=True),
+        # Per-user history in event-time order, one index per direction. They also
+        # serve plain lookups by either party, so those columns need no index of their own.
+        Index("ix_transactions_to_user_id_timestamp_id", "to_user_id", "timestamp", "id"),
+        Index("ix_transactions_from_user_id_timestamp_id", "from_user_id", "timestamp", "id"),
+    )
     id = Column(Integer, primary_key=True)
     amount = Column(Float, nullable=False)
     currency = Column(String, default="INR")
+    # When the transaction happened, taken from the source data where available.
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True) # Index for time-based queries
+    ingested_at = Column(DateTime(timezone=True), server_default=func.now())
     description = Column(String)
+
+    # Where the row came from and its ID in that system (e.g. a bank export's Transaction_ID)
+    source = Column(String, nullable=True)
+    external_id = Column(String, nullable=True)
     
-    # Both foreign keys are now indexed for performance
-    to_user_id = Column(Integer, ForeignKey("users.id"), index=True) 
-    from_user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    # Both foreign keys are indexed through the composite indexes above
+    to_user_id = Column(Integer, ForeignKey("users.id")) 
+    from_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    # Identifies the upload/ingestion run that created the row, so post-ingest
+    # analysis only touches that run's rows. Indexed for exactly that lookup.
+    ingestion_batch_id = Column(String, nullable=True, index=True)
 
     # We tell each relationship which foreign key it corresponds to
     to_user = relationship("User", foreign_keys=[to_user_id], back_populates="transactions")
     from_user = relationship("User", foreign_keys=[from_user_id])
 
+class GraphEdge(Base):
+    """
+    One row per (sender, receiver) pair, aggregating all transactions between them.
+    Maintained incrementally as ingestion batches commit; the graph snapshot is built from it.
+    """
+    __tablename__ = "graph_edges"
+    from_user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    to_user_id = Column(Integer, ForeignKey("users.id"), primary_key=True, index=True)
+    tx_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Float, nullable=False, default=0.0)
+    first_seen = Column(DateTime(timezone=True))
+    last_seen = Column(DateTime(timezone=True))
+
+class UserRiskProfile(Base):
+    """
+    One precomputed row per user: alert counts, transaction volumes, rolling-window
+    aggregates and a composite risk score. Counters are updated incrementally as
+    alerts and transactions are inserted (see risk_profiles); the rolling window is
+    re-aggregated periodically.
+    """
+    __tablename__ = "user_risk_profiles"
+    __table_args__ = (
+        # Keyset indexes for the risk- and alert-ordered user listings
+        Index("ix_user_risk_profiles_risk_score_user_id", "risk_score", "user_id"),
+        Index("ix_user_risk_profiles_total_alerts_user_id", "total_alerts", "user_id"),
+    )
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_alerts = Column(Integer, nullable=False, server_default=text("0"))
+    open_alerts = Column(Integer, nullable=False, server_default=text("0"))
+    kyc_flag_alerts = Column(Integer, nullable=False, server_default=text("0"))
+    structuring_payment_alerts = Column(Integer, nullable=False, server_default=text("0"))
+    structuring_deposit_alerts = Column(Integer, nullable=False, server_default=text("0"))
+    ml_anomaly_alerts = Column(Integer, nullable=False, server_default=text("0"))
+    graph_cycle_alerts = Column(Integer, nullable=False, server_default=text("0"))
+    graph_layering_alerts = Column(Integer, nullable=False, server_default=text("0"))
+    last_alert_at = Column(DateTime(timezone=True))
+    tx_in_count = Column(Integer, nullable=False, server_default=text("0"))
+    tx_in_amount = Column(Float, nullable=False, server_default=text("0"))
+    tx_out_count = Column(Integer, nullable=False, server_default=text("0"))
+    tx_out_amount = Column(Float, nullable=False, server_default=text("0"))
+    last_tx_at = Column(DateTime(timezone=True))
+    # Activity within the last RISK_WINDOW_DAYS (by transaction event time)
+    window_tx_count = Column(Integer, nullable=False, server_default=text("0"))
+    window_in_amount = Column(Float, nullable=False, server_default=text("0"))
+    window_out_amount = Column(Float, nullable=False, server_default=text("0"))
+    risk_score = Column(Float, nullable=False, server_default=text("0"))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class Alert(Base):
     __tablename__ = "alerts"
     id = Column(Integer, primary_key=True)
     alert_type = Column(String, index=True) # Index for filtering by alert type
     message = Column(String)
     ai_summary = Column(String, nullable=True)
+    summary_status = Column(String, default="PENDING", index=True) # PENDING -> CLAIMED -> ENRICHED/SKIPPED, see alert_summaries
+    summary_claimed_at = Column(DateTime(timezone=True), nullable=True) # When an enrichment run claimed the alert
     status = Column(String, default="OPEN", index=True) # Index for finding open alerts
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    dedup_key = Column(String, unique=True, nullable=True) # Type, user and finding fingerprint; the ON CONFLICT target of alerts.upsert_alerts
     
     # Foreign key is indexed for performance
     user_id = Column(Integer, ForeignKey("users.id"), index=True)
@@ -55,6 +131,35 @@ class Watchlist(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, index=True) # Index for fast name lookups
     reason = Column(String)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True) # Drives incremental screening index refreshes
+
+class WatchlistMatch(Base):
+    """Latest screening result: each watchlist entry a user's name resembles, with its score."""
+    __tablename__ = "watchlist_matches"
+    __table_args__ = (
+        Index("ix_watchlist_matches_user_id_watchlist_id", "user_id", "watchlist_id", unique=True),
+    )
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    watchlist_id = Column(Integer, ForeignKey("watchlist.id", ondelete="CASCADE"), nullable=False, index=True)
+    matched_name = Column(String)
+    score = Column(Float, nullable=False)
+    screened_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class SweepCheckpoint(Base):
+    """Progress of a long-running sweep over all users, so it can resume after a worker restart."""
+    __tablename__ = "sweep_checkpoints"
+    name = Column(String, primary_key=True)
+    status = Column(String, nullable=False, default="RUNNING") # RUNNING -> COMPLETE
+    job_id = Column(String, nullable=True)
+    # The run currently advancing the checkpoint and until when its claim holds, see kyc.sweep
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    last_user_id = Column(Integer, nullable=False, default=0) # Keyset position: every user up to here is done
+    users_checked = Column(Integer, nullable=False, default=0)
+    alerts_created = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
 
 class GraphAnalysisResult(Base):
     __tablename__ = "graph_analysis_results"
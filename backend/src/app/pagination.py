@@ -0,0 +1,65 @@
+import base64
+import json
+from typing import Any, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql import Select
+
+# --- Keyset pagination helpers ---
+# List endpoints page with "WHERE (sort_key, id) < (last_sort_key, last_id)" against
+# a matching composite index instead of OFFSET, so every page costs the same no
+# matter how deep it is. The position travels to the client as an opaque cursor.
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort: str, key: List[Any]) -> str:
+    payload = json.dumps({"s": sort, "k": key}, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], sort: str) -> Optional[List[Any]]:
+    """The keyset position stored in `cursor`, or None for the first page. Raises 400 on a bad cursor."""
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if payload["s"] != sort or not isinstance(payload["k"], list):
+            raise ValueError("cursor belongs to a different sort order")
+        return payload["k"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
+
+def _explain(statement: Select, dialect):
+    compiled = statement.compile(dialect=dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup) if compiled.positional else compiled.params
+    return f"EXPLAIN (FORMAT JSON) {compiled}", params
+
+
+def _plan_rows(plan) -> int:
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def estimate_count(db: Session, query: Query) -> Optional[int]:
+    """
+    The planner's row estimate for `query` (EXPLAIN, not COUNT(*)), which stays cheap
+    on large tables. Approximate by design; None on databases other than PostgreSQL.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    sql, params = _explain(query.statement, db.get_bind().dialect)
+    return _plan_rows(db.connection().exec_driver_sql(sql, params).scalar())
+
+
+async def estimate_count_async(db: AsyncSession, statement: Select) -> Optional[int]:
+    """estimate_count() for a select() run on an AsyncSession."""
+    if db.bind.dialect.name != "postgresql":
+        return None
+    connection = await db.connection()
+    sql, params = _explain(statement, db.bind.dialect)
+    return _plan_rows((await connection.exec_driver_sql(sql, params)).scalar())
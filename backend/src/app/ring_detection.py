@@ -0,0 +1,259 @@
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from sqlalchemy.orm import Session
+
+from app.alert_summaries import template_summary
+from app.graph_engine import TransactionGraph
+from app.models import Alert, User
+from app.alerts import alert_key, upsert_alerts
+
+# --- Whole-graph ring and layering detection ---
+# Cycles are searched on the "value-carrying" subgraph only: edges whose average
+# transfer is large enough to matter. Rings then fall apart into small strongly
+# connected components, which are searched in parallel shards. Each cycle is rooted
+# at its lowest node position, so every cycle is found exactly once by exactly one
+# shard. Celery prefork children are daemonic and can't start a process pool, so the
+# ring scan task fans its shards out as subtasks over a saved copy of the subgraph
+# (see save_subgraph) instead.
+
+GRAPH_CYCLE = "GRAPH_CYCLE"
+GRAPH_LAYERING = "GRAPH_LAYERING"
+
+RING_MIN_EDGE_AMOUNT = float(os.getenv("RING_MIN_EDGE_AMOUNT", 100000))
+RING_AMOUNT_TOLERANCE = 1.5       # Largest/smallest average edge amount allowed along a ring
+RING_WINDOW_SECONDS = 7 * 24 * 3600 # All ring edges last used within this window
+MIN_CYCLE_LENGTH = 3
+MAX_CYCLE_LENGTH = 6
+MAX_CYCLES_PER_NODE = 20
+MAX_EXPANSIONS_PER_NODE = 50_000
+SHARD_SIZE = 2000                 # Start nodes per process-pool task or Celery subtask
+RING_WORKERS = int(os.getenv("RING_WORKERS", os.cpu_count() or 1))
+SUBGRAPH_ARRAYS = ("node_ids", "indptr", "indices", "amounts", "last_seen", "labels", "start_nodes")
+
+# Layering: a large funding transfer into an account that splits it into
+# structuring-band transfers (just under the reporting threshold) to several mules.
+STRUCTURING_AMOUNT_THRESHOLD = 50000.0
+LARGE_FUNDING_AMOUNT = 1_000_000.0
+FAN_OUT_MIN_RECEIVERS = 3
+MULE_MIN_DEPOSITS = 2
+
+# Filtered graph shared with the pool's worker processes (set by _init_worker).
+_ring_graph = None
+
+
+def _init_worker(indptr, indices, amounts, last_seen, labels):
+    global _ring_graph
+    _ring_graph = (indptr, indices, amounts, last_seen, labels)
+
+
+def _cycles_from(start_nodes: np.ndarray) -> List[List[int]]:
+    """Bounded DFS from each start node over nodes in its component with a higher position."""
+    indptr, indices, amounts, last_seen, labels = _ring_graph
+    cycles = []
+    for start in start_nodes.tolist():
+        found, expansions = 0, 0
+        # Each frame: (node, edge cursor, path min amount, path max amount, path oldest, path newest)
+        path, on_path = [start], {start}
+        stack = [(start, int(indptr[start]), np.inf, 0.0, np.inf, 0)]
+        while stack and found < MAX_CYCLES_PER_NODE and expansions < MAX_EXPANSIONS_PER_NODE:
+            node, cursor, low, high, oldest, newest = stack[-1]
+            if cursor == indptr[node + 1]:
+                stack.pop()
+                on_path.discard(path.pop())
+                continue
+            stack[-1] = (node, cursor + 1, low, high, oldest, newest)
+            expansions += 1
+            next_node = int(indices[cursor])
+            if next_node < start or labels[next_node] != labels[start]:
+                continue
+            low, high = min(low, amounts[cursor]), max(high, amounts[cursor])
+            oldest, newest = min(oldest, last_seen[cursor]), max(newest, last_seen[cursor])
+            if high > low * RING_AMOUNT_TOLERANCE or newest - oldest > RING_WINDOW_SECONDS:
+                continue
+            if next_node == start:
+                if len(path) >= MIN_CYCLE_LENGTH:
+                    cycles.append(list(path))
+                    found += 1
+                continue
+            if next_node in on_path or len(path) == MAX_CYCLE_LENGTH:
+                continue
+            path.append(next_node)
+            on_path.add(next_node)
+            stack.append((next_node, int(indptr[next_node]), low, high, oldest, newest))
+    return cycles
+
+
+def ring_subgraph(graph: TransactionGraph) -> Optional[Dict[str, np.ndarray]]:
+    """
+    The value-carrying edges of `graph` as a CSR over the same node positions, with
+    their strongly connected component labels and the start nodes worth searching
+    (members of components big enough to hold a ring). None if no edge qualifies.
+    """
+    src = np.repeat(np.arange(graph.num_nodes), np.diff(graph.indptr))
+    mean_amounts = graph.weights / np.maximum(graph.counts, 1)
+    keep = (mean_amounts >= RING_MIN_EDGE_AMOUNT) & (src != graph.indices)
+    src, dst = src[keep], np.asarray(graph.indices)[keep]
+    if len(src) == 0:
+        return None
+
+    # Edges stay sorted by sender, so the filtered edges form a CSR directly.
+    indptr = np.zeros(graph.num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=graph.num_nodes), out=indptr[1:])
+    adjacency = csr_matrix((np.ones(len(src), dtype=np.int8), dst, indptr), shape=(graph.num_nodes, graph.num_nodes))
+    _, labels = connected_components(adjacency, directed=True, connection="strong")
+
+    component_sizes = np.bincount(labels)
+    start_nodes = np.flatnonzero(component_sizes[labels] >= MIN_CYCLE_LENGTH)
+    print(f"Ring scan: {len(src)} value-carrying edges, {np.count_nonzero(component_sizes >= MIN_CYCLE_LENGTH)} candidate components, {len(start_nodes)} start nodes.")
+    return {
+        "node_ids": np.asarray(graph.node_ids), "indptr": indptr, "indices": dst, "amounts": mean_amounts[keep],
+        "last_seen": np.asarray(graph.timestamps)[keep], "labels": labels, "start_nodes": start_nodes,
+    }
+
+
+def shard_ranges(subgraph: Optional[Dict[str, np.ndarray]]) -> List[Tuple[int, int]]:
+    """[start, end) slices of the subgraph's start nodes, SHARD_SIZE each."""
+    if subgraph is None:
+        return []
+    total = len(subgraph["start_nodes"])
+    return [(start, min(start + SHARD_SIZE, total)) for start in range(0, total, SHARD_SIZE)]
+
+
+def _worker_args(subgraph: Dict[str, np.ndarray]) -> tuple:
+    return tuple(subgraph[name] for name in ("indptr", "indices", "amounts", "last_seen", "labels"))
+
+
+def shard_cycles(subgraph: Dict[str, np.ndarray], start: int, end: int) -> List[List[int]]:
+    """The rings rooted at start nodes [start, end), as lists of node positions."""
+    _init_worker(*_worker_args(subgraph))
+    return _cycles_from(subgraph["start_nodes"][start:end])
+
+
+def find_rings(graph: TransactionGraph, workers: int = RING_WORKERS) -> List[List[int]]:
+    """
+    Bounded-length cycles of similar, recent, value-carrying transfers anywhere in the
+    graph. Returns each cycle as a list of node positions in `graph`. Shards run in a
+    process pool, or one after another in a daemonic process (a Celery worker child),
+    which isn't allowed to start one.
+    """
+    subgraph = ring_subgraph(graph)
+    shards = shard_ranges(subgraph)
+    if workers <= 1 or len(shards) <= 1 or multiprocessing.current_process().daemon:
+        return [cycle for start, end in shards for cycle in shard_cycles(subgraph, start, end)]
+    start_nodes = subgraph["start_nodes"]
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards)), initializer=_init_worker, initargs=_worker_args(subgraph)) as pool:
+        return [cycle for shard_cycles in pool.map(_cycles_from, [start_nodes[start:end] for start, end in shards]) for cycle in shard_cycles]
+
+
+def save_subgraph(subgraph: Dict[str, np.ndarray], directory: Path) -> None:
+    """Writes the subgraph for shard subtasks, which may run in other processes or on other hosts sharing `directory`."""
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in SUBGRAPH_ARRAYS:
+        np.save(directory / f"{name}.npy", np.ascontiguousarray(subgraph[name]))
+
+
+def load_subgraph(directory: Path) -> Dict[str, np.ndarray]:
+    """Memory-maps a subgraph written by save_subgraph()."""
+    return {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in SUBGRAPH_ARRAYS}
+
+
+def remove_stale_subgraphs(directory: Path, max_age_seconds: float) -> None:
+    """Deletes subgraphs left behind by scans that never finished (a failed shard stops the chord)."""
+    if not directory.exists():
+        return
+    for scan_dir in directory.iterdir():
+        if scan_dir.is_dir() and time.time() - scan_dir.stat().st_mtime > max_age_seconds:
+            shutil.rmtree(scan_dir, ignore_errors=True)
+
+
+def find_layering(graph: TransactionGraph) -> Dict[str, np.ndarray]:
+    """
+    Vectorized source -> intermediary -> mule detection over the whole edge list.
+    Returns node positions for each role.
+    """
+    src = np.repeat(np.arange(graph.num_nodes), np.diff(graph.indptr))
+    dst = np.asarray(graph.indices)
+    counts = np.asarray(graph.counts)
+    mean_amounts = graph.weights / np.maximum(counts, 1)
+    large = mean_amounts >= LARGE_FUNDING_AMOUNT
+    in_band = (mean_amounts >= STRUCTURING_AMOUNT_THRESHOLD * 0.8) & (mean_amounts < STRUCTURING_AMOUNT_THRESHOLD)
+
+    funded = np.zeros(graph.num_nodes, dtype=bool)
+    funded[dst[large]] = True
+    fan_out = np.bincount(src[in_band], minlength=graph.num_nodes)
+    intermediaries = funded & (fan_out >= FAN_OUT_MIN_RECEIVERS)
+
+    sources = np.zeros(graph.num_nodes, dtype=bool)
+    sources[src[large & intermediaries[dst]]] = True
+    layered = in_band & intermediaries[src]
+    deposits = np.bincount(dst[layered], weights=counts[layered], minlength=graph.num_nodes)
+    mules = (deposits >= MULE_MIN_DEPOSITS) & ~intermediaries
+
+    return {"source": np.flatnonzero(sources), "intermediary": np.flatnonzero(intermediaries), "mule": np.flatnonzero(mules)}
+
+
+def _edge_amount(graph: TransactionGraph, sender: int, receiver: int) -> float:
+    start, end = graph.indptr[sender], graph.indptr[sender + 1]
+    slot = start + int(np.searchsorted(graph.indices[start:end], receiver))
+    return float(graph.weights[slot])
+
+
+def build_alerts(db: Session, graph: TransactionGraph, rings: List[List[int]], layering: Dict[str, np.ndarray]) -> List[Alert]:
+    """
+    Turns detected structures into alerts, one per involved user and alert type.
+    Users that already have an alert of the same type are skipped on insert.
+    """
+    findings: Dict[Tuple[int, str], str] = {}
+    involved = {int(node) for ring in rings for node in ring} | {int(node) for nodes in layering.values() for node in nodes}
+    user_ids = graph.node_ids[sorted(involved)].tolist() if involved else []
+    names = {user_id: name for user_id, name in db.query(User.id, User.full_name).filter(User.id.in_(user_ids))} if user_ids else {}
+    name_of = lambda node: names.get(int(graph.node_ids[node]), f"ID {int(graph.node_ids[node])}")
+
+    for ring in rings:
+        route = " -> ".join(name_of(node) for node in ring + ring[:1])
+        moved = sum(_edge_amount(graph, sender, receiver) for sender, receiver in zip(ring, ring[1:] + ring[:1]))
+        message = f"Circular flow detected: {route} moved ₹{moved:,.2f} around a {len(ring)}-account ring."
+        for node in ring:
+            findings.setdefault((int(graph.node_ids[node]), GRAPH_CYCLE), message)
+
+    role_messages = {
+        "source": "Layering source: funded an account that split the money into transfers just under the reporting threshold.",
+        "intermediary": "Layering intermediary: received a large transfer and fanned it out in amounts just under the reporting threshold.",
+        "mule": "Layering mule: received repeated just-under-threshold transfers from a layering intermediary.",
+    }
+    for role, nodes in layering.items():
+        for node in nodes.tolist():
+            findings.setdefault((int(graph.node_ids[node]), GRAPH_LAYERING), role_messages[role])
+
+    return [
+        Alert(user_id=user_id, alert_type=alert_type, message=message, ai_summary=template_summary(alert_type, message), status="OPEN", dedup_key=alert_key(alert_type, user_id))
+        for (user_id, alert_type), message in findings.items()
+    ]
+
+
+def record_scan(db: Session, graph: TransactionGraph, rings: List[List[int]], started: float) -> dict:
+    """Adds the layering detector's findings to `rings`, bulk-writes the new alerts and commits."""
+    layering = find_layering(graph)
+    inserted = upsert_alerts(db, build_alerts(db, graph, rings, layering))
+    db.commit()
+    return {
+        "rings": len(rings),
+        "layering_accounts": {role: len(nodes) for role, nodes in layering.items()},
+        "alerts_created": len(inserted),
+        "seconds": round(time.time() - started, 3),
+    }
+
+
+def scan_graph(db: Session, graph: TransactionGraph, workers: int = RING_WORKERS) -> dict:
+    """Runs both detectors over the whole graph and bulk-writes the new alerts."""
+    started = time.time()
+    return record_scan(db, graph, find_rings(graph, workers), started)
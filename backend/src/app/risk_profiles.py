@@ -0,0 +1,236 @@
+import os
+from datetime import datetime, timedelta, timezone
+from functools import reduce
+from typing import Dict, Iterable
+
+from sqlalchemy import case, delete, func, select, text, update
+from sqlalchemy.orm import Session
+
+from app.database import dialect_insert
+from app.models import Alert, Transaction, UserRiskProfile
+
+# --- Precomputed user risk profiles ---
+# Writers fold what they insert into `user_risk_profiles` with atomic delta upserts
+# (column = column + delta), in the same transaction as the insert. Only the rolling
+# window needs a periodic re-aggregation, because activity ages out of it.
+
+RISK_WINDOW_DAYS = int(os.getenv("RISK_WINDOW_DAYS", 30))
+PROFILE_BATCH_SIZE = 5000
+
+ALERT_COUNT_COLUMNS = {
+    "KYC_FLAG": "kyc_flag_alerts",
+    "AML_STRUCTURING_PAYMENT": "structuring_payment_alerts",
+    "AML_STRUCTURING_DEPOSIT": "structuring_deposit_alerts",
+    "ML_ANOMALY": "ml_anomaly_alerts",
+    "GRAPH_CYCLE": "graph_cycle_alerts",
+    "GRAPH_LAYERING": "graph_layering_alerts",
+}
+COUNTER_COLUMNS = ["total_alerts", "open_alerts", *ALERT_COUNT_COLUMNS.values(),
+                   "tx_in_count", "tx_in_amount", "tx_out_count", "tx_out_amount",
+                   "window_tx_count", "window_in_amount", "window_out_amount"]
+LATEST_COLUMNS = ["last_alert_at", "last_tx_at"]
+WINDOW_COLUMNS = ["window_tx_count", "window_in_amount", "window_out_amount"]
+
+# Composite score, 0-100: (points per alert, alerts counted at most) by alert column,
+# plus up to RISK_VOLUME_POINTS for rolling-window volume relative to RISK_VOLUME_SCALE.
+RISK_WEIGHTS = {
+    "graph_cycle_alerts": (25, 2),
+    "graph_layering_alerts": (25, 2),
+    "kyc_flag_alerts": (20, 1),
+    "structuring_payment_alerts": (15, 2),
+    "structuring_deposit_alerts": (15, 2),
+    "ml_anomaly_alerts": (2, 10),
+}
+RISK_VOLUME_POINTS = 10
+RISK_VOLUME_SCALE = 1_000_000.0
+MAX_RISK_SCORE = 100
+
+
+def _capped(expression, cap):
+    return case((expression > cap, cap), else_=expression)
+
+
+def risk_score_expression():
+    profile = UserRiskProfile
+    alert_points = reduce(lambda total, item: total + item[1][0] * _capped(getattr(profile, item[0]), item[1][1]), RISK_WEIGHTS.items(), 0)
+    volume_points = RISK_VOLUME_POINTS * _capped((profile.window_in_amount + profile.window_out_amount) / RISK_VOLUME_SCALE, 1.0)
+    return _capped(alert_points + volume_points, MAX_RISK_SCORE)
+
+
+def _latest(current, incoming):
+    """The later of two nullable timestamps (GREATEST without its NULL quirks on SQLite)."""
+    return case((incoming.is_(None), current), (current.is_(None), incoming), (incoming > current, incoming), else_=current)
+
+
+def _empty_delta(user_id: int) -> dict:
+    delta = {column: 0 for column in COUNTER_COLUMNS}
+    delta.update({column: None for column in LATEST_COLUMNS}, user_id=user_id)
+    return delta
+
+
+def _window_start() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=RISK_WINDOW_DAYS)
+
+
+def _as_aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.astimezone()
+
+
+def _upsert_deltas(db: Session, deltas: Dict[int, dict]) -> None:
+    """Adds the counter deltas to each user's profile (creating it if needed), then rescores them."""
+    if not deltas:
+        return
+    rows = [deltas[user_id] for user_id in sorted(deltas)] # Fixed order so concurrent writers don't deadlock
+    for offset in range(0, len(rows), PROFILE_BATCH_SIZE):
+        statement = dialect_insert(db, UserRiskProfile).values(rows[offset:offset + PROFILE_BATCH_SIZE])
+        set_ = {column: getattr(UserRiskProfile, column) + getattr(statement.excluded, column) for column in COUNTER_COLUMNS}
+        set_.update({column: _latest(getattr(UserRiskProfile, column), getattr(statement.excluded, column)) for column in LATEST_COLUMNS})
+        set_["updated_at"] = func.now()
+        db.execute(statement.on_conflict_do_update(index_elements=[UserRiskProfile.user_id], set_=set_))
+    rescore(db, deltas.keys())
+
+
+def rescore(db: Session, user_ids: Iterable[int]) -> None:
+    user_ids = sorted(user_ids)
+    for offset in range(0, len(user_ids), PROFILE_BATCH_SIZE):
+        batch = user_ids[offset:offset + PROFILE_BATCH_SIZE]
+        db.execute(update(UserRiskProfile).where(UserRiskProfile.user_id.in_(batch)).values(risk_score=risk_score_expression()))
+
+
+def record_alerts(db: Session, alerts: Iterable[Alert]) -> None:
+    """Folds newly created alerts into their users' profiles. Does not commit."""
+    deltas: Dict[int, dict] = {}
+    now = datetime.now(timezone.utc)
+    for alert in alerts:
+        if alert.user_id is None:
+            continue
+        delta = deltas.get(alert.user_id) or deltas.setdefault(alert.user_id, _empty_delta(alert.user_id))
+        delta["total_alerts"] += 1
+        if (alert.status or "OPEN") == "OPEN":
+            delta["open_alerts"] += 1
+        if alert.alert_type in ALERT_COUNT_COLUMNS:
+            delta[ALERT_COUNT_COLUMNS[alert.alert_type]] += 1
+        created_at = _as_aware(alert.created_at) if alert.created_at else now
+        delta["last_alert_at"] = max(delta["last_alert_at"] or created_at, created_at)
+    _upsert_deltas(db, deltas)
+
+
+def record_transactions(db: Session, transactions: Iterable) -> None:
+    """
+    Folds newly inserted transactions (anything with from_user_id, to_user_id, amount
+    and timestamp) into both parties' profiles. Does not commit.
+    """
+    deltas: Dict[int, dict] = {}
+    window_start = _window_start()
+    now = datetime.now(timezone.utc)
+    for tx in transactions:
+        timestamp = _as_aware(tx.timestamp) if tx.timestamp else now
+        in_window = timestamp >= window_start
+        for user_id, direction in ((tx.to_user_id, "in"), (tx.from_user_id, "out")):
+            if user_id is None:
+                continue
+            delta = deltas.get(user_id) or deltas.setdefault(user_id, _empty_delta(user_id))
+            delta[f"tx_{direction}_count"] += 1
+            delta[f"tx_{direction}_amount"] += tx.amount
+            if in_window:
+                delta["window_tx_count"] += 1
+                delta[f"window_{direction}_amount"] += tx.amount
+            delta["last_tx_at"] = max(delta["last_tx_at"] or timestamp, timestamp)
+    _upsert_deltas(db, deltas)
+
+
+def _window_aggregates(db: Session, since: datetime) -> Dict[int, dict]:
+    """Per-user transaction counts and in/out amounts since `since`, from the timestamp index."""
+    windows: Dict[int, dict] = {}
+    for user_column, direction in ((Transaction.to_user_id, "in"), (Transaction.from_user_id, "out")):
+        statement = (
+            select(user_column, func.count(), func.sum(Transaction.amount))
+            .where(Transaction.timestamp >= since, user_column.isnot(None))
+            .group_by(user_column)
+        )
+        for user_id, tx_count, amount in db.execute(statement):
+            window = windows.setdefault(user_id, {"user_id": user_id, "window_tx_count": 0, "window_in_amount": 0.0, "window_out_amount": 0.0})
+            window["window_tx_count"] += tx_count
+            window[f"window_{direction}_amount"] += amount
+    return windows
+
+
+def _lock_profiles(db: Session) -> None:
+    """
+    Blocks profile writes (not reads) until the transaction ends, so deltas committed
+    by concurrent writers can't land between reading aggregates and overwriting with them.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE user_risk_profiles IN SHARE ROW EXCLUSIVE MODE"))
+
+
+def refresh_windows(db: Session) -> int:
+    """
+    Re-aggregates the rolling-window columns from transactions inside the window
+    and rescores every profile. Commits. Returns the number of users with activity.
+    Writers that touch profiles wait for it to finish.
+    """
+    _lock_profiles(db)
+    windows = _window_aggregates(db, _window_start())
+    db.execute(update(UserRiskProfile).where(UserRiskProfile.window_tx_count > 0).values({column: 0 for column in WINDOW_COLUMNS}))
+    rows = [windows[user_id] for user_id in sorted(windows)]
+    for offset in range(0, len(rows), PROFILE_BATCH_SIZE):
+        statement = dialect_insert(db, UserRiskProfile).values(rows[offset:offset + PROFILE_BATCH_SIZE])
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[UserRiskProfile.user_id],
+            set_={column: getattr(statement.excluded, column) for column in WINDOW_COLUMNS},
+        ))
+    db.execute(update(UserRiskProfile).values(risk_score=risk_score_expression()))
+    db.commit()
+    return len(windows)
+
+
+def rebuild_all(db: Session) -> int:
+    """Recomputes every profile from the full alert and transaction history. Commits."""
+    _lock_profiles(db)
+    deltas: Dict[int, dict] = {}
+    def delta_for(user_id: int) -> dict:
+        return deltas.get(user_id) or deltas.setdefault(user_id, _empty_delta(user_id))
+
+    alert_counts = select(Alert.user_id, Alert.alert_type, Alert.status, func.count(), func.max(Alert.created_at)).where(Alert.user_id.isnot(None)).group_by(Alert.user_id, Alert.alert_type, Alert.status)
+    for user_id, alert_type, status, alert_count, last_alert_at in db.execute(alert_counts):
+        delta = delta_for(user_id)
+        delta["total_alerts"] += alert_count
+        if (status or "OPEN") == "OPEN":
+            delta["open_alerts"] += alert_count
+        if alert_type in ALERT_COUNT_COLUMNS:
+            delta[ALERT_COUNT_COLUMNS[alert_type]] += alert_count
+        delta["last_alert_at"] = max(filter(None, (delta["last_alert_at"], last_alert_at)), default=None)
+
+    for user_column, direction in ((Transaction.to_user_id, "in"), (Transaction.from_user_id, "out")):
+        totals = select(user_column, func.count(), func.sum(Transaction.amount), func.max(Transaction.timestamp)).where(user_column.isnot(None)).group_by(user_column)
+        for user_id, tx_count, amount, last_tx_at in db.execute(totals):
+            delta = delta_for(user_id)
+            delta[f"tx_{direction}_count"] += tx_count
+            delta[f"tx_{direction}_amount"] += amount
+            delta["last_tx_at"] = max(filter(None, (delta["last_tx_at"], last_tx_at)), default=None)
+
+    for user_id, window in _window_aggregates(db, _window_start()).items():
+        delta_for(user_id).update(window)
+
+    db.execute(delete(UserRiskProfile))
+    _upsert_deltas(db, deltas)
+    db.commit()
+    return len(deltas)
+
+
+def summary_stats(profile: UserRiskProfile) -> dict:
+    """The profile in the shape the advisor's dossier uses."""
+    if profile is None:
+        return {"total_alerts": 0, "open_alerts": 0, "alert_types": [], "alert_counts": {}, "risk_score": 0.0}
+    alert_counts = {alert_type: getattr(profile, column) for alert_type, column in ALERT_COUNT_COLUMNS.items() if getattr(profile, column)}
+    return {
+        "total_alerts": profile.total_alerts,
+        "open_alerts": profile.open_alerts,
+        "alert_types": sorted(alert_counts),
+        "alert_counts": alert_counts,
+        "risk_score": round(profile.risk_score, 1),
+        "transactions_in": {"count": profile.tx_in_count, "amount": round(profile.tx_in_amount, 2)},
+        "transactions_out": {"count": profile.tx_out_count, "amount": round(profile.tx_out_amount, 2)},
+        f"last_{RISK_WINDOW_DAYS}_days": {"count": profile.window_tx_count, "amount_in": round(profile.window_in_amount, 2), "amount_out": round(profile.window_out_amount, 2)},
+    }
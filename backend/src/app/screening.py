@@ -0,0 +1,261 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.cache import LRUCache
+from app.models import Watchlist
+
+# --- In-memory watchlist screening ---
+# Names are normalized into tokens (accents, case and punctuation stripped, honorifics
+# dropped). Each query token is matched against the watchlist vocabulary through a
+# deletion-neighbourhood index (every variant of a token with up to two characters
+# deleted, verified with a bounded edit distance) and Soundex keys, and the token
+# matches are combined into a 0..1 score per watchlist entry. Token lookups are
+# memoized, so screening millions of users mostly costs dictionary hits: the set of
+# distinct first and last names is far smaller than the set of users.
+
+SCREENING_MATCH_THRESHOLD = float(os.getenv("SCREENING_MATCH_THRESHOLD", 0.85)) # Raises a KYC flag
+SCREENING_REPORT_THRESHOLD = float(os.getenv("SCREENING_REPORT_THRESHOLD", 0.7)) # Lowest score reported at all
+SCREENING_REFRESH_SECONDS = int(os.getenv("SCREENING_REFRESH_SECONDS", 60))
+SCREENING_MAX_MATCHES = 5
+REFRESH_BATCH_SIZE = 5000 # Upper bound on watchlist IDs bound into one IN (...) list
+PHONETIC_SIMILARITY = 0.8 # Credit for tokens that only sound alike
+TOKEN_CACHE_SIZE = 200_000
+HONORIFICS = {"mr", "mrs", "ms", "miss", "dr", "sir", "prof"}
+
+_WORD_RE = re.compile(r"[^\W_]+")
+_SOUNDEX_CODES = {**dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"), **dict.fromkeys("dt", "3"), "l": "4", **dict.fromkeys("mn", "5"), "r": "6"}
+
+
+def normalize_name(name: Optional[str]) -> List[str]:
+    """Lowercase ASCII-folded name tokens, without punctuation or honorifics."""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return [token for token in _WORD_RE.findall(text) if token not in HONORIFICS]
+
+
+def soundex(token: str) -> Optional[str]:
+    """American Soundex code of a token, or None for tokens that aren't plain Latin letters."""
+    if not token.isascii() or not token.isalpha():
+        return None
+    code, previous = token[0].upper(), _SOUNDEX_CODES.get(token[0], "")
+    for char in token[1:]:
+        digit = _SOUNDEX_CODES.get(char, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if char not in "hw": # h and w don't separate letters with the same code
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def max_edits(length: int) -> int:
+    """Edit distance tolerated for a token of this length: none for initials and short tokens."""
+    return 0 if length <= 3 else 1 if length <= 6 else 2
+
+
+def deletion_variants(token: str, edits: int) -> set:
+    """The token and every string obtained by deleting up to `edits` of its characters."""
+    variants, frontier = {token}, {token}
+    for _ in range(edits):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+def _indexed_edits(token: str) -> int:
+    # Enough deletions for any query token within its own bound: queries may be up to 2 characters longer
+    return max_edits(len(token) + 2)
+
+
+def bounded_levenshtein(a: str, b: str, bound: int) -> int:
+    """Edit distance between `a` and `b`, or bound + 1 as soon as it must exceed `bound`."""
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    over = bound + 1
+    previous = [j if j <= bound else over for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        # Only the diagonal band |i - j| <= bound can stay within the bound
+        low, high = max(1, i - bound), min(len(b), i + bound)
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= bound else over
+        for j in range(low, high + 1):
+            cost = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost if cost < over else over
+        if min(current[low - 1:high + 1]) >= over:
+            return over
+        previous = current
+    return previous[-1]
+
+
+class ScreeningIndex:
+    """Watchlist names indexed by token, token deletion variant and token Soundex key."""
+
+    def __init__(self):
+        self.entries: Dict[int, Tuple[str, Tuple[str, ...]]] = {}
+        self.token_entries: Dict[str, set] = defaultdict(set)
+        self.variant_tokens: Dict[str, set] = defaultdict(set)
+        self.phonetic_tokens: Dict[str, set] = defaultdict(set)
+        self.token_matches = LRUCache(TOKEN_CACHE_SIZE)
+        self._lock = threading.RLock() # Refreshes edit the index in place while API threads read it
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _invalidate(self) -> None:
+        if len(self.token_matches):
+            self.token_matches = LRUCache(TOKEN_CACHE_SIZE)
+
+    def add(self, entry_id: int, name: str) -> None:
+        with self._lock:
+            if entry_id in self.entries and self.entries[entry_id][0] == name:
+                return # Unchanged: keep the token memo
+            self.remove(entry_id)
+            tokens = tuple(normalize_name(name))
+            self.entries[entry_id] = (name, tokens)
+            for token in set(tokens):
+                if token not in self.token_entries:
+                    for variant in deletion_variants(token, _indexed_edits(token)):
+                        self.variant_tokens[variant].add(token)
+                    key = soundex(token)
+                    if key:
+                        self.phonetic_tokens[key].add(token)
+                self.token_entries[token].add(entry_id)
+            self._invalidate()
+
+    def remove(self, entry_id: int) -> None:
+        with self._lock:
+            entry = self.entries.pop(entry_id, None)
+            if entry is None:
+                return
+            for token in set(entry[1]):
+                self.token_entries[token].discard(entry_id)
+                if not self.token_entries[token]: # Last use of this token: drop it from the vocabulary
+                    del self.token_entries[token]
+                    for variant in deletion_variants(token, _indexed_edits(token)):
+                        self.variant_tokens[variant].discard(token)
+                    self.phonetic_tokens.get(soundex(token), set()).discard(token)
+            self._invalidate()
+
+    def similar_tokens(self, token: str) -> Dict[str, float]:
+        """Vocabulary tokens within the edit bound of `token` or sharing its Soundex key, with a 0..1 similarity."""
+        bound = max_edits(len(token))
+        # Two tokens within `bound` edits share a variant with at most `bound` deletions from each
+        candidates = set()
+        for variant in deletion_variants(token, bound):
+            candidates.update(self.variant_tokens.get(variant, ()))
+        similar = {}
+        for candidate in candidates:
+            if abs(len(candidate) - len(token)) <= bound:
+                distance = bounded_levenshtein(token, candidate, bound)
+                if distance <= bound:
+                    similar[candidate] = 1.0 - distance / max(len(token), len(candidate))
+        for candidate in self.phonetic_tokens.get(soundex(token), ()):
+            # Soundex buckets are broad; only credit candidates of a similar length
+            if abs(len(candidate) - len(token)) <= 2 and similar.get(candidate, 0.0) < PHONETIC_SIMILARITY:
+                similar[candidate] = PHONETIC_SIMILARITY
+        return similar
+
+    def _entry_similarities(self, token: str) -> Dict[int, float]:
+        """Best similarity of `token` to any token of each watchlist entry it resembles. Memoized."""
+        cached = self.token_matches.get(token)
+        if cached is None:
+            cached = {}
+            for candidate, similarity in self.similar_tokens(token).items():
+                for entry_id in self.token_entries.get(candidate, ()):
+                    if similarity > cached.get(entry_id, 0.0):
+                        cached[entry_id] = similarity
+            self.token_matches.set(token, cached)
+        return cached
+
+    def match(self, name: str, limit: int = SCREENING_MAX_MATCHES, min_score: float = SCREENING_REPORT_THRESHOLD) -> List[dict]:
+        """
+        The best watchlist entries for `name`, highest score first. The score weighs how
+        much of the screened name the entry covers (60%) against how much of the entry
+        the name covers (40%): "John Smith" still scores high against "John Smith Jr",
+        a lone "John" does not.
+        """
+        tokens = normalize_name(name)
+        if not tokens:
+            return []
+        matches = []
+        with self._lock:
+            totals = defaultdict(float)
+            for token in tokens:
+                for entry_id, similarity in self._entry_similarities(token).items():
+                    totals[entry_id] += similarity
+            # Even full coverage of the entry's tokens can't lift totals below this over min_score
+            min_total = (min_score - 0.4) * len(tokens) / 0.6
+            for entry_id, total in totals.items():
+                if total < min_total:
+                    continue
+                entry_name, entry_tokens = self.entries[entry_id]
+                score = 0.6 * total / len(tokens) + 0.4 * min(total, len(entry_tokens)) / len(entry_tokens)
+                if score >= min_score:
+                    matches.append({"watchlist_id": entry_id, "name": entry_name, "score": round(score, 4)})
+        matches.sort(key=lambda match: (-match["score"], match["watchlist_id"]))
+        return matches[:limit]
+
+
+_index: Optional[ScreeningIndex] = None
+_watermark = None # Latest Watchlist.updated_at applied to the index
+_synced_at = 0.0
+_lock = threading.Lock()
+
+
+def _rebuild(db: Session) -> None:
+    global _index, _watermark
+    index = ScreeningIndex()
+    for entry_id, name in db.query(Watchlist.id, Watchlist.name).yield_per(10_000):
+        index.add(entry_id, name)
+    _index, _watermark = index, db.query(func.max(Watchlist.updated_at)).scalar()
+    print(f"Screening index built: {len(index)} watchlist entries, {len(index.token_entries)} distinct tokens.")
+
+
+def refresh(db: Session) -> ScreeningIndex:
+    """
+    Brings the process's index up to date with `Watchlist`: rows added or edited since
+    the last refresh are applied in place. The indexed ids are then compared with the
+    table's, so deleted rows are removed and rows the watermark can't see (no
+    updated_at, or committed late with an older one) are added.
+    """
+    global _watermark, _synced_at
+    with _lock:
+        if _index is None:
+            _rebuild(db)
+        else:
+            changed = db.query(Watchlist.id, Watchlist.name, Watchlist.updated_at).filter(Watchlist.updated_at.isnot(None))
+            if _watermark is not None:
+                changed = changed.filter(Watchlist.updated_at >= _watermark)
+            for entry_id, name, updated_at in changed:
+                _index.add(entry_id, name)
+                if updated_at is not None and (_watermark is None or updated_at > _watermark):
+                    _watermark = updated_at
+            current_ids = {entry_id for (entry_id,) in db.query(Watchlist.id)}
+            for entry_id in _index.entries.keys() - current_ids:
+                _index.remove(entry_id)
+            missing = list(current_ids - _index.entries.keys())
+            for offset in range(0, len(missing), REFRESH_BATCH_SIZE):
+                for entry_id, name in db.query(Watchlist.id, Watchlist.name).filter(Watchlist.id.in_(missing[offset:offset + REFRESH_BATCH_SIZE])):
+                    _index.add(entry_id, name)
+        _synced_at = time.monotonic()
+        return _index
+
+
+def get_index(db: Session) -> ScreeningIndex:
+    """The process's screening index, refreshed at most every SCREENING_REFRESH_SECONDS."""
+    if _index is None or time.monotonic() - _synced_at > SCREENING_REFRESH_SECONDS:
+        return refresh(db)
+    return _index
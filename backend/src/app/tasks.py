@@ -1,30 +1,27 @@
+import asyncio
 import os
-import csv
-import io
-import json
-import google.generativeai as genai
+import shutil
+import time
+import uuid
+import numpy as np
+from sqlalchemy import String, select, func
+from celery import chord
 from celery_worker import celery_app
 from app.database import SessionLocal
-from app.models import User, Watchlist, Alert, Transaction, GraphAnalysisResult
-from app import aml_rules, graph_analysis, ml_inference, advisor
+from app.models import User, Alert, Transaction, GraphAnalysisResult, WatchlistMatch
+from app import aml_rules, alerts, alert_summaries, graph_analysis, graph_store, ring_detection, risk_profiles, rule_scheduler, screening, kyc, job_events, ml_inference, advisor, data_processor, bulk_loader, llm
 from datetime import datetime, timedelta
 
 # --- AI and Setup code ---
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-1.5-flash')
-HIGH_RISK_COUNTRIES = ["Iran", "North Korea", "Syria", "Yemen"]
+ADVISOR_CONCURRENCY = int(os.getenv("ADVISOR_CONCURRENCY", 32))
+# Live LLM calls per minute for one advisor sweep, separate from LLM_REQUESTS_PER_MINUTE
+# (which paces the one-off calls). Keep it within the model's quota.
+ADVISOR_SWEEP_REQUESTS_PER_MINUTE = float(os.getenv("ADVISOR_SWEEP_REQUESTS_PER_MINUTE", 3000))
+SCREENING_CHUNK_SIZE = int(os.getenv("SCREENING_CHUNK_SIZE", 50_000))
+# Alert types keyed on (type, user) only, see _structuring_alerts and ring_detection.build_alerts
+PER_USER_ALERT_TYPES = (aml_rules.STRUCTURING_PAYMENT, aml_rules.STRUCTURING_DEPOSIT, ring_detection.GRAPH_CYCLE, ring_detection.GRAPH_LAYERING)
 
 # --- AI Helper Functions ---
-def generate_kyc_summary(reasons: list) -> str:
-    if not reasons: return "No issues found."
-    prompt = f"Concisely summarize this compliance risk in one sentence: A user was flagged for these reasons: {', '.join(reasons)}."
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip() if response.text else "AI summary could not be generated."
-    except Exception as e:
-        print(f"Error calling Gemini API for KYC summary: {e}")
-        return "AI summary could not be generated."
-
 def generate_graph_explanation(findings: dict) -> str:
     prompt_parts = ["You are a compliance investigator. Explain the primary risk of this network structure:"]
     has_findings = False
@@ -40,64 +37,117 @@ def generate_graph_explanation(findings: dict) -> str:
     if not has_findings: 
         return "No significant graph patterns were detected."
     try:
-        response = model.generate_content("\n".join(prompt_parts))
-        return response.text.strip() if response.text else "AI explanation could not be generated."
+        return llm.generate_text("\n".join(prompt_parts)) or "AI explanation could not be generated."
     except Exception as e:
         print(f"Error calling Gemini API for graph explanation: {e}")
         return "AI explanation could not be generated."
 
-def explain_risk_profile(evidence: dict) -> dict:
-    if not evidence.get("alerts"): return {"explanation": "No open alerts; user appears low-risk."}
-    evidence_str = json.dumps(evidence, indent=2)
-    prompt = f"You are an expert financial crime investigator. Here is a user's dossier:\n```json\n{evidence_str}\n```\nSummarize the user's overall risk level, list the top 2-3 most severe risk factors, and recommend a next action (e.g., 'Continue Monitoring', 'Escalate for Investigation'). Be concise."
-    try:
-        response = model.generate_content(prompt)
-        return {"explanation": response.text.strip()}
-    except Exception as e:
-        return {"error": f"AI risk explanation failed: {e}"}
-
-def generate_sar_draft(evidence: dict) -> dict:
-    if not evidence.get("alerts"): return {"sar_draft": "No suspicious activity found. SAR not warranted."}
-    evidence_str = json.dumps(evidence, indent=2)
-    prompt = f"You are a compliance officer. Draft a formal SAR narrative based on this evidence:\n```json\n{evidence_str}\n```\nUse sections for Introduction, Narrative of Suspicious Activity, and Conclusion. Be factual."
-    try:
-        response = model.generate_content(prompt)
-        return {"sar_draft": response.text.strip()}
-    except Exception as e:
-        return {"error": f"SAR generation failed: {e}"}
+def _anomaly_alert(transaction_id: int, user_id: int, amount: float, iso_forest_score: float, autoencoder_error: float) -> Alert:
+    message = f"Anomalous transaction of ₹{amount:,.2f} detected. (I-Forest:{iso_forest_score:.2f}, AE-Error:{autoencoder_error:.4f})"
+    return Alert(user_id=user_id, alert_type="ML_ANOMALY", message=message, ai_summary=alert_summaries.template_summary("ML_ANOMALY", message), status="OPEN",
+                 dedup_key=alerts.alert_key("ML_ANOMALY", user_id, transaction_id)) # One per transaction, however often it is rescored
 
 # --- Core Celery Tasks ---
 
-@celery_app.task
+@celery_app.task(tracked_job=True)
 def run_kyc_check(user_id: int):
     db = SessionLocal()
     try:
         user = db.query(User).filter(User.id == user_id).first()
         if not user: return
-        reasons = []
-        if user.country in HIGH_RISK_COUNTRIES: reasons.append(f"from high-risk country: {user.country}")
-        watchlist_entry = db.query(Watchlist).filter(Watchlist.name.ilike(f"%{user.full_name}%")).first()
-        if watchlist_entry: reasons.append("matches watchlist")
-        if reasons:
-            ai_summary = generate_kyc_summary(reasons)
-            db.add(Alert(user_id=user.id, alert_type="KYC_FLAG", message="; ".join(reasons), ai_summary=ai_summary, status="OPEN"))
+        findings = kyc.evaluate_users(screening.get_index(db), [(user.id, user.full_name, user.country)])
+        if kyc.insert_alerts(db, findings):
             db.commit()
     finally: db.close()
 
+@celery_app.task(bind=True, tracked_job=True, acks_late=True, reject_on_worker_lost=True)
+def kyc_sweep(self, restart: bool = False):
+    """
+    Re-runs the KYC criteria for every user, e.g. after a sanctions list refresh or a
+    HIGH_RISK_COUNTRIES change. Acknowledged only once done, so if the worker dies the
+    broker redelivers it and the sweep resumes from its checkpoint. Redis also
+    redelivers a message that is still running after the transport's visibility_timeout
+    (1 hour by default); that copy finds the checkpoint leased and retries until the
+    lease is released (sweep complete) or expires (worker gone).
+    """
+    db = SessionLocal()
+    try:
+        summary = kyc.sweep(db, self.request.id, restart, lambda progress: _report_progress(self, progress))
+        print(f"KYC sweep complete: {summary['users_checked']} users checked, {summary['alerts_created']} new alerts.")
+        if summary["alerts_created"]:
+            enrich_alert_summaries.delay()
+        return summary
+    except kyc.SweepInProgress as e:
+        db.rollback()
+        print(f"{e}; retrying in {kyc.KYC_SWEEP_LEASE_SECONDS}s.")
+        raise self.retry(countdown=kyc.KYC_SWEEP_LEASE_SECONDS, max_retries=None)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@celery_app.task(tracked_job=True)
+def screen_all_users():
+    """
+    Screens every user's name against the watchlist index, fanned out over all workers
+    in keyset ranges of SCREENING_CHUNK_SIZE users. Returns the chord's job ID, which
+    completes with the totals once every range is done.
+    """
+    db = SessionLocal()
+    try:
+        numbered = select(User.id, func.row_number().over(order_by=User.id).label("position")).subquery()
+        starts = [user_id for (user_id,) in db.execute(select(numbered.c.id).where((numbered.c.position - 1) % SCREENING_CHUNK_SIZE == 0).order_by(numbered.c.id))]
+    finally:
+        db.close()
+    if not starts:
+        return {"chunks": 0, "job_id": None}
+    ranges = [(start, end) for start, end in zip(starts, starts[1:] + [None])]
+    job = chord(screen_users_chunk.s(start, end) for start, end in ranges)(summarize_screening.s())
+    print(f"Watchlist screening queued: {len(ranges)} chunks of up to {SCREENING_CHUNK_SIZE} users.")
+    return {"chunks": len(ranges), "job_id": job.id}
+
+@celery_app.task
+def screen_users_chunk(first_user_id: int, end_user_id: int = None):
+    """Screens users with first_user_id <= id < end_user_id and replaces their stored watchlist matches."""
+    db = SessionLocal()
+    started = time.monotonic()
+    try:
+        index = screening.get_index(db)
+        users = select(User.id, User.full_name).where(User.id >= first_user_id).order_by(User.id)
+        delete_matches = WatchlistMatch.__table__.delete().where(WatchlistMatch.user_id >= first_user_id)
+        if end_user_id is not None:
+            users = users.where(User.id < end_user_id)
+            delete_matches = delete_matches.where(WatchlistMatch.user_id < end_user_id)
+        screened, rows = 0, []
+        for user_id, full_name in db.execute(users.execution_options(yield_per=10_000)):
+            screened += 1
+            rows.extend({"user_id": user_id, "watchlist_id": match["watchlist_id"], "matched_name": match["name"], "score": match["score"]} for match in index.match(full_name))
+        db.execute(delete_matches)
+        for offset in range(0, len(rows), 10_000):
+            db.execute(WatchlistMatch.__table__.insert(), rows[offset:offset + 10_000])
+        db.commit()
+        return {"users": screened, "matched_users": len({row["user_id"] for row in rows}), "matches": len(rows), "seconds": round(time.monotonic() - started, 2)}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@celery_app.task
+def summarize_screening(chunk_results: list):
+    totals = {key: sum(result[key] for result in chunk_results) for key in ("users", "matched_users", "matches")}
+    print(f"Watchlist screening complete: {totals['users']} users, {totals['matched_users']} with matches.")
+    return dict(totals, chunks=len(chunk_results))
+
 @celery_app.task
 def analyze_transaction_patterns(user_id: int):
     db = SessionLocal()
     try:
         user = db.query(User).filter(User.id == user_id).first()
         if not user: return
-        payment_reason = aml_rules.check_structuring_by_payment(db, user)
-        if payment_reason:
-            if not db.query(Alert).filter(Alert.user_id==user.id, Alert.alert_type=="AML_STRUCTURING_PAYMENT").first():
-                db.add(Alert(user_id=user.id, alert_type="AML_STRUCTURING_PAYMENT", message=payment_reason, ai_summary="User sent multiple payments under reporting thresholds."))
-        deposit_reason = aml_rules.check_structuring_by_deposit(db, user)
-        if deposit_reason:
-            if not db.query(Alert).filter(Alert.user_id==user.id, Alert.alert_type=="AML_STRUCTURING_DEPOSIT").first():
-                db.add(Alert(user_id=user.id, alert_type="AML_STRUCTURING_DEPOSIT", message=deposit_reason, ai_summary="User received multiple deposits, suggesting use as a mule account."))
+        # Both structuring rules are evaluated in a single grouped query.
+        alerts.upsert_alerts(db, _structuring_alerts(aml_rules.evaluate_structuring_rules(db, [user.id])))
         db.commit()
     finally: db.close()
 
@@ -107,16 +157,15 @@ def score_transaction_anomaly(transaction_id: int):
     try:
         transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
         if not transaction: return
-        scores = ml_inference.score_transaction(transaction.amount)
-        if scores["anomaly"]:
-            message = (f"Anomalous transaction of ₹{transaction.amount:,.2f} detected. (I-Forest:{scores['iso_forest_score']:.2f}, AE-Error:{scores['autoencoder_error']:.4f})")
-            db.add(Alert(user_id=transaction.to_user_id, alert_type="ML_ANOMALY", message=message, ai_summary="ML model detected a significant deviation from normal activity.", status="OPEN"))
+        scores = ml_inference.score_transactions(np.array([transaction.amount]))
+        if scores["anomaly"][0]:
+            alerts.upsert_alerts(db, [_anomaly_alert(transaction.id, transaction.to_user_id, transaction.amount, scores["iso_forest_score"][0], scores["autoencoder_error"][0])])
             db.commit()
     finally: db.close()
 
 
 
-@celery_app.task(bind=True)
+@celery_app.task(bind=True, tracked_job=True)
 def run_graph_analysis(self, user_id: int):
     """
     This is the final, corrected version.
@@ -171,76 +220,275 @@ def run_graph_analysis(self, user_id: int):
 
 
 
-@celery_app.task(bind=True)
-def process_uploaded_csv(self, file_content_str: str):
+def _structuring_alerts(findings: dict) -> list:
+    """Alerts for rule findings. One per user and rule: a finding the user already has an alert for is skipped on insert."""
+    return [
+        Alert(user_id=user_id, alert_type=alert_type, message=reason, ai_summary=alert_summaries.template_summary(alert_type, reason), dedup_key=alerts.alert_key(alert_type, user_id))
+        for user_id, user_findings in findings.items()
+        for alert_type, reason in user_findings.items()
+    ]
+
+def _analyze_batch(db, batch_id: str, progress: dict, report=lambda: None) -> None:
+    """
+    Runs the structuring rules and ML scoring over one ingestion batch and commits
+    the resulting alerts, counting them in progress["alerts_created"].
+    """
+    # Rules only run for accounts that appear in this batch, over every window
+    # around the batch's own event times rather than the hours before load time.
+    alerts_to_create = _structuring_alerts(aml_rules.evaluate_structuring_for_batch(db, batch_id, bulk_loader.batch_user_ids(db, batch_id)))
+
+    if ml_inference.load_models_lazily():
+        # Stream only this batch's transactions and score each chunk as one array.
+        affected_transactions = db.execute(
+            select(Transaction.id, Transaction.to_user_id, Transaction.amount)
+            .where(Transaction.ingestion_batch_id == batch_id)
+            .execution_options(yield_per=data_processor.CSV_CHUNK_SIZE)
+        )
+        for partition in affected_transactions.partitions():
+            transaction_ids, to_user_ids, amounts = zip(*partition)
+            scores = ml_inference.score_transactions(np.array(amounts))
+            for i in np.flatnonzero(scores["anomaly"]):
+                alerts_to_create.append(_anomaly_alert(transaction_ids[i], to_user_ids[i], amounts[i], scores["iso_forest_score"][i], scores["autoencoder_error"][i]))
+            if len(alerts_to_create) >= data_processor.CSV_CHUNK_SIZE:
+                progress["alerts_created"] += len(alerts.upsert_alerts(db, alerts_to_create))
+                alerts_to_create = []
+                report()
+
+    if alerts_to_create:
+        progress["alerts_created"] += len(alerts.upsert_alerts(db, alerts_to_create))
+    db.commit()
+
+def _report_progress(task, progress: dict) -> None:
+    """Stores the task's progress in the result backend and pushes it to SSE subscribers."""
+    task.update_state(state="PROGRESS", meta=progress)
+    job_events.publish(task.request.id, "PROGRESS", progress=progress)
+
+@celery_app.task(bind=True, tracked_job=True)
+def process_uploaded_csv(self, staged_path: str, source: str = bulk_loader.DEFAULT_SOURCE):
+    """
+    Streams a staged CSV upload into the database chunk by chunk, then runs the
+    batch analysis. Peak memory is bounded by CSV_CHUNK_SIZE, not by the file size.
+    The job ID doubles as the ingestion batch ID, so analysis only covers this upload.
+    """
+    batch_id = self.request.id
     db = SessionLocal()
+    user_map = {}
+    progress = {"phase": "INGESTING", "chunks": 0, "rows_parsed": 0, "rows_inserted": 0, "alerts_created": 0}
+    data_processor.remove_stale_uploads()
     try:
-        print(f"Starting BATCH CSV processing for job {self.request.id}")
-        file_stream = io.StringIO(file_content_str)
-        reader = csv.DictReader(file_stream)
-        rows = list(reader)
-
-        all_accounts_in_csv = {row.get('Debit_Account') for row in rows if row.get('Debit_Account')} | \
-                              {row.get('Credit_Account') for row in rows if row.get('Credit_Account')}
-        existing_users = db.query(User).filter(User.full_name.in_(all_accounts_in_csv)).all()
-        existing_user_names = {u.full_name for u in existing_users}
-        user_map = {u.full_name: u.id for u in existing_users}
-        new_user_names = all_accounts_in_csv - existing_user_names
-        users_to_create = [User(full_name=name, email=f"{name.lower().replace(' ', '_')}@bank.com", country="Unknown") for name in new_user_names]
-        
-        if users_to_create:
-            db.bulk_save_objects(users_to_create)
-            db.commit()
-            print(f"Bulk created {len(users_to_create)} new users.")
-            newly_created_users = db.query(User).filter(User.full_name.in_(new_user_names)).all()
-            for user in newly_created_users:
-                user_map[user.full_name] = user.id
-        
-        transactions_to_create = []
-        for row in rows:
-            from_user_id = user_map.get(row.get('Debit_Account'))
-            to_user_id = user_map.get(row.get('Credit_Account'))
-            if not from_user_id or not to_user_id: continue
-            transactions_to_create.append(Transaction(from_user_id=from_user_id, to_user_id=to_user_id, amount=float(row['Amount']), currency=row.get('Currency', 'INR'), description=row.get('Description', 'N/A')))
-        
-        if transactions_to_create:
-            db.bulk_save_objects(transactions_to_create)
-            db.commit()
-            print(f"Bulk inserted {len(transactions_to_create)} transactions.")
+        print(f"Starting STREAMING CSV processing for job {self.request.id} from {staged_path}")
+        rows = data_processor.iter_csv_rows(staged_path)
+        for chunk in data_processor.iter_chunks(rows, data_processor.CSV_CHUNK_SIZE):
+            inserted = bulk_loader.load_chunk(db, chunk, user_map, batch_id, source)
+            progress["chunks"] += 1
+            progress["rows_parsed"] += len(chunk)
+            progress["rows_inserted"] += inserted
+            _report_progress(self, progress)
+            print(f"Chunk {progress['chunks']}: parsed {len(chunk)} rows, inserted {inserted} transactions ({progress['rows_inserted']} total).")
 
         print("Starting BATCH analysis...")
-        all_affected_users = db.query(User).filter(User.id.in_(user_map.values())).all()
-        
-        alerts_to_create = []
-        for user in all_affected_users:
-            payment_reason = aml_rules.check_structuring_by_payment(db, user)
-            if payment_reason: alerts_to_create.append(Alert(user_id=user.id, alert_type="AML_STRUCTURING_PAYMENT", message=payment_reason, ai_summary="User sent multiple payments under reporting thresholds."))
-            deposit_reason = aml_rules.check_structuring_by_deposit(db, user)
-            if deposit_reason: alerts_to_create.append(Alert(user_id=user.id, alert_type="AML_STRUCTURING_DEPOSIT", message=deposit_reason, ai_summary="User received multiple deposits, suggesting use as a mule account."))
-
-        all_new_transactions = db.query(Transaction).filter(Transaction.to_user_id.in_(user_map.values())).all()
-        if ml_inference.load_models_lazily():
-            for tx in all_new_transactions:
-                scores = ml_inference.score_transaction(tx.amount)
-                if scores["anomaly"]:
-                    message = f"Anomalous transaction of ₹{tx.amount:,.2f} detected. (I-Forest:{scores['iso_forest_score']:.2f}, AE-Error:{scores['autoencoder_error']:.4f})"
-                    alerts_to_create.append(Alert(user_id=tx.to_user_id, alert_type="ML_ANOMALY", message=message, ai_summary="ML model detected a significant deviation from normal activity."))
-
-        if alerts_to_create:
-            db.bulk_save_objects(alerts_to_create)
-            db.commit()
-            print(f"BATCH analysis complete. Created {len(alerts_to_create)} new alerts.")
+        progress["phase"] = "ANALYZING"
+        _report_progress(self, progress)
+        _analyze_batch(db, batch_id, progress, lambda: _report_progress(self, progress))
+        print(f"BATCH analysis complete. Created {progress['alerts_created']} new alerts.")
 
-        return f"Processing complete. {len(transactions_to_create)} transactions ingested."
+        if progress["rows_inserted"]:
+            refresh_graph_snapshot.delay()
+        if progress["alerts_created"]:
+            enrich_alert_summaries.delay()
+        return f"Processing complete. {progress['rows_inserted']} transactions ingested."
     except Exception as e:
         db.rollback()
         print(f"CSV Processing task FAILED: {e}")
         raise
     finally:
         db.close()
+        # Failed jobs aren't retried, so nothing would ever reuse the file
+        data_processor.discard_staged_upload(staged_path)
+
+@celery_app.task(tracked_job=True)
+def analyze_ingested_batch(batch_id: str):
+    """
+    Rule and scoring pass for a batch ingested through the API: one task per batch
+    instead of two per transaction. Graph and enrichment work is left to their
+    periodic jobs, which already coalesce across batches.
+    """
+    db = SessionLocal()
+    progress = {"alerts_created": 0}
+    try:
+        _analyze_batch(db, batch_id, progress)
+        return progress
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@celery_app.task
+def evaluate_dirty_users():
+    """
+    Drains the dirty-user set and runs the structuring rules once per user, however
+    many transactions marked them since the last run. Users are put back if the
+    evaluation fails, so a bad run delays alerts instead of dropping them.
+    """
+    db = SessionLocal()
+    started = time.monotonic()
+    evaluated = alerts_created = 0
+    try:
+        while True:
+            user_ids = rule_scheduler.pop_dirty()
+            if not user_ids:
+                break
+            try:
+                inserted = alerts.upsert_alerts(db, _structuring_alerts(aml_rules.evaluate_structuring_rules(db, user_ids)))
+                db.commit()
+            except Exception:
+                db.rollback()
+                rule_scheduler.requeue(user_ids)
+                raise
+            evaluated += len(user_ids)
+            alerts_created += len(inserted)
+    finally:
+        db.close()
+        if evaluated:
+            rule_scheduler.record_run(evaluated, alerts_created, time.monotonic() - started)
+    if alerts_created:
+        enrich_alert_summaries.delay()
+    if evaluated:
+        print(f"Coalesced rule evaluation: {evaluated} users, {alerts_created} new alerts in {time.monotonic() - started:.2f}s.")
+    return {"users_evaluated": evaluated, "alerts_created": alerts_created}
+
+@celery_app.task
+def refresh_graph_snapshot():
+    """Republishes the memory-mapped graph snapshot from the `graph_edges` table."""
+    db = SessionLocal()
+    try:
+        snapshot = graph_store.refresh_snapshot(db)
+        print(f"Graph snapshot {snapshot['version']} published: {snapshot['num_nodes']} nodes, {snapshot['num_edges']} edges in {snapshot['seconds']}s.")
+        return snapshot
+    finally:
+        db.close()
+
+RING_SCAN_DIR = graph_store.SNAPSHOT_DIR / "ring-scans"
+RING_SCAN_MAX_AGE_SECONDS = 24 * 3600
 
-# --- NEW TASKS FOR THE AI ADVISOR ---
 @celery_app.task
+def detect_graph_rings():
+    """
+    Scans the whole transaction graph for rings and layering structures and raises
+    alerts. Large graphs are searched by ring_scan_shard subtasks over a saved copy of
+    the ring subgraph; finish_ring_scan collects their rings and writes the alerts.
+    """
+    db = SessionLocal()
+    started = time.time()
+    try:
+        graph = graph_store.get_graph(db)
+        subgraph = ring_detection.ring_subgraph(graph)
+        shards = ring_detection.shard_ranges(subgraph)
+        if len(shards) <= 1:
+            rings = [cycle for start, end in shards for cycle in ring_detection.shard_cycles(subgraph, start, end)]
+            return _ring_scan_complete(ring_detection.record_scan(db, graph, rings, started))
+    except Exception as e:
+        db.rollback()
+        print(f"Ring scan FAILED: {e}")
+        raise
+    finally:
+        db.close()
+
+    ring_detection.remove_stale_subgraphs(RING_SCAN_DIR, RING_SCAN_MAX_AGE_SECONDS)
+    scan_id = str(uuid.uuid4())
+    ring_detection.save_subgraph(subgraph, RING_SCAN_DIR / scan_id)
+    job = chord(ring_scan_shard.s(scan_id, start, end) for start, end in shards)(finish_ring_scan.s(scan_id, started))
+    print(f"Ring scan queued: {len(shards)} shards of up to {ring_detection.SHARD_SIZE} start nodes.")
+    return {"shards": len(shards), "job_id": job.id}
+
+@celery_app.task
+def ring_scan_shard(scan_id: str, start: int, end: int):
+    """Searches one shard of a saved ring subgraph. Returns its rings as lists of user IDs."""
+    subgraph = ring_detection.load_subgraph(RING_SCAN_DIR / scan_id)
+    node_ids = subgraph["node_ids"]
+    return [[int(node_ids[node]) for node in ring] for ring in ring_detection.shard_cycles(subgraph, start, end)]
+
+@celery_app.task
+def finish_ring_scan(shard_results: list, scan_id: str, started: float):
+    db = SessionLocal()
+    try:
+        # The snapshot may have been republished since the scan started; node positions are looked up again
+        graph = graph_store.get_graph(db)
+        rings = [[graph.index_of(user_id) for user_id in ring] for shard_rings in shard_results for ring in shard_rings]
+        rings = [ring for ring in rings if None not in ring]
+        return _ring_scan_complete(ring_detection.record_scan(db, graph, rings, started))
+    except Exception as e:
+        db.rollback()
+        print(f"Ring scan FAILED: {e}")
+        raise
+    finally:
+        db.close()
+        shutil.rmtree(RING_SCAN_DIR / scan_id, ignore_errors=True)
+
+def _ring_scan_complete(summary: dict) -> dict:
+    if summary["alerts_created"]:
+        enrich_alert_summaries.delay()
+    print(f"Ring scan complete: {summary['rings']} rings, layering {summary['layering_accounts']}, {summary['alerts_created']} new alerts in {summary['seconds']}s.")
+    return summary
+
+@celery_app.task
+def enrich_alert_summaries():
+    """Replaces template summaries of pending alerts with LLM summaries, many alerts per prompt."""
+    processed = alert_summaries.drain_pending(SessionLocal)
+    print(f"Alert enrichment processed {processed} alerts.")
+    return {"alerts_processed": processed}
+
+@celery_app.task
+def refresh_risk_profiles():
+    """Re-aggregates the rolling-window part of every user's risk profile and rescores."""
+    db = SessionLocal()
+    try:
+        active_users = risk_profiles.refresh_windows(db)
+        print(f"Risk profile windows refreshed: {active_users} users active in the last {risk_profiles.RISK_WINDOW_DAYS} days.")
+        return {"active_users": active_users}
+    finally:
+        db.close()
+
+@celery_app.task
+def rebuild_risk_profiles():
+    """Recomputes all risk profiles from history, e.g. after a bulk import that bypassed the loaders."""
+    db = SessionLocal()
+    try:
+        return {"profiles": risk_profiles.rebuild_all(db)}
+    finally:
+        db.close()
+
+@celery_app.task
+def backfill_alert_dedup_keys():
+    """
+    Keys the oldest pre-existing alert of each user and per-user alert type (structuring,
+    graph), so alerts written before dedup keys existed still block repeats. Later
+    duplicates are left untouched, as are per-transaction and KYC alerts, whose
+    fingerprints can't be recovered.
+    """
+    db = SessionLocal()
+    try:
+        key = Alert.alert_type + ":" + Alert.user_id.cast(String)
+        keyed = Alert.__table__.alias("keyed")
+        oldest = (
+            select(func.min(Alert.id))
+            .where(Alert.dedup_key.is_(None), Alert.user_id.isnot(None), Alert.alert_type.in_(PER_USER_ALERT_TYPES))
+            .group_by(Alert.alert_type, Alert.user_id)
+        )
+        updated = db.execute(
+            Alert.__table__.update()
+            .where(Alert.id.in_(oldest), ~select(keyed.c.id).where(keyed.c.dedup_key == key).exists())
+            .values(dedup_key=key)
+        ).rowcount
+        db.commit()
+        print(f"Backfilled dedup keys on {updated} alerts.")
+        return {"alerts_keyed": updated}
+    finally:
+        db.close()
+
+# --- NEW TASKS FOR THE AI ADVISOR ---
+@celery_app.task(tracked_job=True)
 def explain_risk_task(user_id: int):
     """A Celery task that synthesizes evidence and gets an AI risk explanation."""
     db = SessionLocal()
@@ -248,11 +496,11 @@ def explain_risk_task(user_id: int):
         user = db.query(User).filter(User.id == user_id).first()
         if not user: return {"error": "User not found."}
         evidence = advisor.synthesize_user_evidence(db, user)
-        return explain_risk_profile(evidence)
+        return advisor.run_advisor_action("explain", evidence, llm.generate_text)
     finally:
         db.close()
 
-@celery_app.task
+@celery_app.task(tracked_job=True)
 def generate_sar_task(user_id: int):
     """A Celery task that synthesizes evidence and generates a SAR draft."""
     db = SessionLocal()
@@ -260,6 +508,33 @@ def generate_sar_task(user_id: int):
         user = db.query(User).filter(User.id == user_id).first()
         if not user: return {"error": "User not found."}
         evidence = advisor.synthesize_user_evidence(db, user)
-        return generate_sar_draft(evidence)
+        return advisor.run_advisor_action("sar", evidence, llm.generate_text)
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@celery_app.task(tracked_job=True)
+def advisor_sweep(action: str, jobs: dict):
+    """
+    Runs one advisor action ("explain" or "sar") for many users from a single worker
+    slot, issuing the LLM calls concurrently on an event loop. `jobs` maps job IDs to
+    user IDs; each result is stored under its own job ID for /api/v1/results/{job_id}.
+    """
+    db = SessionLocal()
+    try:
+        users = db.query(User).filter(User.id.in_(set(jobs.values()))).all()
+        evidence_by_user = advisor.synthesize_users_evidence(db, users)
+    finally:
+        db.close()
+
+    for job_id in jobs:
+        celery_app.backend.store_result(job_id, None, "STARTED")
+        job_events.publish(job_id, "STARTED")
+
+    def store(job_id, result):
+        celery_app.backend.store_result(job_id, result, "SUCCESS")
+        job_events.publish(job_id, "SUCCESS")
+
+    results = asyncio.run(advisor.run_sweep(action, jobs, evidence_by_user, store, ADVISOR_CONCURRENCY, ADVISOR_SWEEP_REQUESTS_PER_MINUTE))
+    failed = sum(1 for result in results if "error" in result)
+    print(f"Advisor sweep '{action}' finished: {len(results)} jobs, {failed} failed.")
+    return {"jobs": len(results), "failed": failed}
@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from app.database import SessionLocal
+from app.models import Alert, User
+
+# Measures requests/sec and latency percentiles of the hot read endpoints (user
+# list, user detail, user alerts, job results) against a running API, by keeping
+# --concurrency requests in flight for --duration seconds. Run it before and after
+# an API change, against the same database and server settings, to compare.
+#
+#   uvicorn app.main:app --port 8000 --workers 1
+#   python bench_api_load.py --url http://localhost:8000 --concurrency 64 --duration 30
+
+ENDPOINTS = ("users", "user", "alerts", "results")
+
+
+def sample_ids(count: int):
+    """Random user ids (preferring users with alerts) from the database in DATABASE_URL."""
+    db = SessionLocal()
+    try:
+        alerted = [user_id for (user_id,) in db.query(Alert.user_id).distinct().limit(count)]
+        users = [user_id for (user_id,) in db.query(User.id).order_by(User.id.desc()).limit(count)]
+    finally:
+        db.close()
+    return alerted or users, users
+
+
+def request_path(endpoint: str, alerted: list, users: list) -> str:
+    if endpoint == "users":
+        return f"/api/v1/users?limit=50&sort={random.choice(['id', 'risk'])}"
+    if endpoint == "user":
+        return f"/api/v1/users/{random.choice(users)}"
+    if endpoint == "alerts":
+        return f"/api/v1/users/{random.choice(alerted)}/alerts"
+    return f"/api/v1/results/bench-{random.randrange(1_000_000)}"
+
+
+async def worker(client: httpx.AsyncClient, endpoints: list, alerted: list, users: list, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        path = request_path(random.choice(endpoints), alerted, users)
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def run_benchmark(url: str, endpoints: list, concurrency: int, duration: float, warmup: float) -> dict:
+    alerted, users = sample_ids(1000)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        if warmup:
+            deadline = time.perf_counter() + warmup
+            await asyncio.gather(*(worker(client, endpoints, alerted, users, deadline, [], []) for _ in range(concurrency)))
+        latencies, errors = [], []
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(worker(client, endpoints, alerted, users, deadline, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    stats = {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+    print(
+        f"[{','.join(endpoints)}] c={concurrency}: {stats['requests']} requests in {elapsed:.1f}s -> "
+        f"{stats['rps']:,.0f} req/sec, p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms, {stats['errors']} errors"
+    )
+    if errors:
+        print(f"  first errors: {errors[:5]}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the read endpoints of a running API.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoints", default="all", help=f"Comma-separated subset of {', '.join(ENDPOINTS)}, or 'all'")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--each", action="store_true", help="Also run every endpoint on its own")
+    args = parser.parse_args()
+
+    endpoints = list(ENDPOINTS) if args.endpoints == "all" else args.endpoints.split(",")
+    asyncio.run(run_benchmark(args.url, endpoints, args.concurrency, args.duration, args.warmup))
+    if args.each and len(endpoints) > 1:
+        for endpoint in endpoints:
+            asyncio.run(run_benchmark(args.url, [endpoint], args.concurrency, args.duration, args.warmup))
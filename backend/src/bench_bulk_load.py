@@ -0,0 +1,79 @@
+import argparse
+import random
+import time
+
+from app.database import SessionLocal
+from app.models import GraphEdge, User, Transaction, UserRiskProfile
+from app import bulk_loader
+
+# Measures ingestion throughput (rows/sec) of the bulk-load engine against the
+# database in DATABASE_URL. Benchmark accounts are prefixed with "BENCH" and are
+# deleted afterwards unless --keep is passed.
+#
+#   python bench_bulk_load.py --rows 1000000 --chunk-size 50000
+#   python bench_bulk_load.py --rows 50000 --engine orm
+
+
+def synthetic_rows(num_rows: int, num_accounts: int):
+    accounts = [f"BENCH{i}" for i in range(num_accounts)]
+    for i in range(num_rows):
+        sender, receiver = random.sample(accounts, 2)
+        yield {
+            "Debit_Account": sender,
+            "Credit_Account": receiver,
+            "Amount": f"{random.uniform(100, 80000):.2f}",
+            "Currency": "INR",
+            "Description": "Benchmark Transfer",
+        }
+
+
+def run_benchmark(num_rows: int, num_accounts: int, chunk_size: int, engine: str) -> float:
+    load = bulk_loader._load_chunk_copy if engine == "copy" else bulk_loader._load_chunk_orm
+    db = SessionLocal()
+    user_map = {}
+    batch_id = f"bench-{engine}-{int(time.time())}"
+    inserted = 0
+    try:
+        rows = list(synthetic_rows(num_rows, num_accounts))
+        started = time.perf_counter()
+        for offset in range(0, num_rows, chunk_size):
+            inserted += load(db, rows[offset:offset + chunk_size], user_map, batch_id, bulk_loader.DEFAULT_SOURCE)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    rate = inserted / elapsed if elapsed else 0.0
+    print(f"[{engine}] inserted {inserted} rows in {elapsed:.2f}s -> {rate:,.0f} rows/sec")
+    return rate
+
+
+def cleanup():
+    db = SessionLocal()
+    try:
+        bench_ids = db.query(User.id).filter(User.full_name.like("BENCH%"))
+        db.query(Transaction).filter(Transaction.from_user_id.in_(bench_ids)).delete(synchronize_session=False)
+        # Both load paths also maintain graph edges and risk profiles, which reference the users
+        db.query(GraphEdge).filter(GraphEdge.from_user_id.in_(bench_ids) | GraphEdge.to_user_id.in_(bench_ids)).delete(synchronize_session=False)
+        db.query(UserRiskProfile).filter(UserRiskProfile.user_id.in_(bench_ids)).delete(synchronize_session=False)
+        db.query(User).filter(User.full_name.like("BENCH%")).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load throughput benchmark.")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--accounts", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--engine", choices=["copy", "orm", "both"], default="both")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark rows instead of deleting them.")
+    args = parser.parse_args()
+
+    engines = ["copy", "orm"] if args.engine == "both" else [args.engine]
+    for engine in engines:
+        try:
+            run_benchmark(args.rows, args.accounts, args.chunk_size, engine)
+        finally:
+            if not args.keep:
+                cleanup()
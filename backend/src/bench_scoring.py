@@ -0,0 +1,75 @@
+import argparse
+import time
+
+import numpy as np
+
+from app import ml_inference
+
+# Compares per-row scoring (score_transaction in a Python loop) with the batched
+# score_transactions API. Uses the trained models in /code/models, or with
+# --synthetic fits throwaway models on random amounts so it runs anywhere.
+#
+#   python bench_scoring.py --rows 20000 --per-row-rows 500
+
+
+def fit_synthetic_models():
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+    from tensorflow.keras.models import Model
+    from tensorflow.keras.layers import Input, Dense
+
+    training_amounts = np.random.uniform(100, 80000, size=(5000, 1))
+    scaler = StandardScaler().fit(training_amounts)
+    scaled = scaler.transform(training_amounts)
+    iso_forest = IsolationForest(contamination='auto', random_state=42).fit(scaled)
+
+    input_layer = Input(shape=(1,))
+    encoder = Dense(1, activation="relu")(input_layer)
+    decoder = Dense(1, activation='sigmoid')(encoder)
+    autoencoder = Model(inputs=input_layer, outputs=decoder)
+    autoencoder.compile(optimizer='adam', loss='mean_squared_error')
+    autoencoder.fit(scaled, scaled, epochs=1, batch_size=256, verbose=0)
+
+    ml_inference.SCALER, ml_inference.ISO_FOREST, ml_inference.AUTOENCODER = scaler, iso_forest, autoencoder
+    ml_inference.MODELS_LOADED = True
+
+
+def time_per_row(amounts: np.ndarray) -> float:
+    started = time.perf_counter()
+    for amount in amounts:
+        ml_inference.score_transaction(float(amount))
+    return time.perf_counter() - started
+
+
+def time_batched(amounts: np.ndarray, batch_size: int) -> float:
+    started = time.perf_counter()
+    ml_inference.score_transactions(amounts, batch_size=batch_size)
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-row vs batched anomaly scoring throughput.")
+    parser.add_argument("--rows", type=int, default=100000, help="Amounts scored by the batched API.")
+    parser.add_argument("--per-row-rows", type=int, default=1000, help="Amounts scored one at a time (this path is slow).")
+    parser.add_argument("--batch-size", type=int, default=ml_inference.SCORING_BATCH_SIZE)
+    parser.add_argument("--synthetic", action="store_true", help="Fit throwaway models instead of loading the trained ones.")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        fit_synthetic_models()
+    elif not ml_inference.load_models_lazily():
+        raise SystemExit("Trained models not found. Run train_models.py first or pass --synthetic.")
+
+    amounts = np.random.uniform(100, 500000, size=args.rows)
+    # Warm up both paths so model initialisation isn't counted.
+    ml_inference.score_transactions(amounts[:args.batch_size], batch_size=args.batch_size)
+    ml_inference.score_transaction(float(amounts[0]))
+
+    per_row_elapsed = time_per_row(amounts[:args.per_row_rows])
+    batched_elapsed = time_batched(amounts, args.batch_size)
+
+    per_row_rate = args.per_row_rows / per_row_elapsed
+    batched_rate = args.rows / batched_elapsed
+    print(f"per-row : {args.per_row_rows} rows in {per_row_elapsed:.2f}s -> {per_row_rate:,.0f} rows/sec")
+    print(f"batched : {args.rows} rows in {batched_elapsed:.2f}s -> {batched_rate:,.0f} rows/sec (batch size {args.batch_size})")
+    print(f"speedup : {batched_rate / per_row_rate:,.1f}x")
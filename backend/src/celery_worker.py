@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import task_failure, task_postrun, task_prerun, task_revoked, task_success, worker_process_init
 import os
 from dotenv import load_dotenv
 
@@ -14,4 +15,83 @@ celery_app = Celery(
 
 celery_app.conf.update(
     task_track_started=True,
-)
\ No newline at end of file
+    # LLM enrichment runs on its own queue so slow model calls never delay alerting.
+    task_routes={"app.tasks.enrich_alert_summaries": {"queue": "enrichment"}},
+)
+
+# Republish the graph snapshot periodically so single transactions posted through
+# the API (which only touch `graph_edges`) reach graph jobs too, and scan the whole
+# graph for rings on a slower cadence. Pending alert summaries are enriched in batches,
+# and users marked dirty by live transactions get one coalesced rule evaluation.
+celery_app.conf.beat_schedule = {
+    "refresh-graph-snapshot": {
+        "task": "app.tasks.refresh_graph_snapshot",
+        "schedule": float(os.getenv("GRAPH_SNAPSHOT_REFRESH_SECONDS", 300)),
+    },
+    "detect-graph-rings": {
+        "task": "app.tasks.detect_graph_rings",
+        "schedule": float(os.getenv("RING_SCAN_INTERVAL_SECONDS", 3600)),
+    },
+    "refresh-risk-profiles": {
+        "task": "app.tasks.refresh_risk_profiles",
+        "schedule": float(os.getenv("RISK_PROFILE_REFRESH_SECONDS", 3600)),
+    },
+    "evaluate-dirty-users": {
+        "task": "app.tasks.evaluate_dirty_users",
+        "schedule": float(os.getenv("RULE_EVALUATION_INTERVAL_SECONDS", 10)),
+    },
+    "enrich-alert-summaries": {
+        "task": "app.tasks.enrich_alert_summaries",
+        "schedule": float(os.getenv("ENRICH_INTERVAL_SECONDS", 30)),
+    },
+}
+
+@worker_process_init.connect
+def reset_database_pool(**kwargs):
+    """Gives each forked worker process its own connection pool instead of the parent's sockets."""
+    from app import database
+    database.reset_after_fork()
+
+@task_postrun.connect
+def publish_pool_metrics(**kwargs):
+    from app import database
+    database.publish_pool_metrics("worker")
+
+@worker_process_init.connect
+def map_graph_snapshot(**kwargs):
+    """Maps the current graph snapshot read-only in each worker process at startup."""
+    from app import graph_store
+    try:
+        graph_store.load_snapshot()
+    except Exception as e:
+        print(f"Could not map graph snapshot at startup: {e}")
+
+# State transitions of job tasks are pushed to /api/v1/jobs/{job_id}/events subscribers.
+# Job tasks are the ones declared with tracked_job=True, whose task ID the API hands
+# out as a job ID (uploads, analyses, sweeps); beat and internal tasks publish nothing.
+def _is_job(task) -> bool:
+    return getattr(task, "tracked_job", False)
+
+@task_prerun.connect
+def publish_task_started(task_id=None, task=None, **kwargs):
+    if _is_job(task):
+        from app import job_events
+        job_events.publish(task_id, "STARTED")
+
+@task_success.connect
+def publish_task_succeeded(sender=None, **kwargs):
+    if _is_job(sender):
+        from app import job_events
+        job_events.publish(sender.request.id, "SUCCESS")
+
+@task_failure.connect
+def publish_task_failed(sender=None, task_id=None, exception=None, **kwargs):
+    if _is_job(sender):
+        from app import job_events
+        job_events.publish(task_id, "FAILURE", error=str(exception))
+
+@task_revoked.connect
+def publish_task_revoked(sender=None, request=None, **kwargs):
+    if _is_job(sender):
+        from app import job_events
+        job_events.publish(request.id, "REVOKED")
@@ -0,0 +1,40 @@
+import argparse
+import asyncio
+import hashlib
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+# A stand-in for the Gemini generateContent REST endpoint, with configurable latency.
+# Point the async advisor path at it to exercise concurrency without a real key:
+#
+#   python fake_llm_server.py --port 8090 --latency 0.5
+#   GEMINI_API_BASE=http://localhost:8090 celery -A celery_worker.celery_app worker ...
+
+app = FastAPI(title="Fake LLM")
+app.state.latency = 0.5
+app.state.requests = 0
+
+
+@app.post("/v1beta/models/{model}:generateContent")
+async def generate_content(model: str, request: Request):
+    body = await request.json()
+    prompt = "".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+    app.state.requests += 1
+    await asyncio.sleep(app.state.latency)
+    digest = hashlib.sha256(prompt.encode()).hexdigest()[:12]
+    return {"candidates": [{"content": {"parts": [{"text": f"[{model} fake response {digest}] {len(prompt)} prompt characters received."}]}}]}
+
+
+@app.get("/stats")
+def stats():
+    return {"requests": app.state.requests, "latency": app.state.latency}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Gemini generateContent server.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds to wait before answering each request.")
+    args = parser.parse_args()
+    app.state.latency = args.latency
+    uvicorn.run(app, host="0.0.0.0", port=args.port)
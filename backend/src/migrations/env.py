@@ -0,0 +1,33 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from app import models  # noqa: F401 - registers every table on Base.metadata
+from app.database import Base, engine
+
+# Migrations run on the application's own engine (DATABASE_URL), so there is a
+# single place to configure the connection.
+
+if context.config.config_file_name is not None:
+    fileConfig(context.config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    context.configure(url=engine.url.render_as_string(hide_password=False), target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,89 @@
+"""Baseline schema: users, transactions, alerts, watchlist and graph analysis results
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+Databases created before migrations existed already have these tables; run
+`alembic stamp 0001` on them instead of upgrading through this revision.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("full_name", sa.String()),
+        sa.Column("email", sa.String()),
+        sa.Column("country", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_users_full_name", "users", ["full_name"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "transactions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("currency", sa.String()),
+        sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("description", sa.String()),
+        sa.Column("to_user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("from_user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+    )
+    op.create_index("ix_transactions_timestamp", "transactions", ["timestamp"])
+    op.create_index("ix_transactions_to_user_id", "transactions", ["to_user_id"])
+    op.create_index("ix_transactions_from_user_id", "transactions", ["from_user_id"])
+
+    op.create_table(
+        "alerts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("alert_type", sa.String()),
+        sa.Column("message", sa.String()),
+        sa.Column("ai_summary", sa.String(), nullable=True),
+        sa.Column("status", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+    )
+    op.create_index("ix_alerts_alert_type", "alerts", ["alert_type"])
+    op.create_index("ix_alerts_status", "alerts", ["status"])
+    op.create_index("ix_alerts_user_id", "alerts", ["user_id"])
+
+    op.create_table(
+        "watchlist",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("reason", sa.String()),
+    )
+    op.create_index("ix_watchlist_name", "watchlist", ["name"], unique=True)
+
+    op.create_table(
+        "graph_analysis_results",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("job_id", sa.String()),
+        sa.Column("status", sa.String()),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("findings", postgresql.JSONB()),
+        sa.Column("ai_explanation", sa.String(), nullable=True),
+        sa.Column("plot_data", postgresql.JSONB(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_graph_analysis_results_job_id", "graph_analysis_results", ["job_id"], unique=True)
+    op.create_index("ix_graph_analysis_results_user_id", "graph_analysis_results", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_table("graph_analysis_results")
+    op.drop_table("watchlist")
+    op.drop_table("alerts")
+    op.drop_table("transactions")
+    op.drop_table("users")
@@ -0,0 +1,23 @@
+"""Tag transactions with the ingestion batch that created them
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("transactions", sa.Column("ingestion_batch_id", sa.String(), nullable=True))
+    op.create_index("ix_transactions_ingestion_batch_id", "transactions", ["ingestion_batch_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_ingestion_batch_id", table_name="transactions")
+    op.drop_column("transactions", "ingestion_batch_id")
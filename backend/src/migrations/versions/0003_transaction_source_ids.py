@@ -0,0 +1,32 @@
+"""Source transaction IDs, ingestion time and the idempotent-ingest unique index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+uq_transactions_source_external_id is the ON CONFLICT (source, external_id)
+target of the bulk loader's staging merge.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("transactions", sa.Column("ingested_at", sa.DateTime(timezone=True), server_default=sa.func.now()))
+    op.add_column("transactions", sa.Column("source", sa.String(), nullable=True))
+    op.add_column("transactions", sa.Column("external_id", sa.String(), nullable=True))
+    # Existing rows were stamped at insert time, which is the best ingestion time available
+    op.execute("UPDATE transactions SET ingested_at = timestamp WHERE timestamp IS NOT NULL")
+    op.create_index("uq_transactions_source_external_id", "transactions", ["source", "external_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("uq_transactions_source_external_id", table_name="transactions")
+    op.drop_column("transactions", "external_id")
+    op.drop_column("transactions", "source")
+    op.drop_column("transactions", "ingested_at")
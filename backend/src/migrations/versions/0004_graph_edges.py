@@ -0,0 +1,40 @@
+"""Aggregated graph_edges table
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+The (from_user_id, to_user_id) primary key is the ON CONFLICT target of
+graph_store.record_edges. Existing transactions are aggregated into it here.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "graph_edges",
+        sa.Column("from_user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("to_user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("tx_count", sa.Integer(), nullable=False),
+        sa.Column("total_amount", sa.Float(), nullable=False),
+        sa.Column("first_seen", sa.DateTime(timezone=True)),
+        sa.Column("last_seen", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_graph_edges_to_user_id", "graph_edges", ["to_user_id"])
+    op.execute("""
+        INSERT INTO graph_edges (from_user_id, to_user_id, tx_count, total_amount, first_seen, last_seen)
+        SELECT from_user_id, to_user_id, count(*), sum(amount), min(timestamp), max(timestamp)
+        FROM transactions
+        WHERE from_user_id IS NOT NULL AND to_user_id IS NOT NULL AND from_user_id <> to_user_id
+        GROUP BY from_user_id, to_user_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table("graph_edges")
@@ -0,0 +1,25 @@
+"""Alert summary enrichment status
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("alerts", sa.Column("summary_status", sa.String()))
+    # Alerts from before deferred enrichment already carry their LLM summary
+    op.execute("UPDATE alerts SET summary_status = CASE WHEN ai_summary IS NULL THEN 'PENDING' ELSE 'ENRICHED' END")
+    op.create_index("ix_alerts_summary_status", "alerts", ["summary_status"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_alerts_summary_status", table_name="alerts")
+    op.drop_column("alerts", "summary_status")
@@ -0,0 +1,47 @@
+"""Precomputed per-user risk profiles
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+The user_id primary key is the ON CONFLICT target of the incremental profile
+updates. Profiles for existing users are filled by the rebuild_risk_profiles task.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_risk_profiles",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("total_alerts", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("open_alerts", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("kyc_flag_alerts", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("structuring_payment_alerts", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("structuring_deposit_alerts", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("ml_anomaly_alerts", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("graph_cycle_alerts", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("graph_layering_alerts", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("last_alert_at", sa.DateTime(timezone=True)),
+        sa.Column("tx_in_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("tx_in_amount", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("tx_out_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("tx_out_amount", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("last_tx_at", sa.DateTime(timezone=True)),
+        sa.Column("window_tx_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("window_in_amount", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("window_out_amount", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("risk_score", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_user_risk_profiles_risk_score", "user_risk_profiles", ["risk_score"])
+
+
+def downgrade() -> None:
+    op.drop_table("user_risk_profiles")
@@ -0,0 +1,30 @@
+"""Keyset indexes for the users listing
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_users_country_id", "users", ["country", "id"])
+    # LIKE 'abc%' on lower(full_name) needs pattern ops outside the C locale
+    op.create_index("ix_users_full_name_lower", "users", [sa.text("lower(full_name) text_pattern_ops")])
+    op.create_index("ix_user_risk_profiles_risk_score_user_id", "user_risk_profiles", ["risk_score", "user_id"])
+    op.create_index("ix_user_risk_profiles_total_alerts_user_id", "user_risk_profiles", ["total_alerts", "user_id"])
+    op.drop_index("ix_user_risk_profiles_risk_score", table_name="user_risk_profiles") # Covered by the composite index
+
+
+def downgrade() -> None:
+    op.create_index("ix_user_risk_profiles_risk_score", "user_risk_profiles", ["risk_score"])
+    op.drop_index("ix_user_risk_profiles_total_alerts_user_id", table_name="user_risk_profiles")
+    op.drop_index("ix_user_risk_profiles_risk_score_user_id", table_name="user_risk_profiles")
+    op.drop_index("ix_users_full_name_lower", table_name="users")
+    op.drop_index("ix_users_country_id", table_name="users")
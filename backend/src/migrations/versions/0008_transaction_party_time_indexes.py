@@ -0,0 +1,27 @@
+"""Per-party (user, timestamp, id) indexes for transaction history pages
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_transactions_to_user_id_timestamp_id", "transactions", ["to_user_id", "timestamp", "id"])
+    op.create_index("ix_transactions_from_user_id_timestamp_id", "transactions", ["from_user_id", "timestamp", "id"])
+    # Their leading columns serve plain lookups by either party
+    op.drop_index("ix_transactions_to_user_id", table_name="transactions")
+    op.drop_index("ix_transactions_from_user_id", table_name="transactions")
+
+
+def downgrade() -> None:
+    op.create_index("ix_transactions_from_user_id", "transactions", ["from_user_id"])
+    op.create_index("ix_transactions_to_user_id", "transactions", ["to_user_id"])
+    op.drop_index("ix_transactions_from_user_id_timestamp_id", table_name="transactions")
+    op.drop_index("ix_transactions_to_user_id_timestamp_id", table_name="transactions")
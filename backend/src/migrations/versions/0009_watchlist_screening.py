@@ -0,0 +1,36 @@
+"""Watchlist change tracking and stored screening matches
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("watchlist", sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()))
+    op.create_index("ix_watchlist_updated_at", "watchlist", ["updated_at"])
+    op.create_table(
+        "watchlist_matches",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("watchlist_id", sa.Integer(), sa.ForeignKey("watchlist.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("matched_name", sa.String()),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.Column("screened_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    # One stored match per (user, entry)
+    op.create_index("ix_watchlist_matches_user_id_watchlist_id", "watchlist_matches", ["user_id", "watchlist_id"], unique=True)
+    op.create_index("ix_watchlist_matches_watchlist_id", "watchlist_matches", ["watchlist_id"])
+
+
+def downgrade() -> None:
+    op.drop_table("watchlist_matches")
+    op.drop_index("ix_watchlist_updated_at", table_name="watchlist")
+    op.drop_column("watchlist", "updated_at")
@@ -0,0 +1,39 @@
+"""Alert dedup keys and sweep checkpoints
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+
+The unique constraint on alerts.dedup_key is the ON CONFLICT (dedup_key)
+target of the deduplicating alert writers. Existing alerts keep a NULL key,
+which never conflicts.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("alerts", sa.Column("dedup_key", sa.String(), nullable=True))
+    op.create_unique_constraint("alerts_dedup_key_key", "alerts", ["dedup_key"])
+    op.create_table(
+        "sweep_checkpoints",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("job_id", sa.String(), nullable=True),
+        sa.Column("last_user_id", sa.Integer(), nullable=False),
+        sa.Column("users_checked", sa.Integer(), nullable=False),
+        sa.Column("alerts_created", sa.Integer(), nullable=False),
+        sa.Column("started_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("sweep_checkpoints")
+    op.drop_constraint("alerts_dedup_key_key", "alerts", type_="unique")
+    op.drop_column("alerts", "dedup_key")
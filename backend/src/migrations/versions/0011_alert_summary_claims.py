@@ -0,0 +1,25 @@
+"""Alert summary claims
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17
+
+Enrichment runs mark the alerts they take as CLAIMED and record when, so a
+claim left by a crashed worker can be taken over after a timeout.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("alerts", sa.Column("summary_claimed_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.execute("UPDATE alerts SET summary_status = 'PENDING' WHERE summary_status = 'CLAIMED'")
+    op.drop_column("alerts", "summary_claimed_at")
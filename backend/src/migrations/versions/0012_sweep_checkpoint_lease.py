@@ -0,0 +1,27 @@
+"""Sweep checkpoint lease
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17
+
+The run advancing a sweep checkpoint holds a renewable lease on it, so a
+second copy of the sweep task (e.g. a broker redelivery) can't advance the
+same checkpoint at the same time.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("sweep_checkpoints", sa.Column("lease_owner", sa.String(), nullable=True))
+    op.add_column("sweep_checkpoints", sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("sweep_checkpoints", "lease_expires_at")
+    op.drop_column("sweep_checkpoints", "lease_owner")
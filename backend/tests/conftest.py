@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+# app.database and celery_worker read their settings at import time, so point them
+# at a throwaway SQLite file and an in-memory broker before anything imports them.
+_tmp_dir = tempfile.mkdtemp(prefix="aml-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/test.db"
+os.environ["CELERY_BROKER_URL"] = "memory://"
+os.environ["CELERY_RESULT_BACKEND"] = "cache+memory://"
+os.environ["REDIS_URL"] = "memory://" # No Redis: caches fall back to process-local ones
+os.environ.setdefault("GRAPH_SNAPSHOT_DIR", os.path.join(_tmp_dir, "graph"))
+
+import pytest
+
+from app import models # noqa: F401 (registers the tables)
+from app.database import Base, SessionLocal, engine
+
+# graph_analysis_results stores JSONB, which only PostgreSQL has
+SQLITE_TABLES = [table for table in Base.metadata.sorted_tables if table.name != "graph_analysis_results"]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.create_all(engine, tables=SQLITE_TABLES)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    """A session on an empty database; every table is cleared afterwards."""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(SQLITE_TABLES):
+            session.execute(table.delete())
+        session.commit()
+        session.close()
@@ -0,0 +1,90 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import alert_summaries, llm
+from app.database import SessionLocal
+from app.models import Alert, User
+
+
+def add_alerts(db, count, **values):
+    user = User(full_name="Alerted User", email=f"alerted{db.query(User).count()}@example.com")
+    db.add(user)
+    db.flush()
+    alerts = [Alert(user_id=user.id, alert_type="KYC_FLAG", message=f"reason {i}", ai_summary="template", **values) for i in range(count)]
+    db.add_all(alerts)
+    db.commit()
+    return [alert.id for alert in alerts]
+
+
+def statuses(ids):
+    db = SessionLocal()
+    try:
+        return {alert.id: alert.summary_status for alert in db.query(Alert).filter(Alert.id.in_(ids))}
+    finally:
+        db.close()
+
+
+def test_claims_are_committed_before_the_model_call(db, monkeypatch):
+    ids = add_alerts(db, 3)
+    seen_during_call = {}
+
+    def generate_text(prompt):
+        seen_during_call.update(statuses(ids))
+        return json.dumps([{"id": ids[0], "summary": "High risk."}, {"id": ids[1], "summary": "Low risk."}])
+
+    monkeypatch.setattr(llm, "generate_text", generate_text)
+
+    assert alert_summaries.enrich_next_batch(db) == 3
+    assert set(seen_during_call.values()) == {alert_summaries.SUMMARY_CLAIMED}
+    assert statuses(ids) == {
+        ids[0]: alert_summaries.SUMMARY_ENRICHED,
+        ids[1]: alert_summaries.SUMMARY_ENRICHED,
+        ids[2]: alert_summaries.SUMMARY_SKIPPED,
+    }
+    assert db.get(Alert, ids[0]).ai_summary == "High risk."
+    assert alert_summaries.enrich_next_batch(db) == 0
+
+
+def test_failed_call_releases_the_claim(db, monkeypatch):
+    ids = add_alerts(db, 2)
+
+    def generate_text(prompt):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(llm, "generate_text", generate_text)
+
+    with pytest.raises(RuntimeError):
+        alert_summaries.enrich_next_batch(db)
+    assert set(statuses(ids).values()) == {alert_summaries.SUMMARY_PENDING}
+
+
+def test_only_timed_out_claims_are_taken_over(db):
+    old = datetime.now() - timedelta(seconds=alert_summaries.ENRICH_CLAIM_TIMEOUT_SECONDS + 60)
+    abandoned = add_alerts(db, 2, summary_status=alert_summaries.SUMMARY_CLAIMED, summary_claimed_at=old)
+    in_progress = add_alerts(db, 2, summary_status=alert_summaries.SUMMARY_CLAIMED, summary_claimed_at=datetime.now())
+
+    _, claimed = alert_summaries.claim_batch(db)
+
+    assert [alert.id for alert in claimed] == abandoned
+    assert set(in_progress).isdisjoint(alert.id for alert in claimed)
+
+
+def test_results_of_a_taken_over_claim_are_dropped(db, monkeypatch):
+    ids = add_alerts(db, 1)
+
+    def generate_text(prompt):
+        # Another run takes the claim over while this call is slow
+        other = SessionLocal()
+        try:
+            other.query(Alert).filter(Alert.id == ids[0]).update({"summary_claimed_at": datetime.now() + timedelta(seconds=1)})
+            other.commit()
+        finally:
+            other.close()
+        return json.dumps([{"id": ids[0], "summary": "Stale answer."}])
+
+    monkeypatch.setattr(llm, "generate_text", generate_text)
+
+    alert_summaries.enrich_next_batch(db)
+    assert statuses(ids) == {ids[0]: alert_summaries.SUMMARY_CLAIMED}
@@ -0,0 +1,62 @@
+import pytest
+
+from app.alerts import alert_key, upsert_alerts
+from app.models import Alert, User, UserRiskProfile
+
+
+@pytest.fixture
+def user_id(db):
+    user = User(full_name="Flagged User", email="flagged@example.com")
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def alert(user_id, alert_type="ML_ANOMALY", *fingerprint, key=True):
+    return Alert(user_id=user_id, alert_type=alert_type, message=f"{alert_type} {fingerprint}", dedup_key=alert_key(alert_type, user_id, *fingerprint) if key else None)
+
+
+def test_alert_key_includes_the_fingerprint():
+    assert alert_key("KYC_FLAG", 7) == "KYC_FLAG:7"
+    assert alert_key("ML_ANOMALY", 7, 1234) == "ML_ANOMALY:7:1234"
+
+
+def test_repeat_findings_are_inserted_once(db, user_id):
+    first = upsert_alerts(db, [alert(user_id, "ML_ANOMALY", 1), alert(user_id, "ML_ANOMALY", 2), alert(user_id, "GRAPH_CYCLE")])
+    db.commit()
+    second = upsert_alerts(db, [alert(user_id, "ML_ANOMALY", 2), alert(user_id, "ML_ANOMALY", 3), alert(user_id, "GRAPH_CYCLE")])
+    db.commit()
+
+    assert len(first) == 3
+    assert [(row.alert_type, row.status) for row in second] == [("ML_ANOMALY", "OPEN")]
+    assert sorted(key for (key,) in db.query(Alert.dedup_key)) == [f"GRAPH_CYCLE:{user_id}"] + [f"ML_ANOMALY:{user_id}:{n}" for n in (1, 2, 3)]
+
+
+def test_duplicates_within_a_batch_collapse_to_the_first(db, user_id):
+    inserted = upsert_alerts(db, [alert(user_id, "GRAPH_CYCLE"), alert(user_id, "GRAPH_CYCLE")])
+    db.commit()
+
+    assert len(inserted) == 1
+    assert db.query(Alert).count() == 1
+    assert db.query(Alert).one().summary_status == "PENDING"
+
+
+def test_unkeyed_alerts_never_conflict(db, user_id):
+    upsert_alerts(db, [alert(user_id, key=False), alert(user_id, key=False)])
+    upsert_alerts(db, [alert(user_id, key=False)])
+    db.commit()
+
+    assert db.query(Alert).count() == 3
+
+
+def test_only_inserted_alerts_reach_the_risk_profile(db, user_id):
+    for _ in range(3):
+        upsert_alerts(db, [alert(user_id, "GRAPH_CYCLE"), alert(user_id, "ML_ANOMALY", 1)])
+        db.commit()
+
+    profile = db.get(UserRiskProfile, user_id)
+    assert (profile.total_alerts, profile.graph_cycle_alerts, profile.ml_anomaly_alerts) == (2, 1, 1)
+
+
+def test_nothing_to_insert(db):
+    assert upsert_alerts(db, []) == []
@@ -0,0 +1,118 @@
+import random
+from datetime import datetime, timedelta
+
+from app import aml_rules
+from app.models import Transaction, User
+
+BATCH = "batch-1"
+
+
+def add_users(db, count):
+    users = [User(full_name=f"User {i}", email=f"user{i}@example.com", country="IN") for i in range(count)]
+    db.add_all(users)
+    db.flush()
+    return users
+
+
+def add_transaction(db, sender, receiver, amount, timestamp, batch_id=BATCH):
+    db.add(Transaction(from_user_id=sender.id, to_user_id=receiver.id, amount=amount, timestamp=timestamp, ingestion_batch_id=batch_id))
+
+
+def test_batch_rules_find_structuring_days_before_the_batch_ends(db):
+    # A multi-day upload: the structuring burst is ten days before the batch's latest
+    # transaction, so a single window ending at that transaction would miss it.
+    lieutenant, mule, shopper, shop = add_users(db, 4)
+    now = datetime.now()
+    burst = now - timedelta(days=10)
+    for hours in (0, 6, 20, 40):
+        add_transaction(db, lieutenant, mule, 45000, burst + timedelta(hours=hours))
+    for days in (1, 5, 9, 14, 19):
+        add_transaction(db, shopper, shop, 42000, now - timedelta(days=days)) # In band, but spread out
+    add_transaction(db, shopper, shop, 500, now)
+    db.commit()
+
+    findings = aml_rules.evaluate_structuring_for_batch(db, BATCH, [lieutenant.id, mule.id, shopper.id, shop.id])
+
+    assert set(findings) == {lieutenant.id, mule.id}
+    assert set(findings[mule.id]) == {aml_rules.STRUCTURING_DEPOSIT}
+    assert set(findings[lieutenant.id]) == {aml_rules.STRUCTURING_PAYMENT}
+    message = findings[mule.id][aml_rules.STRUCTURING_DEPOSIT]
+    assert "received 4 deposits totaling ₹180,000.00" in message
+    assert f"up to {burst + timedelta(hours=40):%Y-%m-%d %H:%M}" in message
+
+
+def test_batch_rules_count_earlier_transactions_in_the_window(db):
+    sender, receiver = add_users(db, 2)
+    start = datetime.now() - timedelta(days=3)
+    for hours in (0, 10, 20):
+        add_transaction(db, sender, receiver, 48000, start + timedelta(hours=hours), batch_id="earlier")
+    add_transaction(db, sender, receiver, 48000, start + timedelta(hours=30))
+    db.commit()
+
+    findings = aml_rules.evaluate_structuring_for_batch(db, BATCH, [receiver.id], alert_types=(aml_rules.STRUCTURING_DEPOSIT,))
+
+    assert "received 4 deposits" in findings[receiver.id][aml_rules.STRUCTURING_DEPOSIT]
+
+
+def test_batch_rules_skip_windows_without_a_batch_transaction(db):
+    sender, receiver = add_users(db, 2)
+    start = datetime.now() - timedelta(days=20)
+    for hours in (0, 10, 20, 30):
+        add_transaction(db, sender, receiver, 48000, start + timedelta(hours=hours), batch_id="earlier")
+    add_transaction(db, sender, receiver, 48000, start + timedelta(days=5)) # Outside that 48h window
+    db.commit()
+
+    assert aml_rules.evaluate_structuring_for_batch(db, BATCH, [sender.id, receiver.id]) == {}
+
+
+def test_batch_rules_report_the_fullest_window(db):
+    sender, receiver = add_users(db, 2)
+    start = datetime.now() - timedelta(days=8)
+    for hours in (0, 1, 2, 3, 60, 61, 62, 63, 64):
+        add_transaction(db, sender, receiver, 41000, start + timedelta(hours=hours))
+    db.commit()
+
+    findings = aml_rules.evaluate_structuring_for_batch(db, BATCH, [receiver.id], alert_types=(aml_rules.STRUCTURING_DEPOSIT,))
+
+    assert "received 5 deposits totaling ₹205,000.00" in findings[receiver.id][aml_rules.STRUCTURING_DEPOSIT]
+
+
+def test_grouped_rules_match_a_per_user_reference(db, monkeypatch):
+    monkeypatch.setattr(aml_rules, "RULE_BATCH_SIZE", 3) # Several IN (...) batches
+    rng = random.Random(7)
+    users = add_users(db, 12)
+    now = datetime.now()
+    transactions = []
+    for _ in range(300):
+        sender, receiver = rng.sample(users, 2)
+        amount = rng.choice([rng.uniform(40001, 49999), rng.uniform(100, 39000), 50000, 40000])
+        timestamp = now - timedelta(hours=rng.uniform(0, 96))
+        add_transaction(db, sender, receiver, amount, timestamp)
+        transactions.append((sender.id, receiver.id, amount, timestamp))
+    db.commit()
+
+    findings = aml_rules.evaluate_structuring_rules(db, [user.id for user in users] * 2)
+
+    expected = {}
+    cutoff = now - timedelta(hours=48)
+    for user in users:
+        for alert_type, party in ((aml_rules.STRUCTURING_PAYMENT, 0), (aml_rules.STRUCTURING_DEPOSIT, 1)):
+            hits = [tx for tx in transactions if tx[party] == user.id and 40000 < tx[2] < 50000 and tx[3] >= cutoff]
+            if len(hits) >= 4:
+                expected.setdefault(user.id, {})[alert_type] = len(hits)
+    assert {user_id: {alert_type: int(message.split()[5]) for alert_type, message in rules.items()} for user_id, rules in findings.items()} == expected
+    assert expected # The data does trip the rules
+
+
+def test_single_user_checks_use_the_grouped_engine(db):
+    sender, receiver = add_users(db, 2)
+    now = datetime.now()
+    for hours in (1, 2, 3, 4):
+        add_transaction(db, sender, receiver, 49000, now - timedelta(hours=hours))
+    add_transaction(db, sender, receiver, 49000, now - timedelta(hours=60)) # Outside the window
+    db.commit()
+
+    assert "sent 4 payments totaling ₹196,000.00 in the last 48 hours" in aml_rules.check_structuring_by_payment(db, sender)
+    assert "received 4 deposits" in aml_rules.check_structuring_by_deposit(db, receiver)
+    assert aml_rules.check_structuring_by_payment(db, receiver) is None
+    assert aml_rules.check_structuring_by_deposit(db, receiver, min_transactions=5) is None
@@ -0,0 +1,160 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from fastapi.testclient import TestClient
+
+from app import database, risk_profiles
+from app.main import app
+from app.models import Alert, Transaction, User
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client: # One event loop for the whole test, as the async engine needs
+        yield client
+
+
+def collect_pages(client, path, **params):
+    """Every item of a cursor-paginated listing, and the number of pages it took."""
+    items, pages, cursor = [], 0, None
+    while True:
+        response = client.get(path, params=dict(params, cursor=cursor) if cursor else params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        items += page["items"]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items, pages
+
+
+@pytest.fixture
+def users(db):
+    users = [User(full_name=f"{'Alice' if i % 3 == 0 else 'Bob'} {i:02d}", email=f"api{i}@example.com", country="IN" if i % 2 else "GB") for i in range(23)]
+    db.add_all(users)
+    db.flush()
+    # Users 0..9 get 1..10 alerts, so their risk scores (and alert counts) differ; 10..11 tie with 8..9
+    alerts = [Alert(user_id=users[i].id, alert_type="ML_ANOMALY", message="reason", dedup_key=f"ml:{i}:{n}") for i in range(10) for n in range(i + 1)]
+    alerts += [Alert(user_id=users[i].id, alert_type="ML_ANOMALY", message="reason", dedup_key=f"ml:{i}:{n}") for i in (10, 11) for n in range(i - 1)]
+    db.add_all(alerts)
+    db.commit()
+    risk_profiles.rebuild_all(db)
+    return [user.id for user in users]
+
+
+def test_user_pages_cover_every_user_once_in_id_order(client, users):
+    items, pages = collect_pages(client, "/api/v1/users", limit=5)
+
+    assert [item["id"] for item in items] == sorted(users)
+    assert pages == 5
+
+
+@pytest.mark.parametrize("sort, column", [("risk", "risk_score"), ("alerts", "total_alerts")])
+def test_profile_sorted_pages_break_ties_by_id(client, users, sort, column):
+    items, _ = collect_pages(client, "/api/v1/users", limit=4, sort=sort)
+
+    assert len(items) == 12 # Users without a profile are not listed
+    assert [(item[column], item["id"]) for item in items] == sorted(((item[column], item["id"]) for item in items), reverse=True)
+    assert len({item["id"] for item in items}) == 12
+
+
+def test_user_filters_apply_to_every_page(client, users):
+    items, _ = collect_pages(client, "/api/v1/users", limit=2, country="IN", q="ali")
+
+    assert items and all(item["country"] == "IN" and item["full_name"].startswith("Alice") for item in items)
+    assert len(items) == sum(1 for i in range(23) if i % 2 and i % 3 == 0)
+    assert collect_pages(client, "/api/v1/users", q="%")[0] == [] # LIKE wildcards are escaped
+
+
+def test_user_listing_rejects_bad_requests(client, users):
+    assert client.get("/api/v1/users", params={"sort": "name"}).status_code == 400
+    cursor = client.get("/api/v1/users", params={"limit": 1}).json()["next_cursor"]
+    assert client.get("/api/v1/users", params={"sort": "risk", "cursor": cursor}).status_code == 400
+
+
+@pytest.fixture
+def history(db):
+    """A user with 9 incoming and 6 outgoing transactions, some sharing a timestamp."""
+    owner, peer = User(full_name="Account Owner", email="owner@example.com", country="IN"), User(full_name="Peer", email="peer@example.com", country="IN")
+    db.add_all([owner, peer])
+    db.flush()
+    start = datetime(2026, 9, 1, 12, 0)
+    incoming = [Transaction(from_user_id=peer.id, to_user_id=owner.id, amount=100 + i, timestamp=start + timedelta(days=i // 2), description="in") for i in range(9)]
+    outgoing = [Transaction(from_user_id=owner.id, to_user_id=peer.id, amount=200 + i, timestamp=start + timedelta(days=i), description="out") for i in range(6)]
+    db.add_all(incoming + outgoing)
+    db.commit()
+    return owner.id, incoming, outgoing
+
+
+def newest_first(transactions):
+    return [tx.id for tx in sorted(transactions, key=lambda tx: (tx.timestamp, tx.id), reverse=True)]
+
+
+@pytest.mark.parametrize("direction", ["in", "out", "both"])
+def test_transaction_pages_are_newest_first_without_gaps(client, history, direction):
+    owner, incoming, outgoing = history
+    expected = newest_first({"in": incoming, "out": outgoing, "both": incoming + outgoing}[direction])
+
+    items, pages = collect_pages(client, f"/api/v1/users/{owner}/transactions", limit=4, direction=direction)
+
+    assert [item["id"] for item in items] == expected
+    assert pages == -(-len(expected) // 4)
+
+
+def test_transaction_time_bounds(client, history):
+    owner, incoming, outgoing = history
+    since, until = datetime(2026, 9, 2, 12, 0), datetime(2026, 9, 4, 12, 0)
+
+    items, _ = collect_pages(client, f"/api/v1/users/{owner}/transactions", limit=2, direction="both", since=since.isoformat(), until=until.isoformat())
+
+    assert [item["id"] for item in items] == newest_first(tx for tx in incoming + outgoing if since <= tx.timestamp < until)
+
+
+def test_transaction_listing_rejects_bad_requests(client, history):
+    owner = history[0]
+    assert client.get(f"/api/v1/users/{owner}/transactions", params={"direction": "sideways"}).status_code == 400
+    assert client.get("/api/v1/users/999999/transactions").status_code == 404
+    cursor = client.get(f"/api/v1/users/{owner}/transactions", params={"limit": 1}).json()["next_cursor"]
+    assert client.get(f"/api/v1/users/{owner}/transactions", params={"direction": "out", "cursor": cursor}).status_code == 400
+
+
+def test_user_detail_returns_aggregates_instead_of_history(client, history, db):
+    owner = history[0]
+    risk_profiles.rebuild_all(db)
+
+    detail = client.get(f"/api/v1/users/{owner}").json()
+
+    assert "transactions" not in detail
+    assert detail["full_name"] == "Account Owner"
+    assert (detail["risk_profile"]["tx_in_count"], detail["risk_profile"]["tx_out_count"]) == (9, 6)
+    assert client.get("/api/v1/users/999999").status_code == 404
+
+
+def test_user_alerts_are_newest_first(client, users, db):
+    user_id = users[3]
+    newest = db.query(Alert).filter(Alert.user_id == user_id).order_by(Alert.id.desc()).first()
+    newest.created_at = datetime.now() + timedelta(minutes=5)
+    db.commit()
+
+    alerts = client.get(f"/api/v1/users/{user_id}/alerts").json()
+
+    assert len(alerts) == 4
+    assert alerts[0]["id"] == newest.id
+    assert client.get("/api/v1/users/999999/alerts").status_code == 404
+
+
+def test_async_reads_run_concurrently_on_the_event_loop(client, users):
+    async def read_all():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as async_client:
+            paths = [f"/api/v1/users/{user_id}" for user_id in users] + [f"/api/v1/users/{user_id}/alerts" for user_id in users[:10]]
+            return await asyncio.gather(*(async_client.get(path) for path in paths))
+
+    responses = client.portal.call(read_all) # On the app's own event loop
+
+    assert [response.status_code for response in responses] == [200] * 33
+    assert "async_pool" in database.pool_metrics()
@@ -0,0 +1,47 @@
+import logging
+
+from app import bulk_loader
+from app.models import GraphEdge, Transaction, User
+
+
+def csv_rows(count, prefix="T"):
+    return [
+        {"Debit_Account": f"ACC{i % 5}", "Credit_Account": f"ACC{i % 5 + 1}", "Amount": str(100 + i),
+         "Transaction_ID": f"{prefix}{i}", "Date": "2026-10-01T10:00:00", "Description": "Transfer"}
+        for i in range(count)
+    ]
+
+
+def test_load_chunk_creates_accounts_and_transactions(db, caplog):
+    user_map = {}
+    with caplog.at_level(logging.INFO, logger=bulk_loader.__name__):
+        inserted = bulk_loader.load_chunk(db, csv_rows(20), user_map, "batch-1")
+
+    assert inserted == 20
+    assert set(user_map) == {f"ACC{i}" for i in range(6)}
+    assert db.query(User).count() == 6
+    assert db.query(User.email).filter(User.id == user_map["ACC1"]).scalar() == "acc1@bank.com"
+    assert "Bulk created 6 new users." in caplog.messages
+    assert bulk_loader.batch_user_ids(db, "batch-1") == set(user_map.values())
+
+
+def test_reingesting_the_same_rows_is_idempotent(db):
+    first_map = {}
+    bulk_loader.load_chunk(db, csv_rows(20), first_map, "batch-1")
+    edges = {(edge.from_user_id, edge.to_user_id): edge.tx_count for edge in db.query(GraphEdge)}
+
+    second_map = {}
+    inserted = bulk_loader.load_chunk(db, csv_rows(20) + csv_rows(3, prefix="NEW"), second_map, "batch-2")
+
+    assert inserted == 3
+    assert second_map == first_map
+    assert db.query(User).count() == 6
+    assert db.query(Transaction).count() == 23
+    assert db.query(Transaction).filter(Transaction.ingestion_batch_id == "batch-2").count() == 3
+    assert sum(edge.tx_count for edge in db.query(GraphEdge)) == sum(edges.values()) + 3
+
+
+def test_rows_without_an_external_id_are_always_loaded(db):
+    rows = [dict(row, Transaction_ID="") for row in csv_rows(4)]
+    assert bulk_loader.load_chunk(db, rows, {}, "batch-1") == 4
+    assert bulk_loader.load_chunk(db, rows, {}, "batch-2") == 4
@@ -0,0 +1,76 @@
+import io
+import os
+import time
+
+import pytest
+
+from app import data_processor
+
+CSV = (
+    "Date,Transaction_ID,Debit_Account,Credit_Account,Amount,Currency,Description\n"
+    + "".join(f"2026-10-0{i % 9 + 1}T10:00:00,T{i},ACC{i},ACC{i + 1},{100 + i},INR,Transfer\n" for i in range(12))
+)
+
+
+def test_stage_upload_spools_the_stream_to_the_staging_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_processor, "STAGING_DIR", tmp_path)
+    monkeypatch.setattr(data_processor, "UPLOAD_COPY_BUFFER", 64) # Copy in many small blocks
+
+    staged = data_processor.stage_upload(io.BytesIO(CSV.encode()), "../export.csv")
+
+    assert staged.parent == tmp_path
+    assert staged.name.endswith("_export.csv")
+    assert staged.read_text() == CSV
+    assert [path.name for path in tmp_path.iterdir()] == [staged.name] # No partial file left behind
+    assert data_processor.read_csv_header(staged) == ["Date", "Transaction_ID", "Debit_Account", "Credit_Account", "Amount", "Currency", "Description"]
+
+
+def test_rows_are_read_lazily_in_bounded_chunks(tmp_path):
+    path = tmp_path / "upload.csv"
+    path.write_text(CSV)
+
+    rows = data_processor.iter_csv_rows(path)
+    assert not isinstance(rows, list)
+    chunks = list(data_processor.iter_chunks(rows, 5))
+
+    assert [len(chunk) for chunk in chunks] == [5, 5, 2]
+    assert chunks[0][0]["Debit_Account"] == "ACC0"
+    assert chunks[-1][-1]["Transaction_ID"] == "T11"
+
+
+def test_discarding_a_missing_upload_is_a_no_op(tmp_path):
+    path = tmp_path / "gone.csv"
+    path.write_text(CSV)
+    data_processor.discard_staged_upload(path)
+    data_processor.discard_staged_upload(path)
+    assert not path.exists()
+
+
+
+def test_failed_copy_leaves_no_partial_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_processor, "STAGING_DIR", tmp_path)
+    monkeypatch.setattr(data_processor, "UPLOAD_COPY_BUFFER", 64)
+
+    class Disconnecting(io.BytesIO):
+        def read(self, size=-1):
+            if self.tell() >= 128:
+                raise ConnectionResetError("client went away")
+            return super().read(size)
+
+    with pytest.raises(ConnectionResetError):
+        data_processor.stage_upload(Disconnecting(CSV.encode()), "upload.csv")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_only_stale_staged_files_are_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_processor, "STAGING_DIR", tmp_path)
+    stale, partial, fresh = tmp_path / "a_old.csv", tmp_path / "b_old.csv.part", tmp_path / "c_new.csv"
+    for path in (stale, partial, fresh):
+        path.write_text(CSV)
+    old = time.time() - 7200
+    for path in (stale, partial):
+        os.utime(path, (old, old))
+
+    data_processor.remove_stale_uploads(max_age_seconds=3600)
+
+    assert [path.name for path in tmp_path.iterdir()] == ["c_new.csv"]
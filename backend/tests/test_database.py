@@ -0,0 +1,71 @@
+import json
+import time
+
+import fakeredis
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+
+from app import cache, database
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(cache, "get_redis", lambda: client)
+    monkeypatch.setattr(database, "_pool_metrics_published_at", 0.0)
+    return client
+
+
+def test_engine_options_follow_the_pool_mode(monkeypatch):
+    monkeypatch.setattr(database, "SQLALCHEMY_DATABASE_URL", "postgresql://db/aml")
+    assert database._engine_options() == {
+        "pool_pre_ping": True, "pool_size": database.DB_POOL_SIZE, "max_overflow": database.DB_MAX_OVERFLOW,
+        "pool_timeout": database.DB_POOL_TIMEOUT, "pool_recycle": database.DB_POOL_RECYCLE,
+    }
+    monkeypatch.setattr(database, "DB_POOL_MODE", "null")
+    assert database._engine_options() == {"poolclass": NullPool}
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("postgresql://user:secret@db:5432/aml", "postgresql+asyncpg://user:secret@db:5432/aml"),
+    ("sqlite:////tmp/aml.db", "sqlite+aiosqlite:////tmp/aml.db"),
+    ("postgresql+asyncpg://db/aml", "postgresql+asyncpg://db/aml"),
+])
+def test_async_url_swaps_in_the_async_driver(url, expected):
+    assert database._async_url(url) == expected
+
+
+def test_pool_metrics_count_checkouts():
+    database.reset_after_fork()
+
+    with database.engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert database.pool_metrics()["checked_out_now"] == 1
+    with database.engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+    metrics = database.pool_metrics()
+    assert (metrics["checkouts"], metrics["checked_out_now"], metrics["peak_checked_out"]) == (2, 0, 1)
+    assert metrics["pool"]["mode"] == database.DB_POOL_MODE
+    database.reset_after_fork()
+    assert database.pool_metrics()["checkouts"] == 0
+
+
+def test_processes_publish_their_metrics_through_redis(shared, monkeypatch):
+    database.publish_pool_metrics("api")
+    shared.hset(database.POOL_METRICS_KEY, "worker:gone:1", json.dumps({"checkouts": 5, "at": time.time() - database.POOL_METRICS_STALE_SECONDS - 1}))
+
+    processes = database.cluster_pool_metrics()
+
+    assert [field.split(":")[0] for field in processes] == ["api"]
+    assert "checkouts" in next(iter(processes.values()))
+    assert shared.hkeys(database.POOL_METRICS_KEY) == [next(iter(processes)).encode()] # Stale entry dropped
+
+
+def test_publishing_is_throttled(shared):
+    database.publish_pool_metrics("worker")
+    shared.delete(database.POOL_METRICS_KEY)
+    database.publish_pool_metrics("worker")
+
+    assert database.cluster_pool_metrics() == {}
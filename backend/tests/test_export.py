@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import export
+from app.models import Alert, Transaction, User
+
+api = FastAPI()
+api.include_router(export.router)
+client = TestClient(api)
+
+
+@pytest.fixture
+def transactions(db, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 4)
+    users = [User(full_name=f"Exported User {i}", email=f"export{i}@example.com") for i in range(3)]
+    db.add_all(users)
+    db.flush()
+    a, b, c = (user.id for user in users)
+    start = datetime(2026, 10, 1)
+    db.add_all(Transaction(from_user_id=(a, b)[i % 2], to_user_id=c if i % 3 else b, amount=10.5 * i, timestamp=start + timedelta(hours=i), description=f"payment, \"{i}\"") for i in range(10))
+    db.add_all(Alert(user_id=user_id, alert_type=alert_type, message="reason") for user_id, alert_type in ((a, "KYC_FLAG"), (b, "ML_ANOMALY"), (c, "KYC_FLAG")))
+    db.commit()
+    return a, b, c
+
+
+def test_rows_are_read_one_chunk_at_a_time(transactions):
+    chunks = list(export._stream_rows(export.select(*export.TRANSACTION_COLUMNS).order_by(Transaction.id)))
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+
+
+def test_csv_export_streams_every_row(transactions):
+    response = client.get("/export/transactions")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="transactions-' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["description"] for row in rows] == [f"payment, \"{i}\"" for i in range(10)]
+    assert list(rows[0]) == [column.key for column in export.TRANSACTION_COLUMNS]
+
+
+def test_ndjson_export_applies_the_filters(transactions):
+    a, b, c = transactions
+
+    response = client.get("/export/transactions", params={"format": "ndjson", "user_id": a, "since": "2026-10-01T02:00:00", "until": "2026-10-01T08:00:00"})
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["amount"] for row in rows] == [21.0, 42.0, 63.0] # Hours 2, 4 and 6
+    assert all(row["from_user_id"] == a and row["timestamp"].startswith("2026-10-01T0") for row in rows)
+
+
+def test_parquet_export_has_one_row_group_per_chunk(transactions):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    response = client.get("/export/transactions", params={"format": "parquet"})
+
+    parquet = pq.ParquetFile(io.BytesIO(response.content))
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column("amount").to_pylist() == [10.5 * i for i in range(10)]
+    assert str(table.schema.field("timestamp").type) == "timestamp[us, tz=UTC]"
+
+
+def test_alert_export_filters_by_type(transactions):
+    a, b, c = transactions
+
+    rows = list(csv.DictReader(io.StringIO(client.get("/export/alerts", params={"alert_type": "KYC_FLAG"}).text)))
+
+    assert [int(row["user_id"]) for row in rows] == [a, c]
+
+
+def test_unknown_format_is_rejected():
+    assert client.get("/export/alerts", params={"format": "xlsx"}).status_code == 400
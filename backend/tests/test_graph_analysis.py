@@ -0,0 +1,95 @@
+import fakeredis
+import numpy as np
+import pytest
+
+from app import cache, graph_analysis, graph_engine, graph_store
+from app.cache import TieredCache
+from app.graph_engine import TransactionGraph
+from app.models import User
+
+
+@pytest.fixture
+def layouts(monkeypatch):
+    """A fresh layout cache, counting how many layouts are actually computed."""
+    computed = []
+    spring_layout = graph_engine.spring_layout
+
+    def counting_layout(num_nodes, src, dst, **kwargs):
+        computed.append(num_nodes)
+        return spring_layout(num_nodes, src, dst, **kwargs)
+
+    monkeypatch.setattr(graph_engine, "spring_layout", counting_layout)
+    monkeypatch.setattr(graph_analysis, "layout_cache", TieredCache(
+        "graph-layout", max_entries=8, dumps=graph_analysis.layout_cache.dumps, loads=graph_analysis.layout_cache.loads,
+    ))
+    return computed
+
+
+@pytest.fixture
+def ring(db, monkeypatch):
+    """Users a -> b -> c -> a plus a spoke c -> d, served as the shared graph."""
+    users = [User(full_name=f"Graph User {i}", email=f"graph{i}@example.com") for i in range(4)]
+    db.add_all(users)
+    db.commit()
+    a, b, c, d = (user.id for user in users)
+    graph = TransactionGraph.from_edges([a, b, c, c], [b, c, a, d], [100.0, 200.0, 300.0, 50.0], [1, 1, 1, 1], [0, 0, 0, 0])
+    monkeypatch.setattr(graph_store, "get_graph", lambda db: graph)
+    return a, b, c, d
+
+
+def test_layout_key_depends_on_structure_only():
+    ids, src, dst = np.array([7, 8, 9]), np.array([0, 1]), np.array([1, 2])
+
+    key = graph_analysis._layout_key(ids, src, dst)
+
+    assert graph_analysis._layout_key(ids.astype(np.int32), src.astype(np.int32), dst) == key
+    assert graph_analysis._layout_key(ids, src, np.array([2, 1])) != key
+    assert graph_analysis._layout_key(np.array([7, 8, 10]), src, dst) != key
+    # Arrays are delimited, so moving an element between them changes the key
+    assert graph_analysis._layout_key(np.array([7, 8, 9, 0]), np.array([1]), dst) != key
+
+
+def test_repeat_analysis_reuses_the_cached_layout(db, ring, layouts):
+    first = graph_analysis.build_and_analyze_graph(db, ring[0])
+    second = graph_analysis.build_and_analyze_graph(db, ring[0])
+
+    assert layouts == [4]
+    assert second["plot_data"] == first["plot_data"]
+    assert graph_analysis.layout_cache.stats["local_hits"] == 1
+
+
+def test_layout_is_shared_through_redis(layouts, monkeypatch):
+    shared = fakeredis.FakeRedis()
+    monkeypatch.setattr(cache, "get_redis", lambda: shared)
+    ids, src, dst = np.array([1, 2, 3]), np.array([0, 1, 2]), np.array([1, 2, 0])
+    positions = graph_analysis.cached_layout(ids, src, dst)
+
+    # Another process: an empty local tier in front of the same Redis
+    other = graph_analysis.layout_cache
+    monkeypatch.setattr(graph_analysis, "layout_cache", TieredCache("graph-layout", dumps=other.dumps, loads=other.loads))
+
+    assert np.array_equal(graph_analysis.cached_layout(ids, src, dst), positions)
+    assert positions.dtype == np.float32 and positions.shape == (3, 2)
+    assert graph_analysis.layout_cache.stats["redis_hits"] == 1
+    assert layouts == [3]
+
+
+def test_compact_plot_payload(db, ring, layouts):
+    a, b, c, d = ring
+
+    result = graph_analysis.build_and_analyze_graph(db, a)
+    plot = result["plot_data"]
+    nodes, edges = plot["nodes"], plot["edges"]
+
+    assert plot["format"] == graph_analysis.PLOT_FORMAT
+    assert nodes["id"][0] == a and set(nodes["id"]) == {a, b, c, d}
+    assert all(len(values) == 4 for values in nodes.values())
+    assert dict(zip(nodes["id"], nodes["role"])) == {a: "root", b: "cycle", c: "cycle", d: "peer"}
+    assert dict(zip(nodes["id"], nodes["label"]))[d] == "Graph User 3"
+    pairs = {(nodes["id"][s], nodes["id"][t]): amount for s, t, amount in zip(edges["source"], edges["target"], edges["amount"])}
+    assert pairs == {(a, b): 100.0, (b, c): 200.0, (c, a): 300.0, (c, d): 50.0}
+    assert result["findings"]["cycles"] == [[a, b, c]]
+
+
+def test_user_without_transfers(db, ring):
+    assert graph_analysis.build_and_analyze_graph(db, 10_000) == {"error": "User has no P2P transactions to graph."}
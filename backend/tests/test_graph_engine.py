@@ -0,0 +1,122 @@
+from datetime import datetime
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from app import graph_engine
+from app.graph_engine import TransactionGraph
+from app.models import GraphEdge, User
+
+
+def random_edges(num_nodes=40, num_edges=120, seed=3):
+    rng = np.random.default_rng(seed)
+    pairs = set()
+    while len(pairs) < num_edges:
+        sender, receiver = rng.integers(0, num_nodes, 2)
+        if sender != receiver:
+            pairs.add((int(sender) * 10 + 7, int(receiver) * 10 + 7)) # Sparse user IDs
+    senders, receivers = map(np.array, zip(*sorted(pairs)))
+    weights = rng.uniform(100, 5000, num_edges)
+    return senders, receivers, weights
+
+
+@pytest.fixture
+def graphs():
+    senders, receivers, weights = random_edges()
+    graph = TransactionGraph.from_edges(senders, receivers, weights, np.ones(len(senders)), np.zeros(len(senders)))
+    reference = nx.DiGraph()
+    for sender, receiver, weight in zip(senders, receivers, weights):
+        reference.add_edge(graph.index_of(sender), graph.index_of(receiver), weight=weight)
+    return graph, reference
+
+
+def test_csr_adjacency_matches_networkx(graphs):
+    graph, reference = graphs
+    assert graph.num_nodes == reference.number_of_nodes()
+    assert graph.num_edges == reference.number_of_edges()
+    for node in range(graph.num_nodes):
+        assert sorted(graph.successors(node).tolist()) == sorted(reference.successors(node))
+        assert sorted(graph.predecessors(node).tolist()) == sorted(reference.predecessors(node))
+    assert graph.index_of(8) is None
+
+
+def test_k_hop_matches_the_undirected_ego_graph(graphs):
+    graph, reference = graphs
+    for root in range(0, graph.num_nodes, 7):
+        nodes = graph.k_hop(root, hops=2, max_nodes=graph.num_nodes)
+        assert nodes[0] == root
+        assert set(nodes.tolist()) == set(nx.ego_graph(reference.to_undirected(), root, radius=2).nodes)
+
+    capped = graph.k_hop(0, hops=3, max_nodes=5)
+    assert len(capped) == 5 and capped[0] == 0
+
+
+def test_cycles_through_finds_every_short_cycle(graphs):
+    graph, reference = graphs
+    for root in range(0, graph.num_nodes, 5):
+        expected = set()
+        for cycle in nx.simple_cycles(reference, length_bound=5):
+            if root in cycle:
+                start = cycle.index(root)
+                expected.add(tuple(cycle[start:] + cycle[:start]))
+        found = graph.cycles_through(root, max_length=5, max_cycles=10_000, max_expansions=10_000_000)
+        assert {tuple(cycle) for cycle in found} == expected
+        assert [len(cycle) for cycle in found] == sorted(len(cycle) for cycle in found) # Shortest first
+
+
+def test_pagerank_matches_networkx(graphs):
+    graph, reference = graphs
+    src, dst, weights, _ = graph.subgraph_edges(np.arange(graph.num_nodes))
+
+    ranks = graph_engine.pagerank(graph.num_nodes, src, dst, weights, tol=1e-12, max_iter=500)
+
+    expected = nx.pagerank(reference, weight="weight", tol=1e-12, max_iter=500)
+    assert ranks == pytest.approx([expected[node] for node in range(graph.num_nodes)], abs=1e-8)
+
+
+def test_betweenness_from_every_source_is_exact(graphs):
+    graph, reference = graphs
+    src, dst, _, _ = graph.subgraph_edges(np.arange(graph.num_nodes))
+
+    betweenness = graph_engine.approximate_betweenness(graph.num_nodes, src, dst, samples=graph.num_nodes)
+
+    expected = nx.betweenness_centrality(reference)
+    assert betweenness == pytest.approx([expected[node] for node in range(graph.num_nodes)], abs=1e-9)
+
+
+def test_subgraph_edges_use_local_positions(graphs):
+    graph, reference = graphs
+    nodes = graph.k_hop(3, hops=1, max_nodes=graph.num_nodes)
+    src, dst, _, _ = graph.subgraph_edges(nodes)
+    induced = reference.subgraph(nodes.tolist())
+    assert {(int(nodes[s]), int(nodes[d])) for s, d in zip(src, dst)} == set(induced.edges)
+
+
+def test_spring_layout_is_deterministic_and_scaled(graphs):
+    graph, _ = graphs
+    src, dst, _, _ = graph.subgraph_edges(np.arange(graph.num_nodes))
+    positions = graph_engine.spring_layout(graph.num_nodes, src, dst)
+    assert positions.shape == (graph.num_nodes, 2)
+    assert np.abs(positions).max() == pytest.approx(1.0)
+    assert np.array_equal(positions, graph_engine.spring_layout(graph.num_nodes, src, dst))
+
+
+def test_load_transaction_graph_from_graph_edges(db):
+    users = [User(full_name=f"User {i}", email=f"graph{i}@example.com") for i in range(3)]
+    db.add_all(users)
+    db.flush()
+    last_seen = datetime(2026, 10, 1, 12, 0)
+    db.add_all([
+        GraphEdge(from_user_id=users[0].id, to_user_id=users[1].id, tx_count=3, total_amount=300.0, last_seen=last_seen),
+        GraphEdge(from_user_id=users[1].id, to_user_id=users[2].id, tx_count=1, total_amount=50.0, last_seen=last_seen),
+    ])
+    db.commit()
+
+    graph = graph_engine.load_transaction_graph(db)
+
+    first = graph.index_of(users[0].id)
+    assert graph.node_ids.tolist() == sorted(user.id for user in users)
+    assert graph.successors(first).tolist() == [graph.index_of(users[1].id)]
+    assert graph.weights[graph.indptr[first]] == 300.0
+    assert graph.counts[graph.indptr[first]] == 3
@@ -0,0 +1,73 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app import graph_store
+from app.graph_engine import TransactionGraph
+from app.models import GraphEdge, User
+
+
+@pytest.fixture(autouse=True)
+def unmapped(monkeypatch):
+    monkeypatch.setattr(graph_store, "_graph", None)
+    monkeypatch.setattr(graph_store, "_graph_version", None)
+
+
+def tx(sender, receiver, amount, day):
+    return SimpleNamespace(from_user_id=sender, to_user_id=receiver, amount=amount, timestamp=datetime(2026, 10, day))
+
+
+def test_record_edges_aggregates_per_pair(db):
+    users = [User(full_name=f"User {i}", email=f"edges{i}@example.com") for i in range(3)]
+    db.add_all(users)
+    db.flush()
+    a, b, c = (user.id for user in users)
+
+    graph_store.record_edges(db, [tx(a, b, 100, 5), tx(a, b, 50, 3), tx(b, c, 10, 4), tx(a, a, 999, 1), tx(None, b, 999, 1)])
+    graph_store.record_edges(db, [tx(a, b, 25, 9)])
+    db.commit()
+
+    edges = {(edge.from_user_id, edge.to_user_id): edge for edge in db.query(GraphEdge)}
+    assert set(edges) == {(a, b), (b, c)}
+    assert (edges[a, b].tx_count, edges[a, b].total_amount) == (3, 175)
+    assert (edges[a, b].first_seen.day, edges[a, b].last_seen.day) == (3, 9)
+    assert (edges[b, c].tx_count, edges[b, c].total_amount) == (1, 10)
+
+
+def test_snapshot_round_trip_is_memory_mapped(tmp_path):
+    graph = TransactionGraph.from_edges([1, 1, 2], [2, 3, 3], [10.0, 20.0, 30.0], [1, 2, 3], [100, 200, 300])
+
+    version = graph_store.save_snapshot(graph, tmp_path)
+    mapped = graph_store.load_snapshot(tmp_path)
+
+    assert graph_store.read_manifest(tmp_path)["version"] == version
+    assert isinstance(mapped.indices, np.memmap)
+    assert not mapped.indices.flags.writeable
+    for name in graph_store.SNAPSHOT_ARRAYS:
+        assert np.array_equal(getattr(mapped, name), getattr(graph, name))
+    assert graph_store.load_snapshot(tmp_path) is mapped # Same version: no remap
+
+
+def test_new_snapshot_keeps_only_the_version_it_replaced(tmp_path):
+    (tmp_path / "ring-scans" / "scan-1").mkdir(parents=True)
+    first = graph_store.save_snapshot(TransactionGraph.from_edges([1], [2], [1.0], [1], [0]), tmp_path)
+    graph_store.load_snapshot(tmp_path)
+    second = graph_store.save_snapshot(TransactionGraph.from_edges([1, 2], [2, 3], [1.0, 2.0], [1, 1], [0, 0]), tmp_path)
+    third = graph_store.save_snapshot(TransactionGraph.from_edges([1, 2, 3], [2, 3, 1], [1.0, 2.0, 3.0], [1, 1, 1], [0, 0, 0]), tmp_path)
+
+    assert len({first, second, third}) == 3
+    # The replaced version stays for readers of the old manifest; other scratch space is left alone
+    assert sorted(path.name for path in tmp_path.iterdir() if path.is_dir()) == sorted([second, third, "ring-scans"])
+    assert (tmp_path / "ring-scans" / "scan-1").is_dir()
+    assert graph_store.load_snapshot(tmp_path).num_edges == 3
+
+
+def test_reader_of_a_removed_version_reads_the_manifest_again(tmp_path, monkeypatch):
+    current = graph_store.save_snapshot(TransactionGraph.from_edges([1, 2], [2, 3], [1.0, 2.0], [1, 1], [0, 0]), tmp_path)
+    manifests = iter([{"version": str(int(current) - 1)}, {"version": current}]) # The first names a version already gone
+    monkeypatch.setattr(graph_store, "read_manifest", lambda directory: next(manifests))
+
+    assert graph_store.load_snapshot(tmp_path).num_edges == 2
+    assert graph_store._graph_version == current
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import ingestion
+from app.models import GraphEdge, Transaction, User
+
+api = FastAPI()
+api.include_router(ingestion.router)
+client = TestClient(api)
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    """Batch ids handed to the analysis task, instead of a broker."""
+    batches = []
+
+    def delay(batch_id):
+        batches.append(batch_id)
+        return SimpleNamespace(id=f"job-{len(batches)}")
+
+    monkeypatch.setattr(ingestion.analyze_ingested_batch, "delay", delay)
+    return batches
+
+
+def batch(count, prefix="TX"):
+    return [
+        {"transaction_id": f"{prefix}{i}", "from_account": f"ACC{i % 3}", "to_account": f"ACC{(i + 1) % 3}", "amount": 1000 + i, "timestamp": f"2026-10-0{1 + i % 9}T10:00:00"}
+        for i in range(count)
+    ]
+
+
+def test_batch_is_loaded_and_analyzed_once(db, queued):
+    response = client.post("/ingest/transactions", json=batch(6))
+
+    assert response.status_code == 202
+    body = response.json()
+    assert (body["received"], body["inserted"], body["duplicates"], body["job_id"]) == (6, 6, 0, "job-1")
+    assert queued == [body["batch_id"]]
+    assert db.query(User).count() == 3 # Accounts created on first sight
+    assert {tx.ingestion_batch_id for tx in db.query(Transaction)} == {body["batch_id"]}
+    assert db.query(GraphEdge).count() == 3
+
+
+def test_retried_batch_inserts_nothing_and_queues_nothing(db, queued):
+    client.post("/ingest/transactions", json=batch(6))
+
+    retried = client.post("/ingest/transactions", json=batch(6) + batch(2, prefix="NEW")).json()
+    other_source = client.post("/ingest/transactions", params={"source": "core-banking"}, json=batch(6)).json()
+
+    assert (retried["inserted"], retried["duplicates"]) == (2, 6)
+    assert other_source["inserted"] == 6 # transaction_ids are unique per source
+    assert client.post("/ingest/transactions", json=batch(6)).json()["job_id"] is None
+    assert len(queued) == 3
+    assert db.query(Transaction).count() == 14
+
+
+def test_invalid_batches_are_rejected(db, queued, monkeypatch):
+    monkeypatch.setattr(ingestion, "INGEST_MAX_BATCH", 5)
+
+    assert client.post("/ingest/transactions", json=[]).status_code == 400
+    assert client.post("/ingest/transactions", json=batch(6)).status_code == 413
+    assert client.post("/ingest/transactions", json=[dict(batch(1)[0], amount=-5)]).status_code == 422
+    assert client.post("/ingest/transactions", json=[dict(batch(1)[0], from_account="")]).status_code == 422
+    assert queued == []
+    assert db.query(Transaction).count() == 0
@@ -0,0 +1,38 @@
+import pytest
+
+from app import job_events
+from celery_worker import celery_app
+
+
+@celery_app.task(tracked_job=True)
+def tracked_job_task(fail: bool = False):
+    if fail:
+        raise ValueError("bad input")
+    return "done"
+
+
+@celery_app.task
+def scheduled_task():
+    return "done"
+
+
+@pytest.fixture
+def published(monkeypatch):
+    events = []
+    monkeypatch.setattr(job_events, "publish", lambda job_id, status, **fields: events.append((job_id, status, fields)))
+    return events
+
+
+def test_job_tasks_publish_their_state_transitions(published):
+    result = tracked_job_task.apply()
+    assert published == [(result.id, "STARTED", {}), (result.id, "SUCCESS", {})]
+
+
+def test_failed_job_tasks_publish_the_error(published):
+    result = tracked_job_task.apply(kwargs={"fail": True})
+    assert published == [(result.id, "STARTED", {}), (result.id, "FAILURE", {"error": "bad input"})]
+
+
+def test_other_tasks_publish_nothing(published):
+    scheduled_task.apply()
+    assert published == []
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import kyc
+from app.database import SessionLocal
+from app.models import Alert, SweepCheckpoint, User
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(kyc, "KYC_SWEEP_CHUNK_SIZE", 2)
+
+
+def add_users(db):
+    countries = ["India", "Iran", "France", "Syria", "India"]
+    users = [User(full_name=f"Person {i}", email=f"person{i}@example.com", country=country) for i, country in enumerate(countries)]
+    db.add_all(users)
+    db.commit()
+    return users
+
+
+def test_sweep_flags_users_chunk_by_chunk(db):
+    users = add_users(db)
+    reports = []
+
+    summary = kyc.sweep(db, "job-1", report=reports.append)
+
+    assert summary["status"] == "COMPLETE"
+    assert summary["users_checked"] == 5
+    assert summary["alerts_created"] == 2
+    assert [report["last_user_id"] for report in reports] == [users[1].id, users[3].id, users[4].id]
+    assert db.get(SweepCheckpoint, kyc.KYC_SWEEP).lease_owner is None
+
+
+def test_interrupted_sweep_resumes_from_its_checkpoint(db):
+    users = add_users(db)
+    # A run that died after its first chunk: its lease has expired
+    db.add(SweepCheckpoint(
+        name=kyc.KYC_SWEEP, status="RUNNING", job_id="job-1", last_user_id=users[1].id, users_checked=2, alerts_created=1,
+        lease_owner="job-1:dead", lease_expires_at=datetime.now(timezone.utc) - timedelta(seconds=1),
+    ))
+    db.commit()
+
+    summary = kyc.sweep(db, "job-1")
+
+    assert summary["users_checked"] == 5
+    assert summary["alerts_created"] == 2 # Iran was in the committed chunk and is not rechecked
+    assert db.query(Alert).count() == 1
+
+
+def test_sweep_refuses_a_checkpoint_leased_by_a_live_run(db):
+    users = add_users(db)
+    db.add(SweepCheckpoint(
+        name=kyc.KYC_SWEEP, status="RUNNING", job_id="job-1", last_user_id=users[1].id, users_checked=2, alerts_created=1,
+        lease_owner="job-1:alive", lease_expires_at=datetime.now(timezone.utc) + timedelta(minutes=5),
+    ))
+    db.commit()
+
+    with pytest.raises(kyc.SweepInProgress):
+        kyc.sweep(db, "job-1") # The broker's redelivered copy of the same task
+    with pytest.raises(kyc.SweepInProgress):
+        kyc.sweep(db, "job-2", restart=True)
+
+    checkpoint = db.get(SweepCheckpoint, kyc.KYC_SWEEP)
+    assert (checkpoint.last_user_id, checkpoint.users_checked, checkpoint.lease_owner) == (users[1].id, 2, "job-1:alive")
+
+
+def test_run_that_lost_its_lease_stops_before_the_next_chunk(db):
+    add_users(db)
+
+    def steal_lease(progress):
+        other = SessionLocal()
+        try:
+            other.query(SweepCheckpoint).update({"lease_owner": "job-2:other"})
+            other.commit()
+        finally:
+            other.close()
+
+    with pytest.raises(kyc.SweepInProgress):
+        kyc.sweep(db, "job-1", report=steal_lease)
+    db.rollback()
+    assert db.get(SweepCheckpoint, kyc.KYC_SWEEP).users_checked == 2
+
+
+def test_redelivered_message_of_a_finished_sweep_does_not_rerun(db):
+    add_users(db)
+    first = kyc.sweep(db, "job-1")
+
+    again = kyc.sweep(db, "job-1")
+
+    assert again == first
+    assert kyc.sweep(db, "job-2")["started_at"] != first["started_at"]
@@ -0,0 +1,180 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+
+from app import advisor, cache, llm
+from app.cache import LRUCache, TieredCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class SlowModel:
+    """Async model that answers after `latency` seconds and counts its calls."""
+    name = "slow-test-model"
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return f"answer to {prompt[-20:]}"
+
+    async def aclose(self) -> None:
+        pass
+
+
+class CountingModel:
+    """Sync model returning canned answers (\"\" for unknown prompts) and counting its calls."""
+
+    def __init__(self, name: str = "counting-test-model", answers: dict = None):
+        self.name = name
+        self.answers = answers or {}
+        self.calls = 0
+        self.error = None
+
+    def generate(self, prompt: str) -> str:
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.answers.get(llm.normalize_prompt(prompt), "")
+
+
+@pytest.fixture
+def unlimited(monkeypatch):
+    monkeypatch.setattr(llm, "rate_limiter", llm.RateLimiter(rate_per_minute=60_000, burst=1000))
+
+
+@pytest.fixture(autouse=True)
+def empty_response_cache():
+    llm.response_cache.local = LRUCache(llm.response_cache.local.max_entries, llm.response_cache.ttl)
+    yield
+
+
+def test_rate_limiter_allows_a_burst_then_refills(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm.time, "monotonic", clock)
+    limiter = llm.RateLimiter(rate_per_minute=60, burst=3)
+
+    assert [limiter._take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter._take() == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert limiter._take() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter._take() == 0.0
+
+    clock.now += 60 # Refills up to the burst size only
+    assert [limiter._take() for _ in range(4)][-1] == pytest.approx(1.0)
+
+
+def test_cached_prompts_skip_the_model_and_the_limiter():
+    model = SlowModel(latency=0)
+    limiter = llm.RateLimiter(rate_per_minute=60, burst=1)
+
+    async def run():
+        semaphore = asyncio.Semaphore(4)
+        first = await llm.generate_text_async("Summarize  this", model, semaphore, limiter)
+        second = await llm.generate_text_async("Summarize this", model, semaphore, limiter)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == second
+    assert model.calls == 1
+    assert limiter._take() == pytest.approx(1.0, abs=0.1) # Only the live call used a token
+
+
+def test_sweep_runs_at_its_own_rate_budget(monkeypatch):
+    # The process-wide limiter is exhausted; the sweep must not be paced by it.
+    exhausted = llm.RateLimiter(rate_per_minute=60, burst=1)
+    exhausted._take()
+    monkeypatch.setattr(llm, "rate_limiter", exhausted)
+    model = SlowModel(latency=0.05)
+    monkeypatch.setattr(llm, "get_async_model", lambda: model)
+
+    jobs = {f"job-{user_id}": user_id for user_id in range(100)}
+    evidence = {user_id: {"user_id": user_id, "alerts": [{"type": "KYC_FLAG"}]} for user_id in range(100)}
+    finished = {}
+
+    started = time.perf_counter()
+    results = asyncio.run(advisor.run_sweep("sar", jobs, evidence, finished.__setitem__, concurrency=20, requests_per_minute=60_000))
+    elapsed = time.perf_counter() - started
+
+    assert model.calls == 100
+    assert set(finished) == set(jobs)
+    assert all("sar_draft" in result for result in results)
+    # 20 calls at once, then 1000/s: about 0.1 s of pacing plus the model latency
+    assert elapsed < 1.0
+
+
+def test_prompt_key_normalizes_whitespace_per_model():
+    key = llm.prompt_key("Explain\n  the   risk ", "model-a")
+
+    assert llm.prompt_key("Explain the risk", "model-a") == key
+    assert llm.prompt_key("Explain the risk", "model-b") != key
+    assert llm.prompt_key("Explain the risks", "model-a") != key
+
+
+def test_equivalent_prompts_call_the_model_once(monkeypatch, unlimited):
+    model = CountingModel(answers={"Explain the risk": "Low risk."})
+    monkeypatch.setattr(llm, "_model", model)
+
+    answers = [llm.generate_text(prompt) for prompt in ("Explain the risk", "Explain\tthe risk\n", "  Explain the  risk")]
+
+    assert answers == ["Low risk."] * 3
+    assert model.calls == 1
+    monkeypatch.setattr(llm, "_model", CountingModel(name="other-model", answers={"Explain the risk": "High risk."}))
+    assert llm.generate_text("Explain the risk") == "High risk." # Other models don't share answers
+
+
+def test_empty_and_failed_responses_are_not_cached(monkeypatch, unlimited):
+    model = CountingModel()
+    monkeypatch.setattr(llm, "_model", model)
+    assert [llm.generate_text("Unanswerable") for _ in range(2)] == ["", ""]
+    assert model.calls == 2
+
+    model.answers["Explain the risk"] = "Low risk."
+    model.error = RuntimeError("quota exceeded")
+    with pytest.raises(RuntimeError):
+        llm.generate_text("Explain the risk")
+    model.error = None
+    assert llm.generate_text("Explain the risk") == "Low risk."
+
+
+def test_responses_are_shared_between_processes_through_redis(monkeypatch, unlimited):
+    shared = fakeredis.FakeRedis()
+    monkeypatch.setattr(cache, "get_redis", lambda: shared)
+    model = CountingModel(answers={"Explain the risk": "Low risk."})
+    monkeypatch.setattr(llm, "_model", model)
+    llm.generate_text("Explain the risk")
+
+    # Another worker: empty local tier, same Redis
+    monkeypatch.setattr(llm, "response_cache", TieredCache("llm-response"))
+    assert llm.generate_text("Explain  the risk") == "Low risk."
+    assert model.calls == 1
+    assert llm.response_cache.metrics()["cluster"] == {"misses": 1, "redis_hits": 1}
+
+
+def test_identical_dossiers_build_identical_prompts(db):
+    from app.models import Alert, User
+
+    user = User(full_name="Repeat Customer", email="repeat@example.com")
+    db.add(user)
+    db.flush()
+    db.add_all(Alert(user_id=user.id, alert_type=alert_type, message="reason") for alert_type in ("STRUCTURING", "KYC_FLAG", "ML_ANOMALY", "GRAPH_CYCLE"))
+    db.commit()
+
+    prompts = {advisor.build_risk_prompt(advisor.synthesize_user_evidence(db, user)) for _ in range(3)}
+
+    assert len(prompts) == 1
+    assert advisor.synthesize_user_evidence(db, user)["summary_stats"]["alert_types"] == ["GRAPH_CYCLE", "KYC_FLAG", "ML_ANOMALY", "STRUCTURING"]
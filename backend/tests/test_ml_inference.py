@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from app import ml_inference
+
+
+class Scaler:
+    def transform(self, features):
+        return features / 1000.0
+
+
+class IsolationForest:
+    def decision_function(self, features):
+        return 0.1 - features[:, 0] / 100.0 # Amounts above 15,000 fall below the -0.05 threshold
+
+
+class Autoencoder:
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, features, batch_size=None, verbose=0):
+        self.batches.append(len(features))
+        return np.where(features > 0.5, features, 0.0) # Fails to reconstruct amounts up to 500
+
+
+@pytest.fixture
+def models(monkeypatch):
+    autoencoder = Autoencoder()
+    monkeypatch.setattr(ml_inference, "SCALER", Scaler())
+    monkeypatch.setattr(ml_inference, "ISO_FOREST", IsolationForest())
+    monkeypatch.setattr(ml_inference, "AUTOENCODER", autoencoder)
+    monkeypatch.setattr(ml_inference, "MODELS_LOADED", True)
+    return autoencoder
+
+
+def test_batches_score_like_single_transactions(models):
+    amounts = np.array([100.0, 5_000.0, 20_000.0, 700.0, 450.0, 90_000.0, 12.0])
+
+    scores = ml_inference.score_transactions(amounts, batch_size=3)
+
+    assert models.batches == [3, 3, 1]
+    for i, amount in enumerate(amounts):
+        single = ml_inference.score_transaction(amount)
+        assert single["anomaly"] == scores["anomaly"][i]
+        assert single["iso_forest_score"] == pytest.approx(scores["iso_forest_score"][i])
+        assert single["autoencoder_error"] == pytest.approx(scores["autoencoder_error"][i])
+    assert scores["anomaly"].tolist() == [False, False, True, False, True, True, False]
+
+
+def test_without_models_nothing_is_anomalous(monkeypatch, tmp_path):
+    monkeypatch.setattr(ml_inference, "MODELS_LOADED", False)
+    monkeypatch.setattr(ml_inference, "MODELS_DIR", tmp_path)
+
+    scores = ml_inference.score_transactions([1.0, 2.0, 3.0])
+
+    assert scores["anomaly"].tolist() == [False, False, False]
+    assert scores["iso_forest_score"].shape == (3,)
@@ -0,0 +1,30 @@
+import pytest
+from fastapi import HTTPException
+
+from app import pagination
+
+
+@pytest.mark.parametrize("key", [[17, 17], [42.5, 3], ["2026-10-17T10:00:00+00:00", 9]])
+def test_cursor_round_trip(key):
+    cursor = pagination.encode_cursor("risk", key)
+
+    assert "=" not in cursor
+    assert pagination.decode_cursor(cursor, "risk") == key
+
+
+def test_no_cursor_is_the_first_page():
+    assert pagination.decode_cursor(None, "id") is None
+    assert pagination.decode_cursor("", "id") is None
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", pagination.encode_cursor("id", [1, 1]), pagination.encode_cursor("risk", 5)])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as raised:
+        pagination.decode_cursor(cursor, "risk")
+    assert raised.value.status_code == 400
+
+
+def test_count_estimates_need_postgresql(db):
+    from app.models import User
+
+    assert pagination.estimate_count(db, db.query(User)) is None
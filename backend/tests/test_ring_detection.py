@@ -0,0 +1,145 @@
+import os
+import time
+from types import SimpleNamespace
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from app import ring_detection
+from app.graph_engine import TransactionGraph
+
+NOW = 1_790_000_000
+
+
+@pytest.fixture(autouse=True)
+def uncapped(monkeypatch):
+    monkeypatch.setattr(ring_detection, "MAX_CYCLES_PER_NODE", 100_000)
+    monkeypatch.setattr(ring_detection, "MAX_EXPANSIONS_PER_NODE", 10_000_000)
+
+
+def build_graph(edges):
+    """edges: (sender, receiver, amount, last_seen) with one transaction each."""
+    senders, receivers, amounts, last_seen = zip(*edges)
+    return TransactionGraph.from_edges(senders, receivers, amounts, np.ones(len(edges)), last_seen)
+
+
+def random_ring_graph(seed=5, num_nodes=30, num_edges=90):
+    rng = np.random.default_rng(seed)
+    pairs = set()
+    while len(pairs) < num_edges:
+        sender, receiver = (int(node) for node in rng.integers(0, num_nodes, 2))
+        if sender != receiver:
+            pairs.add((sender + 100, receiver + 100))
+    # Every edge carries value, similar amounts (max/min < 1.5), all recent
+    return build_graph([(sender, receiver, rng.uniform(100_000, 140_000), NOW) for sender, receiver in sorted(pairs)])
+
+
+def canonical(cycle):
+    start = cycle.index(min(cycle))
+    return tuple(cycle[start:] + cycle[:start])
+
+
+def reference_rings(graph):
+    reference = nx.DiGraph()
+    for node in range(graph.num_nodes):
+        reference.add_edges_from((node, int(successor)) for successor in graph.successors(node))
+    return {canonical(cycle) for cycle in nx.simple_cycles(reference, length_bound=ring_detection.MAX_CYCLE_LENGTH) if len(cycle) >= ring_detection.MIN_CYCLE_LENGTH}
+
+
+def test_rings_match_networkx_cycles_exactly_once():
+    graph = random_ring_graph()
+
+    rings = ring_detection.find_rings(graph, workers=1)
+
+    assert len(rings) == len({canonical(ring) for ring in rings}) # No cycle reported twice
+    assert {canonical(ring) for ring in rings} == reference_rings(graph)
+    assert all(ring[0] == min(ring) for ring in rings) # Rooted at the lowest position
+
+
+def test_shards_pool_and_daemon_fallback_agree(monkeypatch):
+    monkeypatch.setattr(ring_detection, "SHARD_SIZE", 4)
+    graph = random_ring_graph()
+    expected = sorted(map(canonical, ring_detection.find_rings(graph, workers=1)))
+
+    assert len(ring_detection.shard_ranges(ring_detection.ring_subgraph(graph))) > 1
+    assert sorted(map(canonical, ring_detection.find_rings(graph, workers=2))) == expected
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("daemonic processes are not allowed to have children")
+
+    monkeypatch.setattr(ring_detection, "ProcessPoolExecutor", no_pool)
+    monkeypatch.setattr(ring_detection.multiprocessing, "current_process", lambda: SimpleNamespace(daemon=True))
+    assert sorted(map(canonical, ring_detection.find_rings(graph, workers=2))) == expected
+
+
+def test_saved_subgraph_shards_find_the_same_rings(tmp_path, monkeypatch):
+    monkeypatch.setattr(ring_detection, "SHARD_SIZE", 4)
+    graph = random_ring_graph()
+    subgraph = ring_detection.ring_subgraph(graph)
+
+    ring_detection.save_subgraph(subgraph, tmp_path / "scan")
+    loaded = ring_detection.load_subgraph(tmp_path / "scan")
+    rings = [ring for start, end in ring_detection.shard_ranges(loaded) for ring in ring_detection.shard_cycles(loaded, start, end)]
+
+    assert sorted(map(canonical, rings)) == sorted(map(canonical, ring_detection.find_rings(graph, workers=1)))
+
+
+def test_rings_need_similar_recent_value_carrying_transfers():
+    week = ring_detection.RING_WINDOW_SECONDS
+    graph = build_graph([
+        (1, 2, 200_000, NOW), (2, 3, 190_000, NOW), (3, 1, 210_000, NOW),           # Ring
+        (4, 5, 200_000, NOW), (5, 6, 200_000, NOW), (6, 4, 50_000, NOW),            # Last leg too small
+        (7, 8, 120_000, NOW), (8, 9, 300_000, NOW), (9, 7, 120_000, NOW),           # Amounts too different
+        (10, 11, 200_000, NOW), (11, 12, 200_000, NOW), (12, 10, 200_000, NOW - week - 1), # Spread over too long
+    ])
+
+    rings = ring_detection.find_rings(graph, workers=1)
+
+    assert [graph.node_ids[ring].tolist() for ring in rings] == [[1, 2, 3]]
+
+
+def test_layering_roles():
+    edges = [(1, 2, 5_000_000, NOW)]                                              # Funding
+    edges += [(2, mule, 45_000, NOW) for mule in (10, 11, 12)]                    # Fan-out just under the threshold
+    graph = TransactionGraph.from_edges(
+        [sender for sender, *_ in edges], [receiver for _, receiver, *_ in edges],
+        [amount * (2 if receiver != 2 else 1) for _, receiver, amount, _ in edges], # Two deposits per mule
+        [2 if receiver != 2 else 1 for _, receiver, *_ in edges], [NOW] * len(edges),
+    )
+
+    roles = {role: graph.node_ids[nodes].tolist() for role, nodes in ring_detection.find_layering(graph).items()}
+
+    assert roles == {"source": [1], "intermediary": [2], "mule": [10, 11, 12]}
+
+
+def test_only_stale_subgraphs_are_removed(tmp_path):
+    stale, fresh = tmp_path / "stale", tmp_path / "fresh"
+    stale.mkdir()
+    fresh.mkdir()
+    old = time.time() - 7200
+    os.utime(stale, (old, old))
+
+    ring_detection.remove_stale_subgraphs(tmp_path, max_age_seconds=3600)
+    ring_detection.remove_stale_subgraphs(tmp_path / "missing", max_age_seconds=3600)
+
+    assert [path.name for path in tmp_path.iterdir()] == ["fresh"]
+
+
+def test_scan_alerts_each_ring_member_once(db):
+    from app.models import Alert, User
+
+    users = [User(full_name=f"Ring Member {i}", email=f"ring{i}@example.com") for i in range(3)]
+    db.add_all(users)
+    db.commit()
+    a, b, c = (user.id for user in users)
+    graph = build_graph([(a, b, 200_000, NOW), (b, c, 190_000, NOW), (c, a, 210_000, NOW)])
+
+    first = ring_detection.scan_graph(db, graph, workers=1)
+    second = ring_detection.scan_graph(db, graph, workers=1)
+
+    assert (first["rings"], first["alerts_created"]) == (1, 3)
+    assert (second["rings"], second["alerts_created"]) == (1, 0)
+    alerts = db.query(Alert).filter(Alert.alert_type == ring_detection.GRAPH_CYCLE).all()
+    assert sorted(alert.user_id for alert in alerts) == [a, b, c]
+    assert "Ring Member 0 -> Ring Member 1 -> Ring Member 2 -> Ring Member 0" in alerts[0].message
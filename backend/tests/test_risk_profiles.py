@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import risk_profiles
+from app.alerts import upsert_alerts
+from app.models import Alert, Transaction, User, UserRiskProfile
+
+NOW = datetime.now(timezone.utc)
+COMPARED_COLUMNS = risk_profiles.COUNTER_COLUMNS + ["risk_score"]
+
+
+@pytest.fixture
+def users(db):
+    users = [User(full_name=f"Profiled User {i}", email=f"profile{i}@example.com") for i in range(3)]
+    db.add_all(users)
+    db.commit()
+    return [user.id for user in users]
+
+
+def add_transactions(db, rows):
+    transactions = [Transaction(from_user_id=sender, to_user_id=receiver, amount=amount, timestamp=NOW - timedelta(days=age)) for sender, receiver, amount, age in rows]
+    db.add_all(transactions)
+    db.flush()
+    risk_profiles.record_transactions(db, transactions)
+    db.commit()
+
+
+def add_alerts(db, rows):
+    upsert_alerts(db, [Alert(user_id=user_id, alert_type=alert_type, message="reason", status=status, dedup_key=f"{alert_type}:{user_id}:{i}") for i, (user_id, alert_type, status) in enumerate(rows)])
+    db.commit()
+
+
+def profiles(db):
+    db.expire_all()
+    return {profile.user_id: {column: getattr(profile, column) for column in COMPARED_COLUMNS} for profile in db.query(UserRiskProfile)}
+
+
+def test_incremental_profiles_match_a_full_rebuild(db, users):
+    a, b, c = users
+    add_transactions(db, [(a, b, 400_000, 1), (b, c, 250_000, 3), (c, a, 1_000, 45), (None, a, 50_000, 2)])
+    add_alerts(db, [(a, "GRAPH_CYCLE", "OPEN"), (b, "GRAPH_CYCLE", "OPEN"), (a, "KYC_FLAG", "CLOSED"), (c, "ML_ANOMALY", "OPEN")])
+    add_transactions(db, [(a, c, 10_000, 0)])
+    add_alerts(db, [(a, "GRAPH_CYCLE", "OPEN")]) # Dedup key already exists: not counted again
+
+    incremental = profiles(db)
+    assert risk_profiles.rebuild_all(db) == 3
+
+    assert profiles(db) == incremental
+    assert incremental[a]["total_alerts"] == 2 and incremental[a]["open_alerts"] == 1
+    assert (incremental[a]["tx_in_count"], incremental[a]["tx_in_amount"]) == (2, 51_000)
+    assert (incremental[c]["window_tx_count"], incremental[c]["window_in_amount"]) == (2, 260_000) # The 45-day-old one is outside
+
+
+def test_risk_score_weights_and_cap(db, users):
+    a, b, c = users
+    add_alerts(db, [(a, "GRAPH_CYCLE", "OPEN")] * 3 + [(a, "GRAPH_LAYERING", "OPEN")] * 2 + [(a, "KYC_FLAG", "OPEN")])
+    add_alerts(db, [(b, "ML_ANOMALY", "OPEN")] * 4)
+    add_transactions(db, [(c, b, 2_000_000, 1)])
+
+    scores = {user_id: profile["risk_score"] for user_id, profile in profiles(db).items()}
+
+    assert scores[a] == risk_profiles.MAX_RISK_SCORE # 50 + 50 + 20 points, capped
+    assert scores[b] == pytest.approx(4 * 2 + risk_profiles.RISK_VOLUME_POINTS) # Volume points are capped too
+    assert scores[c] == pytest.approx(risk_profiles.RISK_VOLUME_POINTS)
+
+
+def test_window_refresh_ages_out_old_activity(db, users, monkeypatch):
+    a, b, _ = users
+    add_transactions(db, [(a, b, 500_000, 10), (a, b, 100_000, 1)])
+    assert profiles(db)[b]["window_in_amount"] == 600_000
+
+    monkeypatch.setattr(risk_profiles, "RISK_WINDOW_DAYS", 5)
+    assert risk_profiles.refresh_windows(db) == 2
+
+    refreshed = profiles(db)
+    assert (refreshed[b]["window_tx_count"], refreshed[b]["window_in_amount"]) == (1, 100_000)
+    assert (refreshed[b]["tx_in_count"], refreshed[b]["tx_in_amount"]) == (2, 600_000) # Lifetime counters stay
+    assert refreshed[b]["risk_score"] == pytest.approx(risk_profiles.RISK_VOLUME_POINTS * 0.1)
@@ -0,0 +1,53 @@
+import fakeredis
+import pytest
+import redis
+
+from app import rule_scheduler
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(rule_scheduler, "get_redis", lambda: client)
+    return client
+
+
+def test_repeat_marks_coalesce_into_one_evaluation(shared):
+    for _ in range(5):
+        assert rule_scheduler.mark_dirty([3, 1, None])
+    assert rule_scheduler.mark_dirty([2])
+
+    assert rule_scheduler.pop_dirty() == [1, 2, 3]
+    assert rule_scheduler.pop_dirty() == []
+    rule_scheduler.record_run(users_evaluated=3, alerts_created=1, seconds=0.25)
+
+    metrics = rule_scheduler.metrics()
+    assert (metrics["marked"], metrics["evaluated"], metrics["pending"]) == (11, 3, 0)
+    assert (metrics["deduplicated"], metrics["dedup_ratio"]) == (8, round(8 / 11, 4))
+    assert (metrics["runs"], metrics["alerts_created"], metrics["last_run_users"]) == (1, 1, 3)
+
+
+def test_drains_are_bounded_and_requeues_are_not_new_marks(shared):
+    rule_scheduler.mark_dirty(range(10))
+
+    first = rule_scheduler.pop_dirty(count=4)
+    rule_scheduler.requeue(first)
+
+    assert len(first) == 4
+    assert rule_scheduler.metrics()["marked"] == 10
+    assert rule_scheduler.metrics()["pending"] == 10
+    assert sorted(rule_scheduler.pop_dirty(count=6) + rule_scheduler.pop_dirty(count=6)) == list(range(10))
+
+
+def test_without_redis_callers_evaluate_directly(monkeypatch):
+    monkeypatch.setattr(rule_scheduler, "get_redis", lambda: None)
+    assert rule_scheduler.mark_dirty([1]) is False
+    assert rule_scheduler.pop_dirty() == []
+    assert rule_scheduler.metrics() == {"available": False}
+
+    class BrokenRedis(fakeredis.FakeRedis):
+        def pipeline(self, *args, **kwargs):
+            raise redis.ConnectionError("connection reset")
+
+    monkeypatch.setattr(rule_scheduler, "get_redis", lambda: BrokenRedis())
+    assert rule_scheduler.mark_dirty([1]) is False
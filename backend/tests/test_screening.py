@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import screening
+from app.models import Watchlist
+
+WATCHLIST = ["John Smith", "Vladimir Petrov", "Maria José García"]
+
+
+@pytest.fixture
+def index():
+    index = screening.ScreeningIndex()
+    for entry_id, name in enumerate(WATCHLIST, 1):
+        index.add(entry_id, name)
+    return index
+
+
+@pytest.fixture(autouse=True)
+def fresh_process_index(monkeypatch):
+    monkeypatch.setattr(screening, "_index", None)
+    monkeypatch.setattr(screening, "_watermark", None)
+
+
+def best_score(index, name):
+    matches = index.match(name, min_score=0.0)
+    return matches[0]["score"] if matches else 0.0
+
+
+@pytest.mark.parametrize("name", ["John Smith", "Mr. john SMITH", "Maria Jose Garcia"])
+def test_normalized_names_match_exactly(index, name):
+    assert best_score(index, name) == 1.0
+
+
+@pytest.mark.parametrize("name", ["Jon Smith", "John Smyth", "Vladimr Petrow"])
+def test_misspellings_score_above_the_match_threshold(index, name):
+    assert best_score(index, name) >= screening.SCREENING_MATCH_THRESHOLD
+
+
+@pytest.mark.parametrize("name", ["John", "Smith", "John Smith Jr"])
+def test_partial_names_are_reported_but_not_flagged(index, name):
+    assert screening.SCREENING_REPORT_THRESHOLD <= best_score(index, name) < screening.SCREENING_MATCH_THRESHOLD
+
+
+def test_unrelated_names_are_not_reported(index):
+    assert index.match("Jane Doe") == []
+
+
+def test_token_similarity_by_edits_and_sound(index):
+    assert index.similar_tokens("petrow") == {"petrov": pytest.approx(1 - 1 / 6)}
+    # "john" is one edit away, but 3-letter tokens get no edits; only the Soundex credit is left
+    assert index.similar_tokens("jon") == {"john": screening.PHONETIC_SIMILARITY}
+
+
+def test_removed_entries_stop_matching(index):
+    index.remove(1)
+    assert index.match("John Smith") == []
+    assert "smith" not in index.token_entries
+
+
+def test_refresh_sees_a_delete_and_an_insert_between_refreshes(db):
+    db.add_all([Watchlist(name="John Smith"), Watchlist(name="Vladimir Petrov")])
+    db.commit()
+    assert len(screening.refresh(db)) == 2
+
+    # Same row count afterwards; the new row has no updated_at for the watermark to see
+    db.query(Watchlist).filter(Watchlist.name == "John Smith").delete()
+    db.add(Watchlist(name="Maria García", updated_at=None))
+    db.commit()
+    index = screening.refresh(db)
+
+    assert sorted(name for name, _ in index.entries.values()) == ["Maria García", "Vladimir Petrov"]
+    assert index.match("John Smith") == []
+    assert index.match("Maria Garcia")[0]["score"] == 1.0
+
+
+def test_refresh_without_changes_keeps_the_token_memo(db):
+    listed_at = datetime(2026, 10, 1, 12, 0)
+    db.add_all([Watchlist(name="John Smith", updated_at=listed_at), Watchlist(name="Vladimir Petrov", updated_at=listed_at)])
+    db.commit()
+    index = screening.refresh(db)
+    index.match("Jon Smyth")
+    memo = index.token_matches
+
+    assert screening.refresh(db).token_matches is memo
+
+    db.query(Watchlist).filter(Watchlist.name == "John Smith").update({"name": "John Smythe", "updated_at": listed_at + timedelta(hours=1)})
+    db.commit()
+    assert screening.refresh(db).token_matches is not memo # An edit still invalidates it
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from app import aml_rules, tasks
+from app.models import Alert, Transaction, User
+
+
+def add_structuring(db, batch_id, name):
+    sender = User(full_name=f"{name} sender", email=f"{name}-sender@example.com")
+    receiver = User(full_name=f"{name} mule", email=f"{name}-mule@example.com")
+    db.add_all([sender, receiver])
+    db.flush()
+    start = datetime.now() - timedelta(days=3)
+    db.add_all([
+        Transaction(from_user_id=sender.id, to_user_id=receiver.id, amount=45000, timestamp=start + timedelta(hours=hours), ingestion_batch_id=batch_id)
+        for hours in (0, 5, 10, 15)
+    ])
+    db.commit()
+    return sender.id, receiver.id
+
+
+def test_batch_analysis_only_covers_its_own_batch(db):
+    batch_users = add_structuring(db, "batch-a", "a")
+    add_structuring(db, "batch-b", "b")
+
+    assert tasks.analyze_ingested_batch.apply(args=["batch-a"]).result == {"alerts_created": 2}
+
+    flagged = {(user_id, alert_type) for user_id, alert_type in db.query(Alert.user_id, Alert.alert_type)}
+    assert flagged == {(batch_users[0], aml_rules.STRUCTURING_PAYMENT), (batch_users[1], aml_rules.STRUCTURING_DEPOSIT)}
+
+
+def test_dirty_users_are_evaluated_once_and_requeued_on_failure(db, monkeypatch):
+    import fakeredis
+
+    from app import rule_scheduler
+
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(rule_scheduler, "get_redis", lambda: client)
+    monkeypatch.setattr(tasks.enrich_alert_summaries, "delay", lambda: None)
+    sender, receiver = User(full_name="live sender", email="live-sender@example.com"), User(full_name="live mule", email="live-mule@example.com")
+    db.add_all([sender, receiver])
+    db.flush()
+    sender, receiver = sender.id, receiver.id
+    for hours in (1, 2, 3, 4): # Live transactions, each marking the receiver
+        db.add(Transaction(from_user_id=sender, to_user_id=receiver, amount=45000, timestamp=datetime.now() - timedelta(hours=hours)))
+        db.commit()
+        rule_scheduler.mark_dirty([receiver])
+
+    def fail(db, user_ids):
+        raise RuntimeError("database went away")
+
+    with monkeypatch.context() as failing:
+        failing.setattr(aml_rules, "evaluate_structuring_rules", fail)
+        with pytest.raises(RuntimeError):
+            tasks.evaluate_dirty_users.apply(throw=True)
+    assert rule_scheduler.metrics()["pending"] == 1 # Put back for the next run
+
+    assert tasks.evaluate_dirty_users.apply().result == {"users_evaluated": 1, "alerts_created": 1}
+    assert tasks.evaluate_dirty_users.apply().result == {"users_evaluated": 0, "alerts_created": 0}
+    assert [(user_id, alert_type) for user_id, alert_type in db.query(Alert.user_id, Alert.alert_type)] == [(receiver, aml_rules.STRUCTURING_DEPOSIT)]
+    assert rule_scheduler.metrics()["deduplicated"] == 3
+
+
+def test_backfill_keys_the_oldest_legacy_alert_per_user_and_type(db):
+    from app.alerts import alert_key, upsert_alerts
+
+    user = User(full_name="Legacy User", email="legacy@example.com")
+    db.add(user)
+    db.flush()
+    legacy = [Alert(user_id=user.id, alert_type=alert_type, message="legacy") for alert_type in (aml_rules.STRUCTURING_DEPOSIT, aml_rules.STRUCTURING_DEPOSIT, "ML_ANOMALY")]
+    db.add_all(legacy)
+    db.commit()
+
+    assert tasks.backfill_alert_dedup_keys.apply().result == {"alerts_keyed": 1}
+    assert tasks.backfill_alert_dedup_keys.apply().result == {"alerts_keyed": 0}
+    db.expire_all()
+    assert [alert.dedup_key for alert in legacy] == [alert_key(aml_rules.STRUCTURING_DEPOSIT, user.id), None, None]
+    repeat = Alert(user_id=user.id, alert_type=aml_rules.STRUCTURING_DEPOSIT, message="again", dedup_key=alert_key(aml_rules.STRUCTURING_DEPOSIT, user.id))
+    assert upsert_alerts(db, [repeat]) == []
+
+
+def test_failed_upload_job_discards_the_staged_file(db, tmp_path, monkeypatch):
+    from app import bulk_loader, data_processor
+
+    monkeypatch.setattr(data_processor, "STAGING_DIR", tmp_path)
+    staged = tmp_path / "upload.csv"
+    staged.write_text("Debit_Account,Credit_Account,Amount\nACC1,ACC2,100\n")
+
+    def fail(*args):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(bulk_loader, "load_chunk", fail)
+    with pytest.raises(RuntimeError):
+        tasks.process_uploaded_csv.apply(args=[str(staged)], throw=True)
+    assert not staged.exists()
@@ -0,0 +1,31 @@
+// Subscribes to a background job's Server-Sent Events stream.
+// `onEvent` receives every state/progress event ({ job_id, status, progress?, error? });
+// `onDone` receives the final event once the job reaches a terminal state.
+// Returns a function that closes the subscription.
+
+const API_BASE_URL = 'http://localhost:8000';
+const TERMINAL_STATES = ['SUCCESS', 'FAILURE', 'REVOKED'];
+
+export const subscribeToJob = (jobId, { onEvent, onDone, onError } = {}) => {
+    const source = new EventSource(`${API_BASE_URL}/api/v1/jobs/${jobId}/events`);
+    let finished = false;
+
+    const handle = (message) => {
+        const event = JSON.parse(message.data);
+        if (onEvent) onEvent(event);
+        if (TERMINAL_STATES.includes(event.status)) {
+            finished = true;
+            source.close();
+            if (onDone) onDone(event);
+        }
+    };
+
+    // The server names each event after the job state
+    ['pending', 'started', 'progress', 'running', 'success', 'failure', 'revoked', 'unknown'].forEach(name => source.addEventListener(name, handle));
+    // EventSource reconnects on its own after network errors; only report if it gave up
+    source.onerror = () => {
+        if (!finished && source.readyState === EventSource.CLOSED && onError) onError();
+    };
+
+    return () => { finished = true; source.close(); };
+};
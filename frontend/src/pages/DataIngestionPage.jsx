@@ -1,14 +1,39 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
-import { Box, Paper, Typography, Button, Alert, LinearProgress, Stack, Link, Checkbox, FormControlLabel } from '@mui/material';
+import { Box, Paper, Typography, Button, Alert, LinearProgress, CircularProgress, Stack, Link, Checkbox, FormControlLabel } from '@mui/material';
 import CloudUploadIcon from '@mui/icons-material/CloudUpload';
 import { Link as RouterLink } from 'react-router-dom';
+import { subscribeToJob } from '../api/jobEvents';
+
+const PHASE_LABELS = { INGESTING: 'Loading transactions', ANALYZING: 'Running compliance checks' };
 
 const DataIngestionPage = () => {
     const [selectedFile, setSelectedFile] = useState(null);
     const [isUploading, setIsUploading] = useState(false);
     const [jobStatus, setJobStatus] = useState({ message: '', type: '' });
     const [clearData, setClearData] = useState(true);
+    const [jobProgress, setJobProgress] = useState(null);
+    const unsubscribeRef = useRef(null);
+
+    // Close the progress stream when leaving the page
+    useEffect(() => () => { if (unsubscribeRef.current) unsubscribeRef.current(); }, []);
+
+    const followJob = (jobId) => {
+        if (unsubscribeRef.current) unsubscribeRef.current();
+        setJobProgress({ status: 'PENDING' });
+        unsubscribeRef.current = subscribeToJob(jobId, {
+            onEvent: (event) => setJobProgress(prev => ({ ...prev, status: event.status, ...(event.progress || {}) })),
+            onDone: async (event) => {
+                if (event.status !== 'SUCCESS') {
+                    setJobStatus({ message: `Processing failed: ${event.error || event.status}`, type: 'error' });
+                    return;
+                }
+                const res = await axios.get(`http://localhost:8000/api/v1/results/${jobId}`).catch(() => null);
+                setJobStatus({ message: res?.data?.result || 'Processing complete.', type: 'success' });
+            },
+            onError: () => setJobStatus({ message: `Lost connection to job ${jobId}. It is still running in the background.`, type: 'warning' }),
+        });
+    };
 
     const handleFileChange = (event) => {
         setSelectedFile(event.target.files[0]);
@@ -39,10 +64,8 @@ const DataIngestionPage = () => {
                 headers: { 'Content-Type': 'multipart/form-data' },
             });
             
-            setJobStatus({ 
-                message: `Upload successful! Processing has started in the background. Check the dashboard in a few minutes. (Job ID: ${response.data.job_id})`, 
-                type: 'success'
-            });
+            setJobStatus({ message: `Upload successful! Processing in the background (Job ID: ${response.data.job_id})...`, type: 'info' });
+            followJob(response.data.job_id);
         } catch (error) {
             const errorMessage = error.response?.data?.detail || 'An unknown error occurred.';
             setJobStatus({ message: `An error occurred: ${errorMessage}`, type: 'error' });
@@ -95,6 +118,16 @@ const DataIngestionPage = () => {
                     {isUploading ? <CircularProgress size={24} /> : 'Upload and Analyze'}
                 </Button>
 
+                {jobProgress && jobStatus.type === 'info' && (
+                    <Box sx={{ width: '100%' }}>
+                        <LinearProgress variant="indeterminate" sx={{ mb: 1 }} />
+                        <Typography variant="body2" color="text.secondary">
+                            {PHASE_LABELS[jobProgress.phase] || (jobProgress.status === 'PENDING' ? 'Waiting for a worker' : 'Starting')}
+                            {jobProgress.rows_parsed !== undefined && ` · ${jobProgress.rows_parsed.toLocaleString()} rows parsed, ${jobProgress.rows_inserted.toLocaleString()} inserted, ${jobProgress.alerts_created.toLocaleString()} alerts created`}
+                        </Typography>
+                    </Box>
+                )}
+
                 {jobStatus.message && (
                     <Alert severity={jobStatus.type || 'info'} sx={{ width: '100%' }}>
                         {jobStatus.message}
@@ -1,7 +1,8 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useMemo } from 'react';
 import { useParams } from 'react-router-dom';
 import axios from 'axios';
 import Plot from 'react-plotly.js';
+import { subscribeToJob } from '../api/jobEvents';
 import { 
     Box, 
     Card, 
@@ -26,7 +27,9 @@ import {
     Modal,
     Fade,
     Backdrop,
-    IconButton
+    IconButton,
+    ToggleButton,
+    ToggleButtonGroup
 } from '@mui/material';
 import AccountCircleIcon from '@mui/icons-material/AccountCircle';
 import LanIcon from '@mui/icons-material/Lan';
@@ -35,6 +38,51 @@ import CloseIcon from '@mui/icons-material/Close';
 import SmartToyIcon from '@mui/icons-material/SmartToy';
 import AssessmentIcon from '@mui/icons-material/Assessment';
 
+const TX_PAGE_SIZE = 50;
+
+// Expands the compact graph payload (node/edge arrays) into Plotly traces.
+// Older results stored a full Plotly figure and are passed through unchanged.
+const NODE_STYLES = {
+    root: { color: '#f48fb1', size: 30 }, // Pink
+    cycle: { color: '#ff6f00', size: 20 }, // Orange
+    peer: { color: '#90caf9', size: 20 }, // Blue
+};
+const MAX_ARROW_EDGES = 500;
+
+const buildGraphFigure = (plotData) => {
+    if (plotData.format !== 'compact-v1') return plotData;
+    const { nodes, edges } = plotData;
+    const edgeX = [], edgeY = [], annotations = [];
+    edges.source.forEach((from, i) => {
+        const to = edges.target[i];
+        edgeX.push(nodes.x[from], nodes.x[to], null);
+        edgeY.push(nodes.y[from], nodes.y[to], null);
+        if (edges.source.length <= MAX_ARROW_EDGES) {
+            annotations.push({ x: nodes.x[to], y: nodes.y[to], ax: nodes.x[from], ay: nodes.y[from], xref: 'x', yref: 'y', axref: 'x', ayref: 'y', showarrow: true, arrowhead: 2, arrowsize: 2, arrowwidth: 1.5, arrowcolor: '#888' });
+        }
+    });
+    const edgeTrace = { x: edgeX, y: edgeY, type: 'scatter', mode: 'lines', line: { width: 1, color: '#888' }, hoverinfo: 'none' };
+    const nodeTrace = {
+        x: nodes.x,
+        y: nodes.y,
+        type: 'scatter',
+        mode: 'markers+text',
+        text: nodes.label.map((label, i) => `<b>${label}</b><br>Influence (PageRank): ${nodes.pagerank[i].toFixed(3)}`),
+        textposition: 'top center',
+        marker: { color: nodes.role.map(role => NODE_STYLES[role].color), size: nodes.role.map(role => NODE_STYLES[role].size), line: { width: 2 } },
+    };
+    return {
+        data: [edgeTrace, nodeTrace],
+        layout: {
+            showlegend: false,
+            margin: { b: 0, l: 0, r: 0, t: 0 },
+            annotations,
+            xaxis: { showgrid: false, zeroline: false, showticklabels: false },
+            yaxis: { showgrid: false, zeroline: false, showticklabels: false },
+        },
+    };
+};
+
 // AlertCard Component - Displays a single alert
 const AlertCard = ({ alert }) => (
     <Paper elevation={2} sx={{ p: 2, mb: 2, borderLeft: 5, borderColor: alert.alert_type.includes('GRAPH') ? 'error.main' : 'warning.main' }}>
@@ -65,6 +113,7 @@ const UserDetailPage = () => {
     const [graphOpen, setGraphOpen] = useState(false);
     const [graphData, setGraphData] = useState(null);
     const [isPolling, setIsPolling] = useState(false);
+    const graphFigure = useMemo(() => (graphData?.plot_data ? buildGraphFigure(graphData.plot_data) : null), [graphData]);
     const [advisorModalOpen, setAdvisorModalOpen] = useState(false);
     const [advisorResponse, setAdvisorResponse] = useState('');
     const [advisorTitle, setAdvisorTitle] = useState('');
@@ -73,22 +122,40 @@ const UserDetailPage = () => {
     const [snackbarOpen, setSnackbarOpen] = useState(false);
     const [snackbarMessage, setSnackbarMessage] = useState('');
 
+    const [txDirection, setTxDirection] = useState('both');
+    const [transactions, setTransactions] = useState([]);
+    const [txCursor, setTxCursor] = useState(null);
+    const [txLoading, setTxLoading] = useState(false);
+
     const showSnackbar = (message) => { setSnackbarMessage(message); setSnackbarOpen(true); };
 
     const fetchDossier = useCallback(async (showLoading = true) => {
         if(showLoading) setLoading(true);
         try {
-            const [userRes, alertsRes, txsRes] = await Promise.all([
+            const [userRes, alertsRes] = await Promise.all([
                 axios.get(`http://localhost:8000/api/v1/users/${userId}`),
                 axios.get(`http://localhost:8000/api/v1/users/${userId}/alerts`),
-                axios.get(`http://localhost:8000/api/v1/users/${userId}/transactions`),
             ]);
-            setDossier({ profile: userRes.data, alerts: alertsRes.data, transactions: txsRes.data });
+            setDossier({ profile: userRes.data, alerts: alertsRes.data });
         } catch (err) { setError(`Failed to load data for user ${userId}.`); } 
         finally { if(showLoading) setLoading(false); }
     }, [userId]);
 
+    // Transactions are paged from the server; `cursor` null reloads the first page
+    const fetchTransactions = useCallback(async (cursor = null) => {
+        setTxLoading(true);
+        try {
+            const params = { direction: txDirection, limit: TX_PAGE_SIZE };
+            if (cursor) params.cursor = cursor;
+            const res = await axios.get(`http://localhost:8000/api/v1/users/${userId}/transactions`, { params });
+            setTransactions(prev => (cursor ? [...prev, ...res.data.items] : res.data.items));
+            setTxCursor(res.data.next_cursor);
+        } catch (err) { showSnackbar('Failed to load transactions.'); }
+        finally { setTxLoading(false); }
+    }, [userId, txDirection]);
+
     useEffect(() => { fetchDossier(); }, [fetchDossier]);
+    useEffect(() => { fetchTransactions(); }, [fetchTransactions]);
 
     // --- ALL HANDLER FUNCTIONS ARE NOW PRESENT ---
 
@@ -104,65 +171,37 @@ const UserDetailPage = () => {
 
 
     const handleRunGraphAnalysis = async () => {
-    setActionStates(prev => ({ ...prev, graph: true }));
-    setIsPolling(true);
-    setGraphData(null);
-    setGraphOpen(true);
-    
-    try {
-        // Step 1: Start the job (THIS WAS MISSING!)
-        const startRes = await axios.post(`http://localhost:8000/api/v1/users/${userId}/run-graph-analysis`);
-        // Wait 2 seconds before polling to allow DB entry to be created
-        await new Promise(resolve => setTimeout(resolve, 2000));
-
-        const { job_id } = startRes.data;
-
-        // Step 2: Start polling for the result
-        const poll = (retries = 20) => {
-            // Stop trying after 40 seconds (20 retries * 2 seconds)
-            if (retries === 0) {
-                setIsPolling(false);
-                setActionStates(prev => ({...prev, graph: false}));
-                setGraphData({ error: "Analysis timed out. The task is taking too long." });
-                return;
-            }
-            
-            // Poll the unified results endpoint
-            axios.get(`http://localhost:8000/api/v1/results/${job_id}`)
-                .then(res => {
-                    // Check if the task is complete
-                    if (res.data.status === 'SUCCESS' || res.data.status === 'COMPLETED' || res.data.status === 'FAILED') {
-                        // Check if the result is for a graph
-                        if (res.data.result_type === 'graph') {
-                            setGraphData(res.data.result);
-                        } else {
-                            // Handle cases where the result is not a graph (e.g., an error)
-                            setGraphData({ error: "Received an unexpected result type from the server." });
-                        }
-                        setIsPolling(false);
-                        setActionStates(prev => ({ ...prev, graph: false }));
-                        fetchDossier(false); // Refresh alerts on the main page in the background
-                    } else {
-                        // If status is PENDING or RUNNING, wait and poll again
-                        setTimeout(() => poll(retries - 1), 2000);
-                    }
-                })
-                .catch(() => {
-                    // If there's a network error or 404, just try again
-                    setTimeout(() => poll(retries - 1), 2000);
-                });
+        setActionStates(prev => ({ ...prev, graph: true }));
+        setIsPolling(true);
+        setGraphData(null);
+        setGraphOpen(true);
+        const finish = (data) => {
+            setGraphData(data);
+            setIsPolling(false);
+            setActionStates(prev => ({ ...prev, graph: false }));
         };
 
-        // Start the first poll
-        poll();
+        try {
+            const startRes = await axios.post(`http://localhost:8000/api/v1/users/${userId}/run-graph-analysis`);
+            const { job_id } = startRes.data;
 
-    } catch (err) {
-        console.error("Failed to start graph analysis task:", err);
-        setIsPolling(false);
-        setActionStates(prev => ({ ...prev, graph: false }));
-        setGraphData({ error: "Could not start the analysis job." });
-    }
-};
+            // The job pushes its state changes; fetch the result once it's done
+            subscribeToJob(job_id, {
+                onDone: async (event) => {
+                    if (event.status !== 'SUCCESS') { finish({ error: event.error || 'The analysis job failed.' }); return; }
+                    try {
+                        const res = await axios.get(`http://localhost:8000/api/v1/results/${job_id}`);
+                        finish(res.data.result_type === 'graph' ? res.data.result : { error: "Received an unexpected result type from the server." });
+                        fetchDossier(false); // Refresh alerts on the main page in the background
+                    } catch (err) { finish({ error: 'Could not load the analysis result.' }); }
+                },
+                onError: () => finish({ error: 'Lost connection to the analysis job.' }),
+            });
+        } catch (err) {
+            console.error("Failed to start graph analysis task:", err);
+            finish({ error: "Could not start the analysis job." });
+        }
+    };
 
     const handleAdvisorAction = async (actionType) => {
         setActionStates(prev => ({ ...prev, advising: true }));
@@ -184,7 +223,7 @@ const UserDetailPage = () => {
             await axios.post(`http://localhost:8000/api/v1/users/${userId}/transactions`, { amount: parseFloat(newTxAmount), description: newTxDesc });
             setNewTxAmount('');
             showSnackbar('Transaction added! Analyzing patterns...');
-            setTimeout(() => fetchDossier(false), 2000);
+            setTimeout(() => { fetchDossier(false); fetchTransactions(); }, 2000);
         } catch (err) { showSnackbar('Error adding transaction.'); }
     };
 
@@ -192,7 +231,9 @@ const UserDetailPage = () => {
     if (error) return <MuiAlert severity="error">{error}</MuiAlert>;
     if (!dossier) return <MuiAlert severity="warning">No user data found.</MuiAlert>;
 
-    const { profile, alerts, transactions } = dossier;
+    const { profile, alerts } = dossier;
+    const risk = profile.risk_profile;
+    const totalTransactions = risk ? risk.tx_in_count + risk.tx_out_count : 0;
 
     return (
         <Box>
@@ -208,6 +249,7 @@ const UserDetailPage = () => {
                 <Grid item xs={12} lg={4}>
                     <Stack spacing={3}>
                         <Paper elevation={3} sx={{ p: 3 }}><Typography variant="h6" gutterBottom>Identity Details</Typography><Divider sx={{ mb: 2 }} /><Typography><strong>Country:</strong> {profile.country}</Typography><Typography><strong>Member Since:</strong> {new Date(profile.created_at).toLocaleDateString()}</Typography></Paper>
+                        {risk && (<Paper elevation={3} sx={{ p: 3 }}><Typography variant="h6" gutterBottom>Activity Summary</Typography><Divider sx={{ mb: 2 }} /><Typography><strong>Risk Score:</strong> {risk.risk_score.toFixed(1)}</Typography><Typography><strong>Open Alerts:</strong> {risk.open_alerts} of {risk.total_alerts}</Typography><Typography><strong>Incoming:</strong> {risk.tx_in_count} txns, {risk.tx_in_amount.toFixed(2)} INR</Typography><Typography><strong>Outgoing:</strong> {risk.tx_out_count} txns, {risk.tx_out_amount.toFixed(2)} INR</Typography><Typography><strong>Last 30 Days:</strong> {risk.window_tx_count} txns</Typography>{risk.last_tx_at && <Typography><strong>Last Transaction:</strong> {new Date(risk.last_tx_at).toLocaleString()}</Typography>}</Paper>)}
                         <Paper elevation={3} sx={{ p: 3 }}><Typography variant="h6" gutterBottom>Compliance Actions</Typography><Divider sx={{ mb: 2 }} /><Stack spacing={2}><Button size="large" startIcon={<GavelIcon />} onClick={handleRunKyc} disabled={actionStates.kyc}>{actionStates.kyc ? 'Processing...' : 'Run KYC Check'}</Button><Button size="large" startIcon={<LanIcon />} onClick={handleRunGraphAnalysis} disabled={actionStates.graph} variant="outlined" color="warning">{actionStates.graph ? 'Analyzing...' : 'Analyze Network'}</Button></Stack></Paper>
                         <Paper elevation={3} sx={{ p: 3 }}><Typography variant="h6" gutterBottom>AI Advisor</Typography><Divider sx={{ mb: 2 }} /><Stack spacing={2}><Button size="large" startIcon={<SmartToyIcon />} onClick={() => handleAdvisorAction('explain')} disabled={actionStates.advising}>Explain Risk Profile</Button><Button size="large" startIcon={<AssessmentIcon />} onClick={() => handleAdvisorAction('sar')} variant="outlined" color="error" disabled={actionStates.advising}>Draft SAR</Button></Stack></Paper>
                         <Paper elevation={3} sx={{ p: 3 }}><Typography variant="h6" gutterBottom>Add Manual Transaction</Typography><Divider sx={{ mb: 2 }} /><Box component="form" onSubmit={handleAddTransaction}><TextField label="Amount (INR)" type="number" value={newTxAmount} onChange={(e) => setNewTxAmount(e.target.value)} fullWidth margin="normal" required /><TextField label="Description" type="text" value={newTxDesc} onChange={(e) => setNewTxDesc(e.target.value)} fullWidth margin="normal" required /><Button type="submit" variant="contained" color="primary" fullWidth sx={{ mt: 1 }}>Add Transaction</Button></Box></Paper>
@@ -216,7 +258,12 @@ const UserDetailPage = () => {
                 <Grid item xs={12} lg={8}>
                     <Stack spacing={3}>
                         <Paper elevation={3} sx={{ p: 3 }}><Typography variant="h6" gutterBottom>Active Alerts ({alerts.length})</Typography><Divider sx={{ mb: 2 }} />{alerts.length > 0 ? (<Box sx={{ maxHeight: '40vh', overflowY: 'auto', pr: 1 }}>{alerts.map(alert => <AlertCard key={alert.id} alert={alert} />)}</Box>) : (<Typography color="text.secondary" sx={{ mt: 2, textAlign: 'center' }}>No active alerts for this user.</Typography>)}</Paper>
-                        <Paper elevation={3} sx={{ p: 3 }}><Typography variant="h6" gutterBottom>Transaction History ({transactions.length})</Typography><Divider sx={{ mb: 2 }} /><TableContainer sx={{ maxHeight: '40vh', overflowY: 'auto' }}><Table stickyHeader size="small"><TableHead><TableRow><TableCell>Date</TableCell><TableCell>Description</TableCell><TableCell align="right">Amount (INR)</TableCell></TableRow></TableHead><TableBody>{transactions.map(tx => (<TableRow key={tx.id} hover><TableCell>{new Date(tx.timestamp).toLocaleString()}</TableCell><TableCell>{tx.description}</TableCell><TableCell align="right">{tx.amount.toFixed(2)}</TableCell></TableRow>))}</TableBody></Table></TableContainer></Paper>
+                        <Paper elevation={3} sx={{ p: 3 }}>
+                            <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}><Typography variant="h6" gutterBottom>Transaction History ({totalTransactions})</Typography><ToggleButtonGroup size="small" exclusive value={txDirection} onChange={(e, value) => value && setTxDirection(value)}><ToggleButton value="both">All</ToggleButton><ToggleButton value="in">Incoming</ToggleButton><ToggleButton value="out">Outgoing</ToggleButton></ToggleButtonGroup></Box>
+                            <Divider sx={{ mb: 2 }} />
+                            <TableContainer sx={{ maxHeight: '40vh', overflowY: 'auto' }}><Table stickyHeader size="small"><TableHead><TableRow><TableCell>Date</TableCell><TableCell>Direction</TableCell><TableCell>Description</TableCell><TableCell align="right">Amount (INR)</TableCell></TableRow></TableHead><TableBody>{transactions.map(tx => (<TableRow key={tx.id} hover><TableCell>{new Date(tx.timestamp).toLocaleString()}</TableCell><TableCell>{tx.to_user_id === Number(userId) ? 'In' : 'Out'}</TableCell><TableCell>{tx.description}</TableCell><TableCell align="right">{tx.amount.toFixed(2)}</TableCell></TableRow>))}</TableBody></Table></TableContainer>
+                            {txCursor && (<Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}><Button onClick={() => fetchTransactions(txCursor)} disabled={txLoading}>{txLoading ? <CircularProgress size={20} /> : 'Load more'}</Button></Box>)}
+                        </Paper>
                     </Stack>
                 </Grid>
             </Grid>
@@ -232,7 +279,7 @@ const UserDetailPage = () => {
                         {graphData && !isPolling && (
                             <Grid container spacing={2} sx={{ flexGrow: 1, height: 'calc(100% - 60px)' }}>
                                 <Grid item xs={12} md={9} sx={{ height: '100%' }}>
-                                    {graphData.plot_data ? (<Plot data={graphData.plot_data.data} layout={{...graphData.plot_data.layout, autosize: true, paper_bgcolor: '#1e1e1e', font: { color: 'white' } }} style={{ width: '100%', height: '100%' }} useResizeHandler config={{ responsive: true, displaylogo: false }} />) : (<Typography>Could not render graph. {graphData.error}</Typography>)}
+                                    {graphFigure ? (<Plot data={graphFigure.data} layout={{...graphFigure.layout, autosize: true, paper_bgcolor: '#1e1e1e', font: { color: 'white' } }} style={{ width: '100%', height: '100%' }} useResizeHandler config={{ responsive: true, displaylogo: false }} />) : (<Typography>Could not render graph. {graphData.error}</Typography>)}
                                 </Grid>
                                 <Grid item xs={12} md={3} sx={{ height: '100%', overflowY: 'auto' }}>
                                     <Typography variant="h6">AI Investigator's Report</Typography>
@@ -1,20 +1,31 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import axios from 'axios';
 import { Link as RouterLink } from 'react-router-dom';
-import { 
-    Grid, 
-    Card, 
-    CardContent, 
-    Typography, 
-    Alert, 
-    Box, 
-    CircularProgress, 
+import {
+    Grid,
+    Card,
+    CardContent,
+    Typography,
+    Alert,
+    Box,
+    Button,
+    CircularProgress,
+    Chip,
+    FormControl,
+    FormControlLabel,
+    InputLabel,
     Link,
+    MenuItem,
+    Select,
+    Switch,
     TextField,
     InputAdornment
 } from '@mui/material';
 import SearchIcon from '@mui/icons-material/Search';
 
+const PAGE_SIZE = 60;
+const SEARCH_DEBOUNCE_MS = 300;
+
 const UserCard = ({ user }) => (
     <Grid item xs={12} sm={6} md={4}>
         <Card sx={{ height: '100%', display: 'flex', flexDirection: 'column', transition: '0.3s', '&:hover': { transform: 'scale(1.03)', boxShadow: 6 } }}>
@@ -30,51 +41,87 @@ const UserCard = ({ user }) => (
                 <Typography variant="body2">
                     Country: <strong>{user.country}</strong>
                 </Typography>
+                <Box sx={{ mt: 1.5, display: 'flex', gap: 1 }}>
+                    <Chip label={`Risk ${user.risk_score.toFixed(0)}`} size="small" color={user.risk_score >= 50 ? 'error' : user.risk_score >= 20 ? 'warning' : 'default'} />
+                    <Chip label={`${user.open_alerts} open / ${user.total_alerts} alerts`} size="small" variant="outlined" />
+                </Box>
             </CardContent>
         </Card>
     </Grid>
 );
 
 const UserListPage = () => {
-    const [allUsers, setAllUsers] = useState([]);
-    const [filteredUsers, setFilteredUsers] = useState([]);
+    const [users, setUsers] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [totalEstimate, setTotalEstimate] = useState(null);
     const [error, setError] = useState('');
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [searchTerm, setSearchTerm] = useState('');
+    const [query, setQuery] = useState('');
+    const [country, setCountry] = useState('');
+    const [sort, setSort] = useState('id');
+    const [openAlertsOnly, setOpenAlertsOnly] = useState(false);
+
+    // Wait for typing to pause before querying the server
+    useEffect(() => {
+        const timer = setTimeout(() => setQuery(searchTerm.trim()), SEARCH_DEBOUNCE_MS);
+        return () => clearTimeout(timer);
+    }, [searchTerm]);
+
+    const fetchPage = useCallback((cursor) => {
+        const params = { limit: PAGE_SIZE, sort };
+        if (cursor) params.cursor = cursor;
+        if (query) params.q = query;
+        if (country) params.country = country;
+        if (openAlertsOnly) params.has_open_alerts = true;
+        return axios.get('http://localhost:8000/api/v1/users', { params });
+    }, [sort, query, country, openAlertsOnly]);
 
+    // Filters or sort changed: start again from the first page
     useEffect(() => {
-        axios.get('http://localhost:8000/api/v1/users')
+        let cancelled = false;
+        setLoading(true);
+        setError('');
+        fetchPage(null)
             .then(response => {
-                setAllUsers(response.data);
-                setFilteredUsers(response.data);
+                if (cancelled) return;
+                setUsers(response.data.items);
+                setNextCursor(response.data.next_cursor);
+                setTotalEstimate(response.data.total_estimate);
             })
             .catch(err => {
                 console.error("Failed to fetch users:", err);
-                setError('Failed to load user data from the server.');
+                if (!cancelled) setError('Failed to load user data from the server.');
             })
-            .finally(() => setLoading(false));
-    }, []);
+            .finally(() => { if (!cancelled) setLoading(false); });
+        return () => { cancelled = true; };
+    }, [fetchPage]);
 
-    useEffect(() => {
-        const results = allUsers.filter(user =>
-            user.full_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            user.email.toLowerCase().includes(searchTerm.toLowerCase())
-        );
-        setFilteredUsers(results);
-    }, [searchTerm, allUsers]);
-
-    if (loading) return <Box sx={{ display: 'flex', justifyContent: 'center', mt: 5 }}><CircularProgress /></Box>;
+    const loadMore = () => {
+        setLoadingMore(true);
+        fetchPage(nextCursor)
+            .then(response => {
+                setUsers(previous => [...previous, ...response.data.items]);
+                setNextCursor(response.data.next_cursor);
+            })
+            .catch(err => {
+                console.error("Failed to fetch more users:", err);
+                setError('Failed to load more users.');
+            })
+            .finally(() => setLoadingMore(false));
+    };
 
     return (
         <Box>
             <Typography variant="h4" component="h1" gutterBottom>User Dashboard</Typography>
             <TextField
                 fullWidth
-                label="Search Users by Name or Email"
+                label="Search Users by Name"
                 variant="outlined"
                 value={searchTerm}
                 onChange={(e) => setSearchTerm(e.target.value)}
-                sx={{ mb: 4 }}
+                sx={{ mb: 2 }}
                 InputProps={{
                     startAdornment: (
                         <InputAdornment position="start">
@@ -83,19 +130,48 @@ const UserListPage = () => {
                     ),
                 }}
             />
-            {error && <Alert severity="error" sx={{ mb: 2 }}>{error}</Alert>}
-            
-            <Grid container spacing={3}>
-                {filteredUsers.length > 0 ? (
-                    filteredUsers.map(user => <UserCard key={user.id} user={user} />)
-                ) : (
-                    <Grid item xs={12}>
-                        <Typography>No users found matching your search.</Typography>
-                    </Grid>
+            <Box sx={{ display: 'flex', flexWrap: 'wrap', gap: 2, alignItems: 'center', mb: 4 }}>
+                <FormControl size="small" sx={{ minWidth: 180 }}>
+                    <InputLabel id="user-sort-label">Sort by</InputLabel>
+                    <Select labelId="user-sort-label" label="Sort by" value={sort} onChange={(e) => setSort(e.target.value)}>
+                        <MenuItem value="id">Account (oldest first)</MenuItem>
+                        <MenuItem value="risk">Risk score</MenuItem>
+                        <MenuItem value="alerts">Alert count</MenuItem>
+                    </Select>
+                </FormControl>
+                <TextField size="small" label="Country" value={country} onChange={(e) => setCountry(e.target.value)} />
+                <FormControlLabel
+                    control={<Switch checked={openAlertsOnly} onChange={(e) => setOpenAlertsOnly(e.target.checked)} />}
+                    label="Open alerts only"
+                />
+                {totalEstimate !== null && !loading && (
+                    <Typography variant="body2" color="text.secondary">~{totalEstimate.toLocaleString()} users</Typography>
                 )}
-            </Grid>
+            </Box>
+            {error && <Alert severity="error" sx={{ mb: 2 }}>{error}</Alert>}
+
+            {loading ? (
+                <Box sx={{ display: 'flex', justifyContent: 'center', mt: 5 }}><CircularProgress /></Box>
+            ) : (
+                <Grid container spacing={3}>
+                    {users.length > 0 ? (
+                        users.map(user => <UserCard key={user.id} user={user} />)
+                    ) : (
+                        <Grid item xs={12}>
+                            <Typography>No users found matching your search.</Typography>
+                        </Grid>
+                    )}
+                </Grid>
+            )}
+            {!loading && nextCursor && (
+                <Box sx={{ display: 'flex', justifyContent: 'center', mt: 4 }}>
+                    <Button variant="outlined" onClick={loadMore} disabled={loadingMore}>
+                        {loadingMore ? <CircularProgress size={24} /> : 'Load more'}
+                    </Button>
+                </Box>
+            )}
         </Box>
     );
 };
 
-export default UserListPage;
\ No newline at end of file
+export default UserListPage;